@@ -9,7 +9,33 @@ CONFIG = {
     "FINAL_OUTPUT": "final_output.mp4",
     "ELEVEN_API_KEY": "",
     "VOICE_ID": "",
+    "VOICE_MODEL_ID": "eleven_multilingual_v2",
+    "VOICE_OUTPUT_FORMAT": "mp3_44100_128",
+    # Voice backend (see pipeline/voice.py): "elevenlabs", "local" (offline CLI engine) or "stub" (tone)
+    "VOICE_BACKEND": "elevenlabs",
+    "ELEVEN_BASE_URL": "",                   # e.g. "http://127.0.0.1:8787" for pipeline.fake_tts_server
+    # Local backend: engine reading JSON lines {"text", "output_file"} on stdin; {model} is substituted
+    "LOCAL_TTS_COMMAND": ["piper", "--model", "{model}", "--json-input"],
+    "LOCAL_TTS_MODEL": "models/en_US-lessac-medium.onnx",
+    "LOCAL_TTS_WORKERS": 4,                  # engine processes sharing the sentences of a batch
+    "LOCAL_TTS_PAUSE": 0.3,                  # silence between sentences (seconds)
+    # Streaming mode: write voice chunks as they arrive and overlap clips/Whisper with synthesis
+    "VOICE_STREAMING": False,
+    "VOICE_WORDS_PER_SECOND": 2.5,           # narration pace used to estimate duration from text
+    "STREAM_DURATION_MARGIN": 0.15,          # extra clip footage selected beyond the estimate
+    "STREAM_WINDOW_SECONDS": 20,             # new audio needed before Whisper starts the next window
     "WHISPER_MODEL": "base",
+    "WHISPER_DEVICE": "cpu",
+    # "single" transcribes the whole file; "chunked" splits it at pauses over WHISPER_WORKERS processes;
+    # "align" force-aligns the known script text (see pipeline/align.py)
+    "WHISPER_MODE": "single",
+    "WHISPER_LANGUAGE": "en",                # passed to Whisper; empty detects the language
+    "ALIGN_MIN_PROBABILITY": 0.3,            # below this mean word probability, transcribe and map the script
+    "WHISPER_WORKERS": 2,
+    "WHISPER_CHUNK_SECONDS": 20,
+    "WHISPER_CHUNK_MEMORY_MB": 4000,         # chunk workers each load the model; fewer run if their copies exceed this
+    # Warm transcription worker (python -m pipeline.whisper_worker); used when listening
+    "WHISPER_WORKER_SOCKET": "output/whisper_worker.sock",
     "FONT_NAME": "Inter",
     "FONT_SIZE": 102,
     "OUTLINE_SIZE": 5,
@@ -19,10 +45,58 @@ CONFIG = {
     "USE_RANDOM_SEGMENT": True,
     "MIN_SEGMENT_DURATION": 30,
     "MAX_SEGMENT_DURATION": 120,
+    "CLIP_SEED": None,                       # fixed clip selection seed; None draws one per run (recorded in the sidecar)
     "GPU_ENCODER": "h264_nvenc",
     "GPU_DECODER": "h264_cuvid",
+    # Encoder selection (see pipeline/encoders.py): "speed", "balanced", "quality" or "fastest" (benchmarked)
+    "ENCODER_TARGET": "balanced",
+    "ENCODER_PROFILE": "",                   # force a profile, e.g. "x264_veryfast"
+    "ENCODER_CACHE_PATH": "cache/encoders.json",
+    "X264_TUNE": "",                         # "" = x264's default tuning; e.g. "film" or "animation" to match the footage
+    "X264_THREADS": 0,                       # 0 = the ffmpeg runner sets -threads from this run's share of FFMPEG_CORE_BUDGET
+    # ffmpeg runner (see pipeline/ffmpeg_runner.py)
+    "FFMPEG_CORE_BUDGET": 0,                 # cores shared by all concurrent ffmpeg runs; 0 = every core
+    "FFMPEG_THREADS": 0,                     # cores an encode reserves unless it sets its own; 0 = a fair share of the budget
+    "FFMPEG_TIMEOUT": 0,                     # seconds before a run is killed; 0 = never
+    "FFMPEG_PROGRESS_INTERVAL": 10,          # seconds between progress lines of a long run
     "IS_COMBINED": True,
+    # "two_pass": combine clips into combined.mp4, then finalize it
+    # "single_pass": one ffmpeg graph from the source clips to the final output
+    "RENDER_MODE": "two_pass",
+    # Split the final two-pass encode into N chunks encoded in parallel (0 or 1 = off)
+    "RENDER_CHUNKS": 0,
+    "MIN_CHUNK_DURATION": 10,
+    # Extra deliverables split off the composited frame in the same ffmpeg run as the final video
+    # (overrides RENDER_CHUNKS). Each is written next to the final output with its suffix:
+    #   {"name": "upload", "suffix": "_720p.mp4", "width": 720, "height": 1280,
+    #    "args": ["-preset", "fast", "-b:v", "2500k", "-maxrate", "3M", "-bufsize", "6M"]}
+    #   {"name": "preview", "suffix": "_preview.mp4", "width": 540, "duration": 10}
+    #   {"name": "thumbs", "suffix": "_thumbs.jpg", "thumbnails": 6, "width": 216}
+    # "profile" picks another pipeline/encoders.py profile; "args" replace its encoder args.
+    "OUTPUT_VARIANTS": [],
+    # "word": one word at a time; "chunk": MAX_WORDS_PER_SUBTITLE words, one event per word;
+    # "karaoke": same look as "chunk" with one event per chunk and timed \t highlights
     "HIGHLIGHT_MODE": "word",
+    # Subtitle rasterizer for the final encode: "ass" (libass, every frame) or "sprites"
+    # (each event drawn once with PIL and overlaid, see pipeline/subtitle_sprites.py)
+    "SUBTITLE_RENDERER": "ass",
+    "SUBTITLE_FONT_PATH": "",                # font file for "sprites" (libass resolves FONT_NAME itself); empty uses the card font
+    "SPRITE_WORKERS": 4,
+    # On-disk caches (content-addressed, LRU-evicted per namespace)
+    "CACHE_DIR": "cache",
+    "CACHE_LIMITS_MB": {"voice": 500, "transcripts": 100, "normalized": 20000, "cards": 200, "audio": 1000, "emoji": 50},
+    "EMOJI_ALLOW_NETWORK": False,            # fetch missing emoji into CACHE_DIR/emoji while rendering;
+                                             # off: seed them with python -m pipeline.card --seed-emoji
+    # Background clip metadata index (refreshed incrementally by mtime/size)
+    "CLIP_INDEX_PATH": "cache/clip_index.sqlite",
+    "CLIP_PROBE_WORKERS": 8,
+    # Uniform intermediate format for clips that can't be stream-copied as-is
+    "NORMALIZE_FORMAT": {"width": 1920, "height": 1080, "fps": 30, "sample_rate": 44100, "channels": 2,
+                         "preset": "veryfast", "crf": 18},
+    "NORMALIZE_WORKERS": 2,
+    # Batch mode: per-job outputs go to BATCH_OUTPUT_DIR/<job id>/
+    "BATCH_OUTPUT_DIR": "output/batch",
+    "BATCH_STAGE_WORKERS": {"voice": 4, "video": 2, "subtitles": 1, "finalize": 2},
     # Subtitle font color settings (ASS format: &HAABBGGRR)
     "FONT_COLOR_PRIMARY": "&H00FFFFFF",      # white
     "FONT_COLOR_OUTLINE": "&H00000000",      # black
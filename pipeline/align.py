@@ -0,0 +1,189 @@
+"""
+Forced alignment of the known narration script.
+
+Rather than decoding speech, the script's own tokens are fed to Whisper and
+word timings are read off its cross-attention with DTW, one window of at most
+30 s at a time. Windows are cut at pauses, and each one gets the words whose
+share of the script matches its share of the speech. If the model is not
+confident about the result, the audio is transcribed instead and the
+script's words are mapped onto the recognized timings, so subtitles always
+spell the script exactly.
+"""
+import difflib
+import re
+import time
+import numpy as np
+
+from config import CONFIG
+from pipeline.audio import SAMPLE_RATE, find_silences, load_audio
+from pipeline.utils import console
+
+# Whisper's defaults for attaching punctuation to neighbouring words
+PREPEND_PUNCTUATIONS = "\"'“¿([{-"
+APPEND_PUNCTUATIONS = "\"'.。,，!！?？:：”)]}、"
+WINDOW_SECONDS = 29.5
+# Extra cost (in seconds of mismatch) for cutting a window mid-sentence
+MID_SENTENCE_PENALTY = 1.0
+# Cuts within this many seconds of the best cost count as equally good
+CUT_SLACK = 0.5
+
+
+def _normalize(word):
+    return re.sub(r"[^\w']+", "", word.lower())
+
+
+def plan_windows(samples, words, sample_rate=SAMPLE_RATE):
+    """
+    Split audio and script together into [(start, end, first_word, last_word)]
+    windows no longer than WINDOW_SECONDS.
+
+    Each cut is the pause/word-boundary pair whose speech time and script
+    position (by characters) agree best, preferring sentence ends.
+    """
+    silences = find_silences(samples, sample_rate)
+    pauses = np.array([(start + end) // 2 for start, end in silences], dtype=np.int64)
+    # Speech seconds before each pause midpoint
+    silent_before = np.cumsum([0] + [end - start for start, end in silences])[:-1]
+    half = np.array([(end - start) // 2 for start, end in silences], dtype=np.int64)
+    speech_at = (pauses - silent_before - half) / sample_rate if len(pauses) else np.array([])
+    total_speech = (len(samples) - sum(end - start for start, end in silences)) / sample_rate
+
+    chars = np.cumsum([len(word) + 1 for word in words])
+    script_at = chars / chars[-1] * total_speech
+    sentence_end = np.array([word.rstrip("\"')]}”").endswith((".", "!", "?")) for word in words])
+
+    limit = int(WINDOW_SECONDS * sample_rate)
+    windows = []
+    start, first = 0, 0
+    while len(samples) - start > limit and first < len(words) - 1:
+        options = []
+        for index in np.flatnonzero((pauses > start) & (pauses <= start + limit)):
+            # Word boundaries after word k, for k in first..len-2
+            cost = np.abs(script_at[first:-1] - speech_at[index]) + MID_SENTENCE_PENALTY * ~sentence_end[first:-1]
+            k = int(np.argmin(cost))
+            options.append((float(cost[k]), int(pauses[index]), first + k))
+        if options:
+            # Among near-equally good cuts take the latest, for fewer windows
+            lowest = min(option[0] for option in options)
+            best = max((option for option in options if option[0] <= lowest + CUT_SLACK), key=lambda option: option[1])
+        else:
+            # No pause within reach: hard cut, split the script proportionally
+            cut = start + limit
+            speech = cut / len(samples) * total_speech
+            best = (None, cut, first + int(np.argmin(np.abs(script_at[first:-1] - speech))))
+        _, cut, last = best
+        windows.append((start, cut, first, last))
+        start, first = cut, last + 1
+    windows.append((start, len(samples), first, len(words) - 1))
+    return windows
+
+
+def _align_window(model, tokenizer, samples, text):
+    import torch
+    from whisper.audio import HOP_LENGTH, N_FRAMES, log_mel_spectrogram, pad_or_trim
+    from whisper.timing import find_alignment, merge_punctuations
+
+    mel = log_mel_spectrogram(samples, model.dims.n_mels)
+    mel = pad_or_trim(mel, N_FRAMES).to(model.device).to(torch.float32)
+    tokens = tokenizer.encode(" " + text.strip())
+    alignment = find_alignment(model, tokenizer, tokens, mel, len(samples) // HOP_LENGTH)
+    merge_punctuations(alignment, PREPEND_PUNCTUATIONS, APPEND_PUNCTUATIONS)
+    return [timing for timing in alignment if timing.word]
+
+
+def group_sentences(words):
+    """Whisper-style segments from a flat word list, one per sentence."""
+    segments = []
+    current = []
+    for word in words:
+        current.append(word)
+        if word["word"].rstrip("\"')]}”").endswith((".", "!", "?")):
+            segments.append(current)
+            current = []
+    if current:
+        segments.append(current)
+    return [{"start": seg[0]["start"], "end": seg[-1]["end"], "text": "".join(w["word"] for w in seg), "words": seg}
+            for seg in segments]
+
+
+def realign_to_script(result, text):
+    """
+    Replace the recognized words of a Whisper result with the script's words,
+    keeping recognized timings where words match and spreading the time of
+    mismatched runs evenly over the script words they replace.
+    """
+    recognized = [word for segment in result["segments"] for word in segment.get("words", [])]
+    script = text.split()
+    timed = [None] * len(script)
+    matcher = difflib.SequenceMatcher(None, [_normalize(w["word"]) for w in recognized],
+                                      [_normalize(w) for w in script], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                timed[j] = (recognized[i]["start"], recognized[i]["end"])
+        elif tag == "replace":
+            edges = np.linspace(recognized[i1]["start"], recognized[i2 - 1]["end"], j2 - j1 + 1)
+            for n, j in enumerate(range(j1, j2)):
+                timed[j] = (float(edges[n]), float(edges[n + 1]))
+
+    # Script words Whisper missed entirely share the gap between their neighbours
+    j = 0
+    while j < len(script):
+        if timed[j] is not None:
+            j += 1
+            continue
+        gap_end = j
+        while gap_end < len(script) and timed[gap_end] is None:
+            gap_end += 1
+        left = timed[j - 1][1] if j > 0 else 0.0
+        right = timed[gap_end][0] if gap_end < len(script) else left + 0.3 * (gap_end - j)
+        edges = np.linspace(left, max(left, right), gap_end - j + 1)
+        for n in range(j, gap_end):
+            timed[n] = (float(edges[n - j]), float(edges[n - j + 1]))
+        j = gap_end
+
+    words = [{"word": " " + word, "start": round(start, 2), "end": round(end, 2)}
+             for word, (start, end) in zip(script, timed)]
+    return {"text": text, "segments": group_sentences(words)}
+
+
+def align_script(audio_path, text, device=None):
+    """
+    Word timings for the known script text spoken in audio_path.
+
+    Returns (result, timings) like transcribe_audio. Falls back to
+    transcription plus realign_to_script when the mean word probability is
+    below CONFIG["ALIGN_MIN_PROBABILITY"] or alignment fails.
+    """
+    from pipeline.subtitles import get_whisper_model, transcribe_audio
+
+    model, lock, load_time = get_whisper_model(device=device)
+    start = time.perf_counter()
+    words = text.split()
+    try:
+        # Inside the try: the stub model has no tokenizer and goes straight to the fallback
+        from whisper.tokenizer import get_tokenizer
+        tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                                  language=CONFIG["WHISPER_LANGUAGE"], task="transcribe")
+        samples = load_audio(audio_path).samples
+        aligned = []
+        with lock:
+            for window_start, window_end, first, last in plan_windows(samples, words):
+                offset = window_start / SAMPLE_RATE
+                for timing in _align_window(model, tokenizer, samples[window_start:window_end],
+                                            " ".join(words[first:last + 1])):
+                    aligned.append({"word": timing.word, "start": round(offset + float(timing.start), 2),
+                                    "end": round(offset + float(timing.end), 2),
+                                    "probability": float(timing.probability)})
+        confidence = float(np.mean([word["probability"] for word in aligned])) if aligned else 0.0
+    except Exception as e:
+        console.print(f"[yellow]Forced alignment failed ({e})[/]")
+        aligned, confidence = [], 0.0
+
+    if confidence >= CONFIG["ALIGN_MIN_PROBABILITY"]:
+        timings = {"load_s": load_time, "transcribe_s": time.perf_counter() - start, "source": "alignment"}
+        return {"text": text, "segments": group_sentences(aligned)}, timings
+
+    console.print(f"[yellow]Alignment confidence {confidence:.2f} too low, transcribing and mapping the script[/]")
+    result, timings = transcribe_audio(audio_path, device=device)
+    return realign_to_script(result, text), {**timings, "source": f"{timings['source']} + realign"}
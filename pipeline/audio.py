@@ -0,0 +1,109 @@
+# Narration audio helpers: raw decoding, the shared decoded asset and silence detection
+import os
+import subprocess
+import threading
+import numpy as np
+from pipeline.cache import hash_key, hash_file, cache_lookup, cache_write
+
+SAMPLE_RATE = 16000
+# Assets kept per process; each holds an open memory map
+MAX_CACHED_ASSETS = 32
+
+_ASSETS = {}
+_ASSETS_LOCK = threading.Lock()
+
+
+def decode_audio(path, sample_rate=SAMPLE_RATE):
+    """
+    Decode any ffmpeg-readable audio to mono float32 samples in [-1, 1].
+
+    Works on files that are still being written (the truncated tail frame is
+    dropped by ffmpeg), which the streaming transcriber relies on.
+    """
+    cmd = ["ffmpeg", "-nostdin", "-v", "quiet", "-i", path, "-f", "s16le", "-ac", "1",
+           "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-"]
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+class AudioAsset:
+    """
+    A narration file decoded once.
+
+    samples are the 16 kHz mono float32 decode, memory-mapped from the
+    "audio" cache under the file's content hash, so Whisper, alignment,
+    duration queries and other processes (the Whisper worker) all share one
+    decode. tempo_track renders the sped-up AAC track for the final mux once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.key = hash_key(hash_file(path), SAMPLE_RATE)
+        self._samples = None
+        self._lock = threading.Lock()
+
+    @property
+    def samples(self):
+        with self._lock:
+            if self._samples is None:
+                path = cache_lookup("audio", self.key, ".f32") or cache_write(
+                    "audio", self.key, ".f32", lambda f: decode_audio(self.path).tofile(f))
+                if os.path.getsize(path) == 0:
+                    self._samples = np.zeros(0, dtype=np.float32)
+                else:
+                    # Copy-on-write, since torch.from_numpy (inside Whisper) wants a writable array
+                    self._samples = np.memmap(path, dtype=np.float32, mode="c")
+        return self._samples
+
+    @property
+    def duration(self):
+        """Exact length in seconds of the decoded audio."""
+        return len(self.samples) / SAMPLE_RATE
+
+    def tempo_track(self, factor=1.3):
+        """Path of an AAC (ADTS) track of the audio sped up by factor, ready to stream-copy."""
+        key = hash_key(self.key, factor, "aac")
+        cached = cache_lookup("audio", key, ".aac")
+        if cached:
+            return cached
+        cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", self.path, "-filter:a", f"atempo={factor}",
+               "-c:a", "aac", "-f", "adts", "pipe:1"]
+        return cache_write("audio", key, ".aac", lambda f: subprocess.run(cmd, stdout=f, check=True))
+
+
+def load_audio(path):
+    """The AudioAsset for path, shared within the process while the file is unchanged."""
+    stat = os.stat(path)
+    ident = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _ASSETS_LOCK:
+        asset = _ASSETS.get(ident)
+        if asset is None:
+            if len(_ASSETS) >= MAX_CACHED_ASSETS:
+                _ASSETS.pop(next(iter(_ASSETS)))
+            asset = _ASSETS[ident] = AudioAsset(path)
+    return asset
+
+
+def find_silences(samples, sample_rate=SAMPLE_RATE, min_silence=0.3, threshold_db=-40.0, frame=0.02):
+    """
+    Return (start, end) sample ranges of pauses at least min_silence seconds
+    long, where the 20 ms frame RMS stays below threshold_db (dBFS).
+    """
+    frame_len = max(1, int(sample_rate * frame))
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return []
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    quiet = rms < 10 ** (threshold_db / 20)
+    # Run boundaries of the quiet mask
+    edges = np.diff(np.concatenate(([0], quiet.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    min_frames = int(np.ceil(min_silence / frame))
+    return [(int(s) * frame_len, int(e) * frame_len) for s, e in zip(starts, ends) if e - s >= min_frames]
+
+
+def split_points(samples, sample_rate=SAMPLE_RATE, **silence_args):
+    """Sample indices in the middle of every pause, i.e. safe places to cut speech."""
+    return [(start + end) // 2 for start, end in find_silences(samples, sample_rate, **silence_args)]
@@ -0,0 +1,253 @@
+"""
+Batch runner for auto-audio-generator
+Runs many scripts as independent jobs through per-stage worker pools, so one
+job's Whisper run can overlap with another job's ffmpeg encode.
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import CONFIG
+from pipeline.ffmpeg_runner import share_cores
+from pipeline.metrics import write_metrics
+from pipeline.stages import STAGES, new_job, run_stage, stale_stages
+from pipeline.utils import console
+
+
+def load_manifest(manifest_path):
+    """
+    Load job entries from a JSONL manifest or a directory of .txt scripts.
+
+    JSONL lines look like {"id": "...", "text": "...", "title": "..."}; only
+    "text" is required. In a directory every .txt file is one job, and an
+    optional first line "Title: ..." sets the Reddit card title.
+    """
+    entries = []
+    if os.path.isdir(manifest_path):
+        for name in sorted(os.listdir(manifest_path)):
+            if not name.endswith(".txt"):
+                continue
+            with open(os.path.join(manifest_path, name), "r", encoding="utf-8") as f:
+                text = f.read()
+            title = None
+            first_line, _, rest = text.partition("\n")
+            if first_line.lower().startswith("title:"):
+                title = first_line[len("title:"):].strip()
+                text = rest
+            entries.append({"id": os.path.splitext(name)[0], "text": text, "title": title})
+    else:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                entries.append({
+                    "id": str(entry.get("id") or f"job_{line_no:04d}"),
+                    "text": entry.get("text", ""),
+                    "title": entry.get("title"),
+                })
+    return entries
+
+
+def make_job(entry, output_dir, force=()):
+    """Build a job dict with its own output paths under output_dir/<id>/."""
+    job_dir = os.path.join(output_dir, entry["id"])
+    job = new_job(entry["id"], entry["text"], entry.get("title"), {
+        "voice": os.path.join(job_dir, os.path.basename(CONFIG["VOICE_OUTPUT"])),
+        "combined": os.path.join(job_dir, "combined.mp4"),
+        "segments": os.path.join(job_dir, "segments.json"),
+        "subtitles": os.path.join(job_dir, os.path.basename(CONFIG["SUBTITLE_FILE"])),
+        "final": os.path.join(job_dir, os.path.basename(CONFIG["FINAL_OUTPUT"])),
+        "metrics": os.path.join(job_dir, "metrics.json"),
+    }, force)
+    job["dir"] = job_dir
+    return job
+
+
+def _run_stage(job, stage, lock):
+    start = time.perf_counter()
+    ok = True
+    try:
+        run_stage(job, stage)
+    except Exception as e:
+        ok = False
+        with lock:
+            if not job["error"]:
+                job["error"] = f"{stage}: {e}"
+        console.print(f"❌ [red]Job {job['id']} failed at {stage}: {e}[/]")
+    job["timings"][stage] = time.perf_counter() - start
+    return ok
+
+
+def _unique_ids(entries):
+    """Make entry ids safe directory names, suffixing _1, _2... until each is unused."""
+    used = set()
+    for entry in entries:
+        base = re.sub(r"[^A-Za-z0-9_.-]+", "_", entry["id"]).strip("._") or "job"
+        candidate, count = base, 0
+        # A later literal "a_1" must not reuse the name given to a second "a"
+        while candidate in used:
+            count += 1
+            candidate = f"{base}_{count}"
+        used.add(candidate)
+        entry["id"] = candidate
+    return entries
+
+
+def run_batch(manifest_path, output_dir=None, limits=None, force=()):
+    """
+    Run every entry of a manifest as an independent job.
+
+    Voice runs first; video combining and Whisper subtitles then run side by
+    side, and the final encode starts once both are done. Each stage has its
+    own pool, sized by CONFIG["BATCH_STAGE_WORKERS"] or the `limits` override.
+    Stages whose artifacts are still up to date (see pipeline/stages.py) are
+    reused; `force` names stages to rerun anyway. Each job's stage metrics
+    are written to its metrics.json.
+    """
+    output_dir = output_dir or CONFIG["BATCH_OUTPUT_DIR"]
+    entries = [e for e in _unique_ids(load_manifest(manifest_path)) if e["text"] and e["text"].strip()]
+    if not entries:
+        console.print("❌ [red]No jobs found in manifest.[/]")
+        return None
+
+    limits = {**CONFIG["BATCH_STAGE_WORKERS"], **(limits or {})}
+    jobs = [make_job(entry, output_dir, force) for entry in entries]
+    for job in jobs:
+        os.makedirs(job["dir"], exist_ok=True)
+
+    console.print(f"📦 [bold blue]Running {len(jobs)} jobs with stage workers {limits}[/]")
+    from pipeline.voice import generate_voices, get_backend
+    backend = get_backend()
+    if backend.batched:
+        # One bulk synthesis call; the per-job voice stage then hits the cache
+        # Only for stale voices: rewriting an up-to-date file would invalidate everything after it
+        stale = [job for job in jobs if "voice" in stale_stages(job)]
+        try:
+            if stale:
+                generate_voices([(job["text"], job["paths"]["voice"]) for job in stale], backend)
+        except Exception as e:
+            console.print(f"[yellow]Batched {backend.label} synthesis failed ({e}), falling back to per-job voices[/]")
+    pools = {
+        stage: ThreadPoolExecutor(max_workers=max(1, int(limits[stage])), thread_name_prefix=f"batch-{stage}")
+        for stage in STAGES
+    }
+    lock = threading.Lock()
+    all_done = threading.Event()
+    remaining = [len(jobs)]
+
+    def finish(job):
+        # Idempotent, so the error path in submit() can always call it
+        with lock:
+            if "finished_at" in job:
+                return
+            job["finished_at"] = time.perf_counter()
+        try:
+            write_metrics(job)
+        except Exception as e:
+            console.print(f"[yellow]Could not write metrics for job {job['id']}: {e}[/]")
+        finally:
+            status = "❌ [red]failed" if job["error"] else "✅ [green]done"
+            console.print(f"{status}[/] job {job['id']}")
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    all_done.set()
+
+    def submit(stage, job, then):
+        def done(future):
+            # Exceptions raised in a done callback are only logged, which would leave all_done unset
+            try:
+                then(job, future.result())
+            except Exception as e:
+                with lock:
+                    if not job["error"]:
+                        job["error"] = f"{stage}: {e}"
+                console.print(f"❌ [red]Job {job['id']} failed after {stage}: {e}[/]")
+                finish(job)
+
+        pools[stage].submit(_run_stage, job, stage, lock).add_done_callback(done)
+
+    def after_voice(job, ok):
+        if not ok:
+            return finish(job)
+        job["pending"] = 2
+        submit("video", job, after_prerequisite)
+        submit("subtitles", job, after_prerequisite)
+
+    def after_prerequisite(job, ok):
+        with lock:
+            job["pending"] -= 1
+            ready = job["pending"] == 0
+        if not ready:
+            return
+        if job["error"]:
+            return finish(job)
+        submit("finalize", job, lambda job, ok: finish(job))
+
+    started = time.perf_counter()
+    # Video and finalize jobs encode side by side, so each gets its share of the ffmpeg core budget
+    with share_cores(int(limits["video"]) + int(limits["finalize"])):
+        for job in jobs:
+            job["started_at"] = started
+            submit("voice", job, after_voice)
+        all_done.wait()
+    wall = time.perf_counter() - started
+    for pool in pools.values():
+        pool.shutdown(wait=True)
+
+    summary = summarize_batch(jobs, wall, limits)
+    with open(os.path.join(output_dir, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print_batch_summary(summary)
+    return summary
+
+
+def summarize_batch(jobs, wall, limits):
+    """Aggregate per-stage busy time and overall throughput for a batch."""
+    stages = {}
+    for stage in STAGES:
+        times = [job["timings"][stage] for job in jobs if stage in job["timings"]]
+        stages[stage] = {
+            "workers": int(limits[stage]),
+            "runs": len(times),
+            "busy_s": round(sum(times), 3),
+            "mean_s": round(sum(times) / len(times), 3) if times else 0.0,
+            "max_s": round(max(times), 3) if times else 0.0,
+        }
+    succeeded = [job for job in jobs if not job["error"]]
+    latencies = [job["finished_at"] - job["started_at"] for job in succeeded]
+    return {
+        "jobs": len(jobs),
+        "succeeded": len(succeeded),
+        "failed": len(jobs) - len(succeeded),
+        "wall_s": round(wall, 3),
+        "jobs_per_hour": round(len(succeeded) / wall * 3600, 2) if wall > 0 else 0.0,
+        "mean_latency_s": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "stages": stages,
+        "errors": {job["id"]: job["error"] for job in jobs if job["error"]},
+        "outputs": {job["id"]: job["paths"]["final"] for job in succeeded},
+        "metrics": {job["id"]: job["paths"]["metrics"] for job in jobs},
+    }
+
+
+def print_batch_summary(summary):
+    from rich.table import Table
+
+    table = Table(title="Batch stage summary")
+    for column in ("Stage", "Workers", "Runs", "Busy (s)", "Mean (s)", "Max (s)"):
+        table.add_column(column)
+    for stage, stats in summary["stages"].items():
+        table.add_row(stage, str(stats["workers"]), str(stats["runs"]), f"{stats['busy_s']:.1f}",
+                      f"{stats['mean_s']:.1f}", f"{stats['max_s']:.1f}")
+    console.print(table)
+    console.print(
+        f"[bold green]{summary['succeeded']}/{summary['jobs']} jobs in {summary['wall_s']:.1f}s "
+        f"({summary['jobs_per_hour']:.1f} jobs/hour, mean latency {summary['mean_latency_s']:.1f}s)[/]"
+    )
+    for job_id, error in summary["errors"].items():
+        console.print(f"❌ [red]{job_id}: {error}[/]")
@@ -0,0 +1,187 @@
+"""
+Offline end-to-end benchmark of the stage graph.
+
+Every run builds a video from scratch on synthetic media, so the numbers are
+comparable between commits on a CPU-only box without network access: lavfi
+testsrc background clips, the stub TTS tone track (VOICE_BACKEND "stub") and
+the stub Whisper model, or a real small model such as "tiny" when its weights
+are already downloaded.
+
+    python -m pipeline.benchmark [--runs 3] [--words 120] [--whisper-model tiny] [--set RENDER_MODE=single_pass]
+
+The per-run stage metrics (see pipeline/metrics.py) and their medians are
+written to <work dir>/benchmark.json.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+
+from config import CONFIG
+from pipeline.metrics import job_report
+from pipeline.stages import new_job, run_job
+from pipeline.utils import console
+
+SCRIPT_VOCABULARY = ["so", "my", "neighbor", "asked", "me", "to", "watch", "his", "cat", "for", "the", "weekend",
+                     "and", "I", "said", "yes", "without", "thinking", "about", "it", "turns", "out", "was", "not",
+                     "a", "normal", "honestly", "nobody", "believed", "when", "told", "them", "what", "happened"]
+
+
+def make_test_clips(clip_dir, count=4, seconds=20):
+    """
+    lavfi testsrc clips with a sine soundtrack in CONFIG["NORMALIZE_FORMAT"],
+    so clip combining takes the stream-copy path. Existing clips are reused.
+    """
+    target = CONFIG["NORMALIZE_FORMAT"]
+    os.makedirs(clip_dir, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = os.path.join(clip_dir, f"testsrc_{index:02d}.mp4")
+        if not os.path.exists(path):
+            tmp_path = os.path.join(clip_dir, f"testsrc_{index:02d}.tmp.mp4")
+            cmd = ["ffmpeg", "-y", "-loglevel", "error",
+                   "-f", "lavfi", "-i", f"testsrc=size={target['width']}x{target['height']}:rate={target['fps']}:duration={seconds}",
+                   "-f", "lavfi", "-i", f"sine=frequency={220 + 110 * index}:sample_rate={target['sample_rate']}:duration={seconds}",
+                   "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+                   "-c:a", "aac", "-ac", str(target["channels"]), "-shortest", tmp_path]
+            subprocess.run(cmd, check=True)
+            os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+
+def synthetic_script(n_words, seed=0):
+    """A narration of n_words random words in sentences of 6 to 14 words."""
+    rng = random.Random(seed)
+    sentences = []
+    remaining = n_words
+    while remaining > 0:
+        words = [rng.choice(SCRIPT_VOCABULARY) for _ in range(min(remaining, rng.randint(6, 14)))]
+        sentences.append(" ".join(words).capitalize() + ".")
+        remaining -= len(words)
+    return " ".join(sentences)
+
+
+def summarize_runs(reports):
+    """Median wall/CPU time and the highest peak RSS of every metrics entry over successful runs."""
+    entries = {}
+    for report in reports:
+        if report["error"]:
+            continue
+        for key, entry in report["stages"].items():
+            entries.setdefault(key, []).append(entry)
+    summary = {}
+    for key, values in entries.items():
+        measured = [entry for entry in values if "wall_s" in entry]
+        if not measured:
+            continue
+        stats = {name: round(statistics.median(entry.get(name, 0.0) for entry in measured), 4)
+                 for name in ("wall_s", "cpu_s", "child_cpu_s")}
+        stats.update({name: max(entry.get(name, 0.0) for entry in measured)
+                      for name in ("peak_rss_mb", "child_peak_rss_mb")})
+        for name in ("load_s", "transcribe_s"):
+            if any(name in entry for entry in measured):
+                stats[name] = round(statistics.median(entry.get(name, 0.0) for entry in measured), 4)
+        summary[key] = stats
+    return summary
+
+
+def print_benchmark(summary, runs):
+    from rich.table import Table
+
+    table = Table(title=f"End-to-end benchmark (median of {runs} runs)")
+    for column in ("Step", "Wall (s)", "CPU (s)", "Child CPU (s)", "Peak RSS (MB)", "Child peak RSS (MB)"):
+        table.add_column(column)
+    for key, stats in summary.items():
+        step = key if "." not in key else "  " + key.split(".", 1)[1]
+        table.add_row(step, f"{stats['wall_s']:.2f}", f"{stats['cpu_s']:.2f}", f"{stats['child_cpu_s']:.2f}",
+                      f"{stats['peak_rss_mb']:.0f}", f"{stats['child_peak_rss_mb']:.0f}")
+    console.print(table)
+    whisper = summary.get("subtitles.whisper")
+    if whisper and "load_s" in whisper:
+        console.print(f"⏱️ [cyan]Whisper: load {whisper['load_s']:.2f}s, transcribe {whisper['transcribe_s']:.2f}s (median)[/]")
+
+
+def run_benchmark(work_dir=None, runs=3, words=120, clips=4, clip_seconds=20, whisper_model="stub", warm=False,
+                  overrides=None):
+    """
+    Run the full pipeline `runs` times on synthetic media under work_dir and
+    return the per-entry medians. Each run starts from an empty cache unless
+    `warm`, in which case the runs share one and every stage is still forced.
+    The Whisper model stays loaded between runs, as in a long-lived process.
+    `overrides` are extra CONFIG values, e.g. {"RENDER_MODE": "single_pass"}.
+    """
+    work_dir = os.path.abspath(work_dir or os.path.join(tempfile.gettempdir(), "auto-audio-benchmark"))
+    console.print(f"🧪 [bold blue]Benchmarking {runs} runs of {words} words in {work_dir}[/]")
+    make_test_clips(os.path.join(work_dir, "clips"), clips, clip_seconds)
+    text = synthetic_script(words)
+    saved = dict(CONFIG)
+    reports = []
+    try:
+        CONFIG.update({
+            "VIDEOS_DIR": os.path.join(work_dir, "clips"),
+            "VOICE_BACKEND": "stub",
+            "WHISPER_MODEL": whisper_model,
+            # Never hand transcription to a warm worker that might be running
+            "WHISPER_WORKER_SOCKET": os.path.join(work_dir, "no-worker.sock"),
+            "EMOJI_ALLOW_NETWORK": False,
+            "ENCODER_CACHE_PATH": os.path.join(work_dir, "encoders.json"),
+            "CLIP_SEED": 0,
+            **(overrides or {}),
+        })
+        for run in range(runs):
+            run_dir = os.path.join(work_dir, f"run_{run}")
+            shutil.rmtree(run_dir, ignore_errors=True)
+            cache_dir = os.path.join(work_dir, "cache") if warm else os.path.join(run_dir, "cache")
+            CONFIG.update(CACHE_DIR=cache_dir, CLIP_INDEX_PATH=os.path.join(cache_dir, "clip_index.sqlite"))
+            job = new_job(f"run_{run}", text, "What is the strangest thing a neighbor has asked you to do?", {
+                "voice": os.path.join(run_dir, "voice.mp3"),
+                "combined": os.path.join(run_dir, "combined.mp4"),
+                "segments": os.path.join(run_dir, "segments.json"),
+                "subtitles": os.path.join(run_dir, "subtitles.ass"),
+                "final": os.path.join(run_dir, "final.mp4"),
+                "metrics": os.path.join(run_dir, "metrics.json"),
+            }, force=("all",))
+            os.makedirs(run_dir, exist_ok=True)
+            if not run_job(job):
+                console.print(f"❌ [red]Benchmark run {run} failed: {job['error']}[/]")
+            reports.append(job_report(job))
+    finally:
+        CONFIG.clear()
+        CONFIG.update(saved)
+
+    summary = summarize_runs(reports)
+    settings = {"runs": runs, "words": words, "clips": clips, "clip_seconds": clip_seconds,
+                "whisper_model": whisper_model, "warm": warm, "overrides": overrides or {}}
+    with open(os.path.join(work_dir, "benchmark.json"), "w", encoding="utf-8") as f:
+        json.dump({"settings": settings, "median": summary, "runs": reports}, f, indent=2)
+    print_benchmark(summary, sum(1 for report in reports if not report["error"]))
+    return summary
+
+
+def _parse_override(pair):
+    key, _, value = pair.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the whole pipeline offline on synthetic media.")
+    parser.add_argument('--work-dir', type=str, help='Where clips, runs and benchmark.json go (default: a temp dir)')
+    parser.add_argument('--runs', type=int, default=3, help='Pipeline runs (medians are reported)')
+    parser.add_argument('--words', type=int, default=120, help='Words in the synthetic script')
+    parser.add_argument('--clips', type=int, default=4, help='testsrc background clips to generate')
+    parser.add_argument('--clip-seconds', type=float, default=20, help='Length of each background clip')
+    parser.add_argument('--whisper-model', type=str, default="stub", help='"stub" or a downloaded Whisper model, e.g. tiny')
+    parser.add_argument('--warm', action='store_true', help='Share one cache between runs instead of starting cold')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='CONFIG override for the runs, VALUE parsed as JSON if possible (repeatable)')
+    args = parser.parse_args()
+    run_benchmark(args.work_dir, args.runs, args.words, args.clips, args.clip_seconds, args.whisper_model,
+                  args.warm, dict(_parse_override(pair) for pair in args.set))
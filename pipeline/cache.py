@@ -0,0 +1,94 @@
+# Content-addressed on-disk cache shared by pipeline stages
+import hashlib
+import json
+import os
+import shutil
+import threading
+from config import CONFIG
+
+_EVICT_LOCK = threading.Lock()
+
+
+def hash_key(*parts):
+    """Stable sha256 key for a tuple of JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """sha256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_dir(namespace):
+    path = os.path.join(CONFIG["CACHE_DIR"], namespace)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def cache_path(namespace, key, suffix):
+    return os.path.join(cache_dir(namespace), f"{key}{suffix}")
+
+
+def cache_lookup(namespace, key, suffix):
+    """Return the cached file path for key, or None. A hit refreshes its LRU recency."""
+    path = cache_path(namespace, key, suffix)
+    if not os.path.exists(path):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return path
+
+
+def cache_store(namespace, key, suffix, src_path):
+    """Copy src_path into the cache under key, then trim the namespace to its size limit."""
+    path = cache_path(namespace, key, suffix)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, path)
+    evict(namespace)
+    return path
+
+
+def cache_write(namespace, key, suffix, write_fn):
+    """Create a cache entry by calling write_fn(file_obj) on a temp file, then trim the namespace."""
+    path = cache_path(namespace, key, suffix)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write_fn(f)
+    os.replace(tmp_path, path)
+    evict(namespace)
+    return path
+
+
+def evict(namespace, max_bytes=None):
+    """Remove least-recently-used entries until the namespace fits in max_bytes."""
+    if max_bytes is None:
+        limit_mb = CONFIG["CACHE_LIMITS_MB"].get(namespace)
+        if limit_mb is None:
+            return
+        max_bytes = int(limit_mb * 1024 * 1024)
+    directory = cache_dir(namespace)
+    with _EVICT_LOCK:
+        entries = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
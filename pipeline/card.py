@@ -0,0 +1,294 @@
+"""
+Reddit card rendering.
+
+Kept apart from pipeline/finalize.py because PIL and pilmoji (which pulls in
+requests) take a noticeable share of startup time; the render functions
+import this module only when a card is actually drawn.
+"""
+import argparse
+import os
+import shutil
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+from PIL.PngImagePlugin import PngInfo
+from pilmoji import Pilmoji
+from pilmoji.source import BaseSource, Twemoji
+
+from config import CONFIG
+from pipeline.cache import hash_key, cache_lookup, cache_store, cache_write
+from pipeline.card_layout import CARD_AWARDS, CARD_CANVAS_SIZE, CARD_LAYOUT_VERSION, CARD_PADDING, CARD_WIDTH
+from pipeline.utils import console
+
+
+@lru_cache(maxsize=None)
+def get_font(font_name, size):
+    """
+    Load fonts. Adjusted to look for Bold/Regular weights.
+    """
+    try:
+        # Update these paths to where your fonts actually live
+        base_path = "/run/media/predator/volume/DEV/auto-audio-generator/fonts/static/"
+        
+        # Mapping generic names to your likely file names
+        if font_name == "Bold":
+            path = os.path.join(base_path, "Roboto-Bold.ttf")
+        elif font_name == "Regular":
+            path = os.path.join(base_path, "Roboto-Regular.ttf")
+        else:
+            path = os.path.join(base_path, f"Roboto-{font_name}.ttf")
+
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size)
+            
+        return ImageFont.truetype("arial.ttf", size)
+    except OSError:
+        print(f"⚠️ Warning: Could not load {font_name} font. Using default.")
+        return ImageFont.load_default()
+
+def wrap_text_by_pixel(text, font, max_width, draw):
+    """
+    Wraps text based on pixel width.
+    """
+    lines = []
+    words = text.split()
+    current_line = []
+    
+    for word in words:
+        current_line.append(word)
+        test_line = " ".join(current_line)
+        bbox = draw.textbbox((0, 0), test_line, font=font)
+        w = bbox[2] - bbox[0]
+        
+        if w > max_width:
+            current_line.pop()
+            lines.append(" ".join(current_line))
+            current_line = [word]
+            
+    if current_line:
+        lines.append(" ".join(current_line))
+    return "\n".join(lines)
+
+def draw_verified_badge(draw, x, y, size=25):
+    """Draws a simple Twitter/Reddit style verified badge."""
+    # Blue scalloped circle (simplified as circle)
+    draw.ellipse((x, y, x + size, y + size), fill=(29, 155, 240)) # Twitter/Reddit Blue
+    # White checkmark
+    # Coordinates for a simple check
+    check_points = [
+        (x + size * 0.25, y + size * 0.5),
+        (x + size * 0.45, y + size * 0.7),
+        (x + size * 0.75, y + size * 0.3)
+    ]
+    draw.line(check_points, fill="white", width=3)
+
+class CachedEmojiSource(BaseSource):
+    """
+    Pilmoji source that serves emoji PNGs from the on-disk "emoji" cache.
+    Misses fall back to the font glyph, unless allow_network (default
+    CONFIG["EMOJI_ALLOW_NETWORK"]) is on: then they are fetched from Twemoji
+    once and stored. seed_emoji_cache fills the cache ahead of time.
+    """
+
+    _memory = {}
+    _fetched = set()
+
+    def __init__(self, upstream=None, allow_network=None):
+        self.upstream = upstream
+        self.allow_network = CONFIG.get("EMOJI_ALLOW_NETWORK", False) if allow_network is None else allow_network
+
+    def get_emoji(self, emoji, /):
+        key = "-".join(f"{ord(char):x}" for char in emoji)
+        data = self._memory.get(key)
+        # A glyph fallback remembered offline must not stop a networked source from fetching
+        if data is None or (not data and self.allow_network and key not in self._fetched):
+            path = cache_lookup("emoji", key, ".png")
+            if path:
+                with open(path, "rb") as f:
+                    data = f.read()
+            elif self.allow_network:
+                self._fetched.add(key)
+                self.upstream = self.upstream or Twemoji()
+                try:
+                    stream = self.upstream.get_emoji(emoji)
+                except Exception as e:
+                    console.print(f"[yellow]Warning: Could not fetch emoji {emoji}: {e}[/]")
+                    stream = None
+                # Remember failures too, so a process asks the network at most once per emoji
+                data = stream.read() if stream is not None else b""
+                if data:
+                    cache_write("emoji", key, ".png", lambda f: f.write(data))
+            else:
+                data = b""
+            self._memory[key] = data
+        return BytesIO(data) if data else None
+
+    def get_discord_emoji(self, id, /):
+        return None
+
+
+def generate_reddit_post_image(subtitles_path, output_path, custom_title=None, subreddit="AskRedit"):
+    """
+    Render the Reddit card cropped to its visible pixels.
+    Returns (image_path, title_text, (x, y)) where (x, y) is the card's
+    top-left position on the 1080x1920 frame.
+    """
+    # 1. Setup Content
+    title_text = custom_title if custom_title else "Provide a title"
+    awards_string = CARD_AWARDS
+
+    image_path = output_path.replace(".mp4", "_reddit_post.png")
+    if not image_path: image_path = "reddit_post_gen.png"
+
+    # Same title, subreddit and layout always draw the same card
+    card_key = hash_key(title_text, subreddit, awards_string, CARD_LAYOUT_VERSION, CARD_CANVAS_SIZE, CARD_WIDTH, CARD_PADDING)
+    cached_card = cache_lookup("cards", card_key, ".png")
+    if cached_card:
+        shutil.copyfile(cached_card, image_path)
+        console.print(f"♻️ [green]Reddit card reused from cache:[/] {image_path}")
+        with Image.open(image_path) as cached_img:
+            offset = tuple(int(v) for v in cached_img.text["card_offset"].split(","))
+        return image_path, title_text, offset
+
+    # 2. Canvas Setup (1080x1920)
+    W, H = CARD_CANVAS_SIZE
+    img = Image.new("RGBA", (W, H), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+
+    # 3. Visual Configuration (Matches the reference image)
+    card_width = CARD_WIDTH  # Wider to match the screenshot style
+    padding = CARD_PADDING
+    
+    # Colors
+    color_bg = (255, 255, 255, 255)
+    color_text_primary = (0, 0, 0)       # Pitch Black
+    color_text_secondary = (101, 119, 134) # Grey for handle/meta
+    
+    # Fonts
+    # Title needs to be heavy and readable
+    font_name = get_font("Bold", 38)
+    font_handle = get_font("Bold", 32) 
+    font_awards = get_font("Regular", 30) # For emoji sizing fallback
+    
+    # 4. Layout Calculation
+    
+    # --- Body Text Wrapping ---
+    text_max_width = card_width - (padding * 2)
+    wrapped_title = wrap_text_by_pixel(title_text, font_name, text_max_width, draw)
+    
+    # Calculate height of wrapped title
+    title_bbox = draw.multiline_textbbox((0, 0), wrapped_title, font=font_name, spacing=15)
+    title_pixel_height = title_bbox[3] - title_bbox[1]
+    
+    # Height breakdown:
+    # Padding Top (50) + Header (Avatar/Name/Awards ~120) + Spacing (30) + Title + Spacing (30) + Footer (Socials ~60) + Padding Bottom (50)
+    header_height = 130 
+    footer_height = 80
+    card_height = padding + header_height + title_pixel_height + 40 + footer_height + padding
+    
+    card_x = (W - card_width) // 2
+    card_y = (H - card_height) // 2 # Center in middle of screen
+
+    # 5. Draw Card Background
+    # Add a slight drop shadow
+    shadow_offset = 10
+    draw.rounded_rectangle(
+        (card_x + shadow_offset, card_y + shadow_offset, card_x + card_width + shadow_offset, card_y + card_height + shadow_offset),
+        radius=30,
+        fill=(0, 0, 0, 60)
+    )
+    draw.rounded_rectangle(
+        (card_x, card_y, card_x + card_width, card_y + card_height),
+        radius=30,
+        fill=color_bg,
+    )
+
+    # 6. Initialize Pilmoji (This is the magic part for Emojis)
+    # It wraps the image object so when we call pilmoji.text, it renders colored emojis
+    with Pilmoji(img, source=CachedEmojiSource()) as pilmoji:
+
+        # --- Draw Header ---
+        cursor_x = card_x + padding
+        cursor_y = card_y + padding
+        
+        # 1. Avatar (Blue circle with Snoo face or similar)
+        avatar_size = 100
+        # Draw avatar background
+        draw.ellipse((cursor_x, cursor_y, cursor_x + avatar_size, cursor_y + avatar_size), fill=(24, 60, 200)) # Deep Blue
+        # Draw a simple face (white circle + smile)
+        draw.ellipse((cursor_x + 20, cursor_y + 20, cursor_x + 80, cursor_y + 80), fill="white")
+        draw.arc((cursor_x + 35, cursor_y + 45, cursor_x + 65, cursor_y + 65), 0, 180, fill="black", width=3)
+        
+        # 2. Name and Verified Badge
+        text_start_x = cursor_x + avatar_size + 25
+        text_start_y = cursor_y + 10
+        
+        # Draw "Starterstories"
+        pilmoji.text((text_start_x, text_start_y), subreddit, font=font_handle, fill=color_text_primary)
+        
+        # Calculate width of name to place badge next to it
+        name_bbox = draw.textbbox((0, 0), subreddit, font=font_handle)
+        name_width = name_bbox[2] - name_bbox[0]
+        
+        # Draw Blue Verified Badge
+        draw_verified_badge(draw, text_start_x + name_width + 10, text_start_y + 8, size=28)
+        
+        # 3. Awards / Emojis Row
+        # Located below the name
+        awards_y = text_start_y + 45
+        pilmoji.text((text_start_x, awards_y), awards_string, font=font_awards, fill=color_text_primary)
+
+        # --- Draw Main Title ---
+        title_y = cursor_y + header_height + 20
+        pilmoji.text(
+            (cursor_x, title_y),
+            wrapped_title,
+            font=font_name,
+            fill=color_text_primary,
+            spacing=15
+        )
+
+        # --- Draw Footer (Fake counts) ---
+        footer_y = title_y + title_pixel_height + 50
+        
+        # Grey icons/text for 99+ likes/comments
+        pilmoji.text((cursor_x, footer_y), "❤️ 99+", font=font_handle, fill=color_text_secondary)
+        pilmoji.text((cursor_x + 180, footer_y), "💬 99+", font=font_handle, fill=color_text_secondary)
+        pilmoji.text((card_x + card_width - padding - 100, footer_y), "Share", font=font_handle, fill=color_text_secondary)
+
+
+    # 7. Save only the visible card (plus shadow); the offset travels in the PNG metadata
+    bbox = img.getbbox()
+    offset = (bbox[0], bbox[1])
+    info = PngInfo()
+    info.add_text("card_offset", f"{offset[0]},{offset[1]}")
+    img.crop(bbox).save(image_path, pnginfo=info)
+    cache_store("cards", card_key, ".png", image_path)
+    print(f"Saved Reddit card to {image_path}")
+    return image_path, title_text, offset
+
+
+def seed_emoji_cache(texts=()):
+    """
+    Fetch every emoji the card draws (plus any in texts) from Twemoji into
+    the "emoji" cache, so later renders stay offline. Returns the number of
+    emoji images now cached.
+    """
+    source = CachedEmojiSource(allow_network=True)
+    font = get_font("Regular", 30)
+    scratch = Image.new("RGBA", (64, 64))
+    with Pilmoji(scratch, source=source) as pilmoji:
+        for text in (CARD_AWARDS, "❤️ 99+", "💬 99+", *texts):
+            pilmoji.text((0, 0), text, font=font)
+    return sum(1 for data in CachedEmojiSource._memory.values() if data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-fetch the Reddit card's emoji into the on-disk cache.")
+    parser.add_argument('--seed-emoji', action='store_true', help='Fetch the emoji the card draws')
+    parser.add_argument('texts', nargs='*', help='Extra titles whose emoji should be cached too')
+    args = parser.parse_args()
+    if not args.seed_emoji:
+        parser.error("nothing to do; pass --seed-emoji")
+    console.print(f"😀 [green]{seed_emoji_cache(args.texts)} emoji cached in {CONFIG['CACHE_DIR']}/emoji[/]")
@@ -0,0 +1,15 @@
+"""
+Reddit card layout constants.
+
+Kept out of pipeline/card.py so the stage graph can fingerprint cards by
+CARD_LAYOUT_VERSION without importing PIL.
+"""
+
+# Bump when the card drawing code (pipeline/card.py) changes so cached cards are re-rendered
+CARD_LAYOUT_VERSION = 2
+CARD_CANVAS_SIZE = (1080, 1920)
+CARD_WIDTH = 850
+CARD_PADDING = 50
+# The "Awards" row as seen in your image
+# Note: You can change these emojis to whatever you want
+CARD_AWARDS = "💀 ❤️ 🤝 ☀️ 💎 🏆 👻"
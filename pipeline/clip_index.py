@@ -0,0 +1,119 @@
+# Persistent metadata index for background clips in VIDEOS_DIR
+import json
+import os
+import sqlite3
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from config import CONFIG
+from pipeline.utils import list_videos, console
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    codec TEXT,
+    pix_fmt TEXT,
+    fps REAL,
+    has_audio INTEGER,
+    audio_codec TEXT,
+    sample_rate INTEGER,
+    channels INTEGER
+)
+"""
+_COLUMNS = ("path", "mtime", "size", "duration", "width", "height", "codec", "pix_fmt",
+            "fps", "has_audio", "audio_codec", "sample_rate", "channels")
+
+
+def _connect():
+    index_path = CONFIG["CLIP_INDEX_PATH"]
+    index_dir = os.path.dirname(index_path)
+    if index_dir:
+        os.makedirs(index_dir, exist_ok=True)
+    conn = sqlite3.connect(index_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def _parse_rate(rate):
+    try:
+        num, _, den = rate.partition("/")
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError, AttributeError):
+        return None
+
+
+def probe_clip(path):
+    """Run ffprobe once and return the index fields for a clip (duration None if unreadable)."""
+    info = {"duration": None, "width": None, "height": None, "codec": None, "pix_fmt": None, "fps": None,
+            "has_audio": 0, "audio_codec": None, "sample_rate": None, "channels": None}
+    cmd = ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", "-show_streams", path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        data = json.loads(result.stdout)
+    except (subprocess.CalledProcessError, ValueError):
+        console.print(f"❌ [red]Could not probe {path}[/]")
+        return info
+
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    duration = data.get("format", {}).get("duration") or (video or {}).get("duration")
+    try:
+        info["duration"] = float(duration) if duration else None
+    except ValueError:
+        pass
+    if video:
+        info.update(width=video.get("width"), height=video.get("height"), codec=video.get("codec_name"),
+                    pix_fmt=video.get("pix_fmt"), fps=_parse_rate(video.get("avg_frame_rate")))
+    if audio:
+        info.update(has_audio=1, audio_codec=audio.get("codec_name"),
+                    sample_rate=int(audio.get("sample_rate") or 0) or None, channels=audio.get("channels"))
+    return info
+
+
+def refresh_index(video_dir, workers=None):
+    """
+    Bring the index up to date for video_dir and return its clips as dicts.
+
+    Files are re-probed only when new or when their mtime/size changed; the
+    probes run in parallel. Rows for files that disappeared are dropped.
+    """
+    files = {}
+    for path in list_videos(video_dir):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files[os.path.abspath(path)] = (stat.st_mtime, stat.st_size)
+
+    conn = _connect()
+    try:
+        rows = {row["path"]: dict(row) for row in conn.execute("SELECT * FROM clips")}
+        prefix = os.path.join(os.path.abspath(video_dir), "")
+        removed = [path for path in rows if path.startswith(prefix) and path not in files]
+        stale = [path for path, (mtime, size) in files.items()
+                 if path not in rows or rows[path]["mtime"] != mtime or rows[path]["size"] != size]
+
+        if stale:
+            console.print(f"🔎 [cyan]Probing {len(stale)} new or changed clips...[/]")
+            with ThreadPoolExecutor(max_workers=workers or CONFIG["CLIP_PROBE_WORKERS"]) as pool:
+                probed = list(pool.map(probe_clip, stale))
+            for path, info in zip(stale, probed):
+                mtime, size = files[path]
+                rows[path] = {"path": path, "mtime": mtime, "size": size, **info}
+            conn.executemany(
+                f"INSERT OR REPLACE INTO clips ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                [tuple(rows[path][column] for column in _COLUMNS) for path in stale],
+            )
+        if removed:
+            conn.executemany("DELETE FROM clips WHERE path = ?", [(path,) for path in removed])
+        conn.commit()
+    finally:
+        conn.close()
+
+    return [rows[path] for path in sorted(files)]
@@ -0,0 +1,211 @@
+"""
+Encoder capability probing and profile selection.
+
+Probes the local ffmpeg once (listed encoders plus a tiny test encode for the
+hardware ones), caches the result on disk per ffmpeg binary and picks an
+encoder profile for a target. Benchmark the candidates on a reference clip:
+
+    python -m pipeline.encoders --benchmark clip.mp4 [--seconds 10]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+
+from config import CONFIG
+from pipeline.utils import console
+
+# "global_args" go once at the start of the command, "input_args" before each
+# decoded video input, and "filter" is appended to the final video chain
+# (hardware upload for VAAPI/QSV).
+ENCODER_PROFILES = {
+    "nvenc": {"encoder": "h264_nvenc", "hardware": True, "global_args": [], "input_args": ["-hwaccel", "cuda"],
+              "filter": "", "args": ["-preset", "p4", "-rc", "vbr", "-cq", "23", "-b:v", "0"]},
+    "qsv": {"encoder": "h264_qsv", "hardware": True, "global_args": [], "input_args": [],
+            "filter": "format=nv12", "args": ["-preset", "faster", "-global_quality", "23"]},
+    "vaapi": {"encoder": "h264_vaapi", "hardware": True, "global_args": ["-vaapi_device", "/dev/dri/renderD128"],
+              "input_args": [], "filter": "format=nv12,hwupload", "args": ["-qp", "23"]},
+    "x264_veryfast": {"encoder": "libx264", "hardware": False, "global_args": [], "input_args": [], "filter": "",
+                      "args": ["-preset", "veryfast", "-crf", "23"]},
+    "x264_fast": {"encoder": "libx264", "hardware": False, "global_args": [], "input_args": [], "filter": "",
+                  "args": ["-preset", "fast", "-crf", "23"]},
+    "x264_medium": {"encoder": "libx264", "hardware": False, "global_args": [], "input_args": [], "filter": "",
+                    "args": ["-preset", "medium", "-crf", "21"]},
+}
+
+# Candidates in order of preference for each target
+ENCODER_TARGETS = {
+    "speed": ["nvenc", "qsv", "vaapi", "x264_veryfast"],
+    "balanced": ["nvenc", "qsv", "vaapi", "x264_fast"],
+    "quality": ["x264_medium", "x264_fast"],
+}
+
+
+def _ffmpeg_identity():
+    binary = shutil.which("ffmpeg") or "ffmpeg"
+    try:
+        stat = os.stat(binary)
+        return f"{os.path.realpath(binary)}:{stat.st_mtime}:{stat.st_size}"
+    except OSError:
+        return binary
+
+
+def _load_probe_cache():
+    path = CONFIG["ENCODER_CACHE_PATH"]
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_probe_cache(data):
+    path = CONFIG["ENCODER_CACHE_PATH"]
+    cache_dir = os.path.dirname(path)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _test_encode(profile):
+    """Encode a few synthetic frames to check the encoder actually works on this host."""
+    vf = "format=yuv420p" + (f",{profile['filter']}" if profile["filter"] else "")
+    cmd = (["ffmpeg", "-v", "error", "-hide_banner"] + profile["global_args"]
+           + ["-f", "lavfi", "-i", "testsrc=size=256x256:rate=30:duration=0.2", "-vf", vf,
+              "-c:v", profile["encoder"]] + profile["args"] + ["-f", "null", "-"])
+    try:
+        return subprocess.run(cmd, capture_output=True, timeout=30).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+_PROBE_MEMO = {}
+
+
+def probe_encoders(force=False):
+    """
+    Return {"profiles": {name: bool}, "benchmarks": {...}} for the current ffmpeg
+    binary, probing only when the binary is new or changed (or force=True).
+    """
+    identity = _ffmpeg_identity()
+    if not force and identity in _PROBE_MEMO:
+        return _PROBE_MEMO[identity]
+    cache = _load_probe_cache()
+    if not force and identity in cache:
+        _PROBE_MEMO[identity] = cache[identity]
+        return cache[identity]
+
+    console.print("🔎 [cyan]Probing ffmpeg encoders...[/]")
+    try:
+        listed = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+    except OSError:
+        listed = ""
+    profiles = {}
+    for name, profile in ENCODER_PROFILES.items():
+        available = re.search(rf"\s{re.escape(profile['encoder'])}\s", listed) is not None
+        if available and profile["hardware"]:
+            available = _test_encode(profile)
+        profiles[name] = available
+    entry = {"profiles": profiles, "benchmarks": cache.get(identity, {}).get("benchmarks", {})}
+    cache[identity] = entry
+    _save_probe_cache(cache)
+    _PROBE_MEMO[identity] = entry
+    return entry
+
+
+def select_encoder(target=None):
+    """
+    Pick an encoder profile for target ("speed", "balanced", "quality" or
+    "fastest", which uses the best measured benchmark). CONFIG["ENCODER_PROFILE"]
+    forces a profile when it is available. Returns the profile dict plus "name".
+    """
+    probe = probe_encoders()
+    available = {name for name, ok in probe["profiles"].items() if ok}
+    if not CONFIG.get("USE_GPU"):
+        available = {name for name in available if not ENCODER_PROFILES[name]["hardware"]}
+
+    forced = CONFIG.get("ENCODER_PROFILE")
+    target = target or CONFIG.get("ENCODER_TARGET", "balanced")
+    if forced in available:
+        candidates = [forced]
+    elif target == "fastest" and probe["benchmarks"]:
+        candidates = sorted(probe["benchmarks"], key=lambda name: -probe["benchmarks"][name]["fps"])
+    else:
+        candidates = ENCODER_TARGETS.get(target, ENCODER_TARGETS["balanced"])
+        # Keep honouring the configured GPU encoder ahead of other hardware
+        if any(ENCODER_PROFILES[name]["hardware"] for name in candidates):
+            preferred = [name for name, profile in ENCODER_PROFILES.items() if profile["encoder"] == CONFIG.get("GPU_ENCODER")]
+            candidates = preferred + [name for name in candidates if name not in preferred]
+    name = next((name for name in candidates if name in available), "x264_fast")
+    return profile_for(name)
+
+
+def profile_for(name):
+    """Profile dict for name with CONFIG-driven x264 threads/tune applied."""
+    profile = dict(ENCODER_PROFILES[name], name=name)
+    args = list(profile["args"])
+    if profile["encoder"] == "libx264":
+        if CONFIG.get("X264_TUNE"):
+            args.extend(["-tune", CONFIG["X264_TUNE"]])
+        if CONFIG.get("X264_THREADS"):
+            args.extend(["-threads", str(CONFIG["X264_THREADS"])])
+    profile["args"] = args
+    return profile
+
+
+def benchmark_encoders(reference_clip, seconds=10):
+    """Encode the first `seconds` of reference_clip with every available profile and record fps."""
+    from rich.table import Table
+
+    probe = probe_encoders()
+    results = {}
+    for name, ok in probe["profiles"].items():
+        if not ok:
+            continue
+        profile = profile_for(name)
+        vf = "crop=in_h*9/16:in_h,scale=1080:1920" + (f",{profile['filter']}" if profile["filter"] else "")
+        cmd = (["ffmpeg", "-hide_banner", "-nostdin", "-y"] + profile["global_args"] + profile["input_args"]
+               + ["-t", str(seconds), "-i", reference_clip, "-an", "-vf", vf, "-c:v", profile["encoder"]]
+               + profile["args"] + ["-f", "null", "-"])
+        start = time.perf_counter()
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        frames = re.findall(r"frame=\s*(\d+)", result.stderr)
+        if result.returncode != 0 or not frames:
+            console.print(f"❌ [red]{name} failed on {reference_clip}[/]")
+            continue
+        results[name] = {"fps": round(int(frames[-1]) / wall, 2), "wall_s": round(wall, 3)}
+
+    identity = _ffmpeg_identity()
+    cache = _load_probe_cache()
+    cache.setdefault(identity, probe)["benchmarks"] = results
+    _save_probe_cache(cache)
+    _PROBE_MEMO.pop(identity, None)
+
+    table = Table(title=f"Encoder benchmark ({seconds}s of {os.path.basename(reference_clip)})")
+    for column in ("Profile", "Encoder", "fps", "Wall (s)"):
+        table.add_column(column)
+    for name, stats in sorted(results.items(), key=lambda item: -item[1]["fps"]):
+        table.add_row(name, ENCODER_PROFILES[name]["encoder"], f"{stats['fps']:.1f}", f"{stats['wall_s']:.2f}")
+    console.print(table)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Probe ffmpeg encoders and benchmark encoder profiles.")
+    parser.add_argument('--benchmark', type=str, help='Reference clip to measure encode fps on')
+    parser.add_argument('--seconds', type=float, default=10, help='Seconds of the reference clip to encode')
+    parser.add_argument('--reprobe', action='store_true', help='Ignore the cached probe for this ffmpeg binary')
+    args = parser.parse_args()
+    probe = probe_encoders(force=args.reprobe)
+    console.print({name: ok for name, ok in probe["profiles"].items()})
+    if args.benchmark:
+        benchmark_encoders(args.benchmark, args.seconds)
@@ -0,0 +1,89 @@
+"""
+Local fake of the ElevenLabs text-to-speech HTTP API for offline testing.
+
+Serves the stub TTS audio (one tone per sentence, with pauses) from the same
+endpoints the SDK calls, dribbling streamed responses out at a configurable
+multiple of real time:
+
+    python -m pipeline.fake_tts_server [--port 8787] [--realtime 2.0]
+
+Then set CONFIG["ELEVEN_BASE_URL"] = "http://127.0.0.1:8787" and keep
+VOICE_BACKEND at "elevenlabs".
+"""
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pipeline.utils import console
+from pipeline.voice import StubTextToSpeech
+
+_PATH = re.compile(r"^/v1/text-to-speech/(?P<voice_id>[^/?]+)(?P<stream>/stream)?(?:\?.*)?$")
+
+
+class _FakeTTSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    tts = StubTextToSpeech()
+
+    def do_POST(self):
+        match = _PATH.match(self.path)
+        if not match:
+            self.send_error(404)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError:
+            self.send_error(400, "invalid JSON body")
+            return
+        audio = self.tts.synthesize(body.get("text", ""))
+
+        if not match.group("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+            return
+
+        # 128 kbit/s mp3 is 16000 bytes per second of audio
+        chunk_size = self.server.chunk_size
+        delay = chunk_size / 16000 / self.server.realtime
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for offset in range(0, len(audio), chunk_size):
+            chunk = audio[offset:offset + chunk_size]
+            self.wfile.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+            time.sleep(delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host="127.0.0.1", port=8787, realtime=2.0, chunk_size=4096):
+    """Run the fake server until interrupted."""
+    server = ThreadingHTTPServer((host, port), _FakeTTSHandler)
+    server.daemon_threads = True
+    server.realtime = realtime
+    server.chunk_size = chunk_size
+    console.print(f"🎙️ [green]Fake TTS server on http://{host}:{port} ({realtime}x real time)[/]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake streaming ElevenLabs text-to-speech API.")
+    parser.add_argument('--host', type=str, default="127.0.0.1", help='Interface to bind')
+    parser.add_argument('--port', type=int, default=8787, help='Port to listen on')
+    parser.add_argument('--realtime', type=float, default=2.0, help='Stream speed as a multiple of real time')
+    parser.add_argument('--chunk-size', type=int, default=4096, help='Bytes per streamed chunk')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.realtime, args.chunk_size)
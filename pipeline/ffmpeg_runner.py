@@ -0,0 +1,271 @@
+"""
+Shared asyncio runner for ffmpeg.
+
+Every run goes through one background event loop:
+
+- "-progress pipe:1" output is parsed into frame/fps/speed and, when the
+  expected output duration is known, an ETA. Long runs print a progress line
+  every FFMPEG_PROGRESS_INTERVAL seconds, and the final numbers go to the
+  job metrics under "ffmpeg".
+- Each run reserves its thread count from a process-wide core budget
+  (FFMPEG_CORE_BUDGET), so concurrent jobs queue instead of oversubscribing
+  the CPU. By default a run reserves a fair share of the budget: all of it,
+  or budget / N inside share_cores(N) (batch mode), and ffmpeg is told to
+  use that many threads. A run asking for 0 threads (stream copies, muxing)
+  is not budgeted.
+- Runs longer than their timeout are killed, and cancelling the caller
+  (Ctrl+C) kills ffmpeg too.
+- A failure raises FFmpegError carrying the tail of ffmpeg's stderr.
+
+Commands are full ffmpeg argument lists that end with the output path.
+"""
+import asyncio
+import contextlib
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+
+from config import CONFIG
+from pipeline.metrics import record
+from pipeline.utils import console
+
+STDERR_TAIL_LINES = 20
+
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+_BUDGET = None
+# Top-level ffmpeg runs expected at once (see share_cores)
+_SHARERS = 1
+
+
+class FFmpegError(subprocess.CalledProcessError):
+    """An ffmpeg run that failed or timed out; stderr holds the tail of its log."""
+
+    def __init__(self, returncode, cmd, stderr_tail, label="ffmpeg", timed_out=False):
+        super().__init__(returncode, cmd, stderr="\n".join(stderr_tail))
+        self.label = label
+        self.stderr_tail = list(stderr_tail)
+        self.timed_out = timed_out
+
+    def __str__(self):
+        reason = "timed out" if self.timed_out else f"exited with {self.returncode}"
+        last = next((line for line in reversed(self.stderr_tail) if line.strip()), "")
+        return f"{self.label} {reason}: {last}" if last else f"{self.label} {reason}"
+
+
+def core_budget():
+    """Cores shared by all concurrent ffmpeg runs: FFMPEG_CORE_BUDGET, or every core when 0."""
+    return int(CONFIG.get("FFMPEG_CORE_BUDGET") or os.cpu_count() or 1)
+
+
+def default_threads():
+    """Cores a run reserves unless it says otherwise: FFMPEG_THREADS, or its fair share of the budget."""
+    return int(CONFIG.get("FFMPEG_THREADS") or 0) or max(1, core_budget() // _SHARERS)
+
+
+@contextlib.contextmanager
+def share_cores(runs):
+    """Within the block, default_threads splits the core budget over `runs` concurrent runs."""
+    global _SHARERS
+    previous, _SHARERS = _SHARERS, max(1, int(runs))
+    try:
+        yield
+    finally:
+        _SHARERS = previous
+
+
+class _CoreBudget:
+    """Counting semaphore over cores; only touched from the runner's event loop."""
+
+    def __init__(self):
+        self.used = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, cores):
+        total = core_budget()
+        cores = min(cores, total)
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.used + cores <= total)
+            self.used += cores
+        return cores
+
+    async def release(self, cores):
+        async with self._cond:
+            self.used -= cores
+            self._cond.notify_all()
+
+
+def _loop():
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="ffmpeg-runner", daemon=True).start()
+            _LOOP = loop
+    return _LOOP
+
+
+def _reset_after_fork():
+    # The loop thread does not survive fork; a child starts its own on first use
+    global _LOOP, _LOOP_LOCK, _BUDGET
+    _LOOP, _LOOP_LOCK, _BUDGET = None, threading.Lock(), None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _requested_threads(cmd, threads):
+    # An explicit -threads in the command (e.g. X264_THREADS) wins over the default
+    if "-threads" in cmd:
+        last = len(cmd) - 1 - cmd[::-1].index("-threads")
+        return int(cmd[last + 1]) or core_budget(), False
+    if threads is None:
+        threads = default_threads()
+    return threads, threads > 0
+
+
+def _parse_speed(value):
+    try:
+        return float(value.rstrip("x"))
+    except ValueError:
+        return None
+
+
+async def run_ffmpeg_async(cmd, threads=None, duration=None, timeout=None, label="ffmpeg", on_progress=None):
+    """
+    Run one ffmpeg command; see run_ffmpeg. Must run on the runner's own
+    event loop, which owns the core budget. Returns the run's stats dict.
+    """
+    global _BUDGET
+    if _BUDGET is None:
+        _BUDGET = _CoreBudget()
+    budget = _BUDGET
+    cores, inject = _requested_threads(cmd, threads)
+    timeout = timeout if timeout is not None else (CONFIG.get("FFMPEG_TIMEOUT") or None)
+    interval = CONFIG.get("FFMPEG_PROGRESS_INTERVAL", 10)
+
+    queued = time.perf_counter()
+    reserved = await budget.acquire(cores) if cores > 0 else 0
+    start = time.perf_counter()
+    args = [cmd[0], "-nostdin", "-progress", "pipe:1", "-nostats", *cmd[1:-1]]
+    if inject:
+        args.extend(["-threads", str(cores)])
+    args.append(cmd[-1])
+
+    stats = {"threads": cores, "queued_s": round(start - queued, 3), "frames": 0, "fps": None, "speed": None,
+             "out_time_s": 0.0}
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+    timed_out = False
+    proc = None
+    try:
+        proc = await asyncio.create_subprocess_exec(*args, stdin=asyncio.subprocess.DEVNULL,
+                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+
+        async def read_progress():
+            block = {}
+            last_report = time.perf_counter()
+            async for raw in proc.stdout:
+                key, _, value = raw.decode("utf-8", "replace").strip().partition("=")
+                block[key] = value
+                if key != "progress":
+                    continue
+                if block.get("frame", "").isdigit():
+                    stats["frames"] = int(block["frame"])
+                try:
+                    stats["fps"] = float(block.get("fps", ""))
+                except ValueError:
+                    pass
+                stats["speed"] = _parse_speed(block.get("speed", "")) or stats["speed"]
+                if block.get("out_time_us", "").lstrip("-").isdigit():
+                    stats["out_time_s"] = max(0.0, int(block["out_time_us"]) / 1e6)
+                if duration and stats["speed"]:
+                    stats["eta_s"] = max(0.0, (duration - stats["out_time_s"]) / stats["speed"])
+                block = {}
+                if on_progress:
+                    on_progress(dict(stats))
+                elif interval and time.perf_counter() - last_report >= interval:
+                    last_report = time.perf_counter()
+                    done = f"{min(1.0, stats['out_time_s'] / duration):.0%}, " if duration else ""
+                    eta = f", ETA {stats['eta_s']:.0f}s" if "eta_s" in stats else ""
+                    console.print(f"⏳ [cyan]{label}: {done}{stats['fps'] or 0:.0f} fps, "
+                                  f"{stats['speed'] or 0:.2f}x{eta}[/]")
+
+        async def read_stderr():
+            async for raw in proc.stderr:
+                tail.append(raw.decode("utf-8", "replace").rstrip())
+
+        readers = asyncio.gather(read_progress(), read_stderr())
+        try:
+            await asyncio.wait_for(asyncio.shield(readers), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            proc.kill()
+            await readers
+        returncode = await proc.wait()
+    except asyncio.CancelledError:
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    finally:
+        if reserved:
+            await budget.release(reserved)
+
+    stats["wall_s"] = round(time.perf_counter() - start, 3)
+    if timed_out or returncode != 0:
+        raise FFmpegError(returncode, args, tail, label, timed_out)
+    return stats
+
+
+def run_ffmpeg(cmd, threads=None, duration=None, timeout=None, label="ffmpeg", on_progress=None):
+    """
+    Run an ffmpeg command and block until it finishes; callable from any thread.
+
+    threads is the cores the run reserves from the core budget (and passes to
+    ffmpeg as -threads before the last output); None means the -threads
+    already in cmd, or default_threads(), and 0 skips the budget for
+    I/O-bound runs such as stream copies.
+    duration (expected output seconds) enables the ETA; timeout defaults to
+    FFMPEG_TIMEOUT. Returns stats (wall_s, queued_s, threads, frames, fps,
+    speed, out_time_s), also recorded in the job metrics.
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        run_ffmpeg_async(cmd, threads, duration, timeout, label, on_progress), _loop())
+    try:
+        stats = future.result()
+    except BaseException:
+        # Interrupted or failed: make sure ffmpeg is not left running
+        future.cancel()
+        raise
+    record("ffmpeg", **stats)
+    return stats
+
+
+def run_ffmpeg_all(cmds, threads=None, duration=None, timeout=None, label="ffmpeg"):
+    """
+    Run several ffmpeg commands concurrently (within the core budget) and
+    return their stats in order. The first failure cancels the rest.
+    """
+    async def run_all():
+        tasks = [asyncio.ensure_future(run_ffmpeg_async(cmd, threads, duration, timeout, f"{label} {i + 1}/{len(cmds)}"))
+                 for i, cmd in enumerate(cmds)]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    future = asyncio.run_coroutine_threadsafe(run_all(), _loop())
+    try:
+        results = future.result()
+    except BaseException:
+        future.cancel()
+        raise
+    record("ffmpeg", runs=len(results), wall_s=max((stats["wall_s"] for stats in results), default=0.0),
+           frames=sum(stats["frames"] for stats in results))
+    return results
@@ -1,14 +1,15 @@
-
-from pipeline.utils import get_video_duration, get_audio_duration, check_gpu_support, console
+from pipeline.utils import console
+from pipeline.encoders import profile_for, select_encoder
+from pipeline.metrics import measure
+from pipeline.ffmpeg_runner import default_threads, run_ffmpeg, run_ffmpeg_all
 from config import CONFIG
-import subprocess
-import json
+import math
 import re
-from datetime import datetime
+import shutil
+from fractions import Fraction
+from concurrent.futures import ThreadPoolExecutor
 import os
-from PIL import Image, ImageDraw, ImageFont
-import textwrap
-from pilmoji import Pilmoji
+
 
 def extract_first_sentence(subtitles_path):
     """Extract the first sentence from ASS subtitle file."""
@@ -57,234 +58,320 @@ def extract_first_sentence(subtitles_path):
         return "Check out this amazing video!"
 
 
-def get_font(font_name, size):
+def _subtitle_input(subtitles_path, work_dir):
     """
-    Load fonts. Adjusted to look for Bold/Regular weights.
+    Extra ffmpeg input for the subtitles. With CONFIG["SUBTITLE_RENDERER"] set
+    to "sprites" the events are pre-rendered into work_dir and returned as
+    (input args, (x, y) of the sprite band); otherwise ([], None) and the ass
+    filter burns them in.
     """
-    try:
-        # Update these paths to where your fonts actually live
-        base_path = "/run/media/predator/volume/DEV/auto-audio-generator/fonts/static/"
-        
-        # Mapping generic names to your likely file names
-        if font_name == "Bold":
-            path = os.path.join(base_path, "Roboto-Bold.ttf")
-        elif font_name == "Regular":
-            path = os.path.join(base_path, "Roboto-Regular.ttf")
-        else:
-            path = os.path.join(base_path, f"Roboto-{font_name}.ttf")
+    if CONFIG.get("SUBTITLE_RENDERER", "ass") != "sprites":
+        return [], None
+    from pipeline.subtitle_sprites import render_sprite_track
+    with measure("sprites"):
+        list_path, offset = render_sprite_track(subtitles_path, work_dir)
+    if list_path is None:
+        return [], None
+    return ["-f", "concat", "-safe", "0", "-i", list_path], offset
 
-        if os.path.exists(path):
-            return ImageFont.truetype(path, size)
-            
-        return ImageFont.truetype("arial.ttf", size)
-    except OSError:
-        print(f"⚠️ Warning: Could not load {font_name} font. Using default.")
-        return ImageFont.load_default()
 
-def wrap_text_by_pixel(text, font, max_width, draw):
+def _subtitle_and_card_chain(video_label, subtitles_path, card_label, card_offset, overlay_duration,
+                             sprite_label=None, sprite_offset=None):
     """
-    Wraps text based on pixel width.
+    Filter chain that burns subtitles into video_label and overlays the
+    cropped card at card_offset for the first overlay_duration seconds, ending in [out].
+    With sprite_label the pre-rendered sprite track is overlaid at sprite_offset instead of using ass.
     """
-    lines = []
-    words = text.split()
-    current_line = []
-    
-    for word in words:
-        current_line.append(word)
-        test_line = " ".join(current_line)
-        bbox = draw.textbbox((0, 0), test_line, font=font)
-        w = bbox[2] - bbox[0]
-        
-        if w > max_width:
-            current_line.pop()
-            lines.append(" ".join(current_line))
-            current_line = [word]
-            
-    if current_line:
-        lines.append(" ".join(current_line))
-    return "\n".join(lines)
-
-def draw_verified_badge(draw, x, y, size=25):
-    """Draws a simple Twitter/Reddit style verified badge."""
-    # Blue scalloped circle (simplified as circle)
-    draw.ellipse((x, y, x + size, y + size), fill=(29, 155, 240)) # Twitter/Reddit Blue
-    # White checkmark
-    # Coordinates for a simple check
-    check_points = [
-        (x + size * 0.25, y + size * 0.5),
-        (x + size * 0.45, y + size * 0.7),
-        (x + size * 0.75, y + size * 0.3)
-    ]
-    draw.line(check_points, fill="white", width=3)
-
-def generate_reddit_post_image(subtitles_path, output_path, custom_title=None, subreddit="AskRedit"):
-    # 1. Setup Content
-    title_text = custom_title if custom_title else "Provide a title"
-    
-    # The "Awards" row as seen in your image
-    # Note: You can change these emojis to whatever you want
-    awards_string = "💀 ❤️ 🤝 ☀️ 💎 🏆 👻"
-
-    # 2. Canvas Setup (1080x1920)
-    W, H = 1080, 1920
-    img = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(img)
-
-    # 3. Visual Configuration (Matches the reference image)
-    card_width = 850  # Wider to match the screenshot style
-    padding = 50      
-    
-    # Colors
-    color_bg = (255, 255, 255, 255)
-    color_text_primary = (0, 0, 0)       # Pitch Black
-    color_text_secondary = (101, 119, 134) # Grey for handle/meta
-    
-    # Fonts
-    # Title needs to be heavy and readable
-    font_name = get_font("Bold", 38)
-    font_handle = get_font("Bold", 32) 
-    font_awards = get_font("Regular", 30) # For emoji sizing fallback
-    
-    # 4. Layout Calculation
-    
-    # --- Body Text Wrapping ---
-    text_max_width = card_width - (padding * 2)
-    wrapped_title = wrap_text_by_pixel(title_text, font_name, text_max_width, draw)
-    
-    # Calculate height of wrapped title
-    title_bbox = draw.multiline_textbbox((0, 0), wrapped_title, font=font_name, spacing=15)
-    title_pixel_height = title_bbox[3] - title_bbox[1]
-    
-    # Height breakdown:
-    # Padding Top (50) + Header (Avatar/Name/Awards ~120) + Spacing (30) + Title + Spacing (30) + Footer (Socials ~60) + Padding Bottom (50)
-    header_height = 130 
-    footer_height = 80
-    card_height = padding + header_height + title_pixel_height + 40 + footer_height + padding
-    
-    card_x = (W - card_width) // 2
-    card_y = (H - card_height) // 2 # Center in middle of screen
-
-    # 5. Draw Card Background
-    # Add a slight drop shadow
-    shadow_offset = 10
-    draw.rounded_rectangle(
-        (card_x + shadow_offset, card_y + shadow_offset, card_x + card_width + shadow_offset, card_y + card_height + shadow_offset),
-        radius=30,
-        fill=(0, 0, 0, 60)
-    )
-    draw.rounded_rectangle(
-        (card_x, card_y, card_x + card_width, card_y + card_height),
-        radius=30,
-        fill=color_bg,
+    x, y = card_offset
+    if sprite_label:
+        subtitles = f"{video_label}{sprite_label}overlay={sprite_offset[0]}:{sprite_offset[1]}:eof_action=pass[vv];"
+    else:
+        escaped_subtitles = subtitles_path.replace(":", "\\:").replace(",", "\\,")
+        subtitles = f"{video_label}ass={escaped_subtitles}[vv];"
+    return (
+        subtitles
+        + f"[vv]{card_label}overlay={x}:{y}:enable='lt(t,{overlay_duration})':eof_action=pass[out]"
     )
 
-    # 6. Initialize Pilmoji (This is the magic part for Emojis)
-    # It wraps the image object so when we call pilmoji.text, it renders colored emojis
-    with Pilmoji(img) as pilmoji:
 
-        # --- Draw Header ---
-        cursor_x = card_x + padding
-        cursor_y = card_y + padding
-        
-        # 1. Avatar (Blue circle with Snoo face or similar)
-        avatar_size = 100
-        # Draw avatar background
-        draw.ellipse((cursor_x, cursor_y, cursor_x + avatar_size, cursor_y + avatar_size), fill=(24, 60, 200)) # Deep Blue
-        # Draw a simple face (white circle + smile)
-        draw.ellipse((cursor_x + 20, cursor_y + 20, cursor_x + 80, cursor_y + 80), fill="white")
-        draw.arc((cursor_x + 35, cursor_y + 45, cursor_x + 65, cursor_y + 65), 0, 180, fill="black", width=3)
-        
-        # 2. Name and Verified Badge
-        text_start_x = cursor_x + avatar_size + 25
-        text_start_y = cursor_y + 10
-        
-        # Draw "Starterstories"
-        pilmoji.text((text_start_x, text_start_y), subreddit, font=font_handle, fill=color_text_primary)
-        
-        # Calculate width of name to place badge next to it
-        name_bbox = draw.textbbox((0, 0), subreddit, font=font_handle)
-        name_width = name_bbox[2] - name_bbox[0]
-        
-        # Draw Blue Verified Badge
-        draw_verified_badge(draw, text_start_x + name_width + 10, text_start_y + 8, size=28)
-        
-        # 3. Awards / Emojis Row
-        # Located below the name
-        awards_y = text_start_y + 45
-        pilmoji.text((text_start_x, awards_y), awards_string, font=font_awards, fill=color_text_primary)
-
-        # --- Draw Main Title ---
-        title_y = cursor_y + header_height + 20
-        pilmoji.text(
-            (cursor_x, title_y),
-            wrapped_title,
-            font=font_name,
-            fill=color_text_primary,
-            spacing=15
-        )
+def _encoder_output(encoder, filter_complex, label="[out]"):
+    """Append the encoder profile's upload filter to label; returns (filter_complex, video map label)."""
+    if encoder["filter"]:
+        return f"{filter_complex};{label}{encoder['filter']}[enc]", "[enc]"
+    return filter_complex, label
 
-        # --- Draw Footer (Fake counts) ---
-        footer_y = title_y + title_pixel_height + 50
-        
-        # Grey icons/text for 99+ likes/comments
-        pilmoji.text((cursor_x, footer_y), "❤️ 99+", font=font_handle, fill=color_text_secondary)
-        pilmoji.text((cursor_x + 180, footer_y), "💬 99+", font=font_handle, fill=color_text_secondary)
-        pilmoji.text((card_x + card_width - padding - 100, footer_y), "Share", font=font_handle, fill=color_text_secondary)
 
+def variant_path(output_path, variant):
+    """
+    Output file of a variant: its suffix appended to output_path's stem.
+    Without one it is _<name> plus .jpg for thumbnails, or output_path's extension.
+    """
+    root, ext = os.path.splitext(output_path)
+    if variant.get("thumbnails"):
+        ext = ".jpg"
+    return root + variant.get("suffix", f"_{variant['name']}{ext}")
+
+
+def _variant_outputs(encoder, filter_complex, audio_map, duration, output_path, variants, label="[out]"):
+    """
+    Split the composited label into the master output plus one branch per
+    variant (see CONFIG["OUTPUT_VARIANTS"]), so crop, subtitles and card are
+    rendered once however many files come out of the run. Returns
+    (filter_complex, ffmpeg output args for every output).
+    """
+    if variants:
+        branches = ["[master]"] + [f"[variant{i}]" for i in range(len(variants))]
+        filter_complex += f";{label}split={len(branches)}{''.join(branches)}"
+        label = "[master]"
+    filter_complex, video_map = _encoder_output(encoder, filter_complex, label)
+    # The runner only sets -threads on the last output; every encoder of a multi-output run shares its reservation
+    threads = ["-threads", str(default_threads())] if variants else []
+    outputs = ["-map", video_map, "-map", audio_map,
+               "-c:v", encoder["encoder"], *threads, *encoder["args"], "-c:a", "copy", "-shortest", output_path]
+    for i, variant in enumerate(variants):
+        path = variant_path(output_path, variant)
+        if variant.get("thumbnails"):
+            # Evenly spaced frames over the whole video, tiled side by side into one image
+            count = int(variant["thumbnails"])
+            filter_complex += (f";[variant{i}]fps={count}/{duration:.3f},scale={variant.get('width', 216)}:-2,"
+                               f"tile={count}x1[thumbs{i}]")
+            outputs.extend(["-map", f"[thumbs{i}]", "-frames:v", "1", "-update", "1", path])
+            continue
+        profile = profile_for(variant["profile"]) if variant.get("profile") else encoder
+        if profile["global_args"] and profile["global_args"] != encoder["global_args"]:
+            raise ValueError(f"Variant {variant['name']}: encoder profile {profile['name']} needs its own device")
+        chain = f"scale={variant['width']}:{variant.get('height', -2)}"
+        if profile["filter"]:
+            chain += f",{profile['filter']}"
+        filter_complex += f";[variant{i}]{chain}[venc{i}]"
+        outputs.extend(["-map", f"[venc{i}]", "-map", audio_map,
+                        "-c:v", profile["encoder"], *threads, *variant.get("args", profile["args"]), "-c:a", "copy"])
+        if variant.get("duration"):
+            outputs.extend(["-t", str(variant["duration"])])
+        outputs.extend(["-shortest", path])
+    return filter_complex, outputs
 
-    # 7. Save
-    image_path = output_path.replace(".mp4", "_reddit_post.png")
-    if not image_path: image_path = "reddit_post_gen.png"
-    
-    img.save(image_path)
-    print(f"Saved Reddit card to {image_path}")
-    return image_path, title_text
 
+def _print_variants(output_path, variants):
+    for variant in variants:
+        console.print(f"✅ [green]{variant['name']} variant saved to:[/] {variant_path(output_path, variant)}")
 
-def process_video(input_video, voice_audio, subtitles_path, output_path, custom_title=None, overlay_duration=3.0):
+
+def process_video(input_video, voice_audio, subtitles_path, output_path, custom_title=None, overlay_duration=3.0,
+                  variants=None):
     """
     Processes the video with an overlay image.
     Args:
         overlay_duration (float): How long the image stays on screen (in seconds).
+        variants (list): Extra outputs encoded in the same run; defaults to CONFIG["OUTPUT_VARIANTS"].
     """
+    variants = (CONFIG.get("OUTPUT_VARIANTS") or []) if variants is None else variants
+    chunks = int(CONFIG.get("RENDER_CHUNKS") or 0)
+    if chunks > 1 and variants:
+        console.print("[yellow]Output variants share one ffmpeg run, so RENDER_CHUNKS is ignored[/]")
+    elif chunks > 1:
+        return process_video_chunked(input_video, voice_audio, subtitles_path, output_path, custom_title,
+                                     overlay_duration, chunks)
+
     console.print(f"🎬 [green]Processing final video... Image will show for {overlay_duration}s[/]")
     
     # Generate Reddit post image
-    reddit_image_path, first_sentence = generate_reddit_post_image(subtitles_path, output_path, custom_title)
+    from pipeline.card import generate_reddit_post_image
+    with measure("card"):
+        reddit_image_path, first_sentence, card_offset = generate_reddit_post_image(subtitles_path, output_path, custom_title)
     
-    use_gpu, video_encoder, video_decoder = check_gpu_support()
-    voice_duration = get_audio_duration(voice_audio)
+    from pipeline.audio import load_audio
+    encoder = select_encoder()
+    voice = load_audio(voice_audio)
+    voice_duration = voice.duration
+    with measure("tempo"):
+        voice_track = voice.tempo_track(1.3)
     start_time = 0
     segment_duration = voice_duration
     
-    escaped_subtitles = subtitles_path.replace(":", "\\:").replace(",", "\\,")
-    input_params = []
-    if use_gpu and video_decoder:
-        input_params.extend(["-hwaccel", "cuda", "-c:v", video_decoder])
+    # Only the part of the combined clip that survives the 1.3x speed-up is decoded
+    input_params = list(encoder["input_args"])
     input_params.extend(["-ss", str(start_time), "-t", str(segment_duration)])
 
     # Filter complex with DYNAMIC duration
     # We use the overlay_duration variable here in the 'enable' clause
+    sprite_dir = f"{output_path}.sprites"
+    sprite_input, sprite_offset = _subtitle_input(subtitles_path, sprite_dir)
     filter_complex = (
         f"[0:v]crop=in_h*9/16:in_h,scale=1080:1920,setpts=PTS/1.3[v];"
-        f"[v]ass={escaped_subtitles}[vv];"
-        f"[1:v]scale=1080:1920[img];"
-        f"[vv][img]overlay=0:0:enable='lt(t,{overlay_duration})'[out]"
+        + _subtitle_and_card_chain("[v]", subtitles_path, "[1:v]", card_offset, overlay_duration,
+                                   "[3:v]" if sprite_input else None, sprite_offset)
     )
+    filter_complex, outputs = _variant_outputs(encoder, filter_complex, "2:a", voice_duration / 1.3, output_path,
+                                               variants)
     
-    cmd = ["ffmpeg", "-y",
-        "-i", input_video,
-        "-loop", "1", "-t", str(segment_duration), "-i", reddit_image_path,
-        "-i", voice_audio,
+    cmd = ["ffmpeg", "-y", *encoder["global_args"],
+        *input_params, "-i", input_video,
+        "-loop", "1", "-t", str(overlay_duration), "-i", reddit_image_path,
+        "-i", voice_track,
+        *sprite_input,
         "-filter_complex", filter_complex,
-        "-map", "[out]", "-map", "2:a",
-        "-c:v", video_encoder, "-c:a", "aac",
-        "-filter:a", "atempo=1.3",
-        "-preset", "fast", "-crf", "23",
-        "-shortest", output_path
+        *outputs
     ]
 
-    subprocess.run(cmd, check=True)
+    with measure("encode"):
+        run_ffmpeg(cmd, duration=voice_duration / 1.3, label="final encode")
+    shutil.rmtree(sprite_dir, ignore_errors=True)
     console.print(f"✅ [green]Final video saved to:[/] {output_path}")
+    _print_variants(output_path, variants)
     
     return output_path
+
+
+def _chunk_bounds(frames, fps, chunks):
+    """
+    Output-timeline chunk boundaries as output frame indices, for frames
+    frames at fps. Cuts fall on whole frames rather than whole seconds
+    (24 fps sped up 1.3x is 31.2 fps), so chunks join without dropped or
+    duplicated frames.
+    """
+    chunks = max(1, min(chunks, int(frames / fps // CONFIG["MIN_CHUNK_DURATION"])))
+    inner = sorted({round(frames * k / chunks) for k in range(1, chunks)} - {0})
+    return [0] + [cut for cut in inner if cut < frames] + [frames]
+
+
+def _video_fps(path):
+    """Frame rate of path's video as a Fraction (29.97 becomes 30000/1001); NORMALIZE_FORMAT's if unknown."""
+    from pipeline.clip_index import probe_clip
+    fps = probe_clip(path)["fps"] or CONFIG["NORMALIZE_FORMAT"]["fps"]
+    return Fraction(fps).limit_denominator(1001)
+
+
+def process_video_chunked(input_video, voice_audio, subtitles_path, output_path, custom_title=None,
+                          overlay_duration=3.0, chunks=4):
+    """
+    Same output as process_video, but the timeline is split into chunks that
+    are encoded by parallel ffmpeg processes and joined with the concat demuxer.
+
+    Chunks cut on output frame boundaries. Each chunk seeks to its source
+    frames, shifts its timestamps to the chunk start so the ASS events and
+    the card window line up with the full-length timeline, then resets them
+    for encoding. The voice track is encoded once and muxed over the joined
+    video, so frame count and A/V sync match the single-pass output.
+    """
+    from pipeline.card import generate_reddit_post_image
+    with measure("card"):
+        reddit_image_path, first_sentence, card_offset = generate_reddit_post_image(subtitles_path, output_path, custom_title)
+    from pipeline.audio import load_audio
+    encoder = select_encoder()
+    voice = load_audio(voice_audio)
+    total = voice.duration / 1.3
+    speed = Fraction(13, 10)
+    source_fps = _video_fps(input_video)
+    # process_video keeps the source frames before voice.duration; output frame i is source frame i
+    frame = 1 / source_fps
+    bounds = _chunk_bounds(math.ceil(voice.duration * source_fps), source_fps * speed, chunks)
+    console.print(f"🎬 [green]Processing final video in {len(bounds) - 1} parallel chunks...[/]")
+
+    work_dir = f"{output_path}.chunks"
+    os.makedirs(work_dir, exist_ok=True)
+    # Chunks split this run's share of the core budget; an explicit X264_THREADS in the encoder args wins
+    threads = max(1, default_threads() // (len(bounds) - 1))
+    # Sprite timestamps are absolute, like the shifted chunk timestamps, so every chunk reads the whole track
+    sprite_input, sprite_offset = _subtitle_input(subtitles_path, os.path.join(work_dir, "sprites"))
+
+    chunk_paths = [os.path.join(work_dir, f"chunk_{index:03d}.mp4") for index in range(len(bounds) - 1)]
+
+    def chunk_command(index):
+        first, end = bounds[index], bounds[index + 1]
+        # Seek half a frame early so rounding can't drop the first frame; shifting by the seek
+        # then puts every frame back on its full-timeline output time
+        seek = max(Fraction(0), first * frame - frame / 2)
+        if end == bounds[-1]:
+            # The last chunk ends where process_video's input does
+            limits = (["-t", f"{voice.duration - float(seek):.6f}"], [])
+        else:
+            limits = (["-t", f"{float((end - first + 1) * frame):.6f}"], ["-frames:v", str(end - first)])
+        filter_complex = (
+            f"[0:v]crop=in_h*9/16:in_h,scale=1080:1920,setpts=PTS/1.3+{float(seek / speed):.6f}/TB[v];"
+            + _subtitle_and_card_chain("[v]", subtitles_path, "[1:v]", card_offset, overlay_duration,
+                                       "[2:v]" if sprite_input else None, sprite_offset)
+            + ";[out]setpts=PTS-STARTPTS[chunk]"
+        )
+        filter_complex, video_map = _encoder_output(encoder, filter_complex, "[chunk]")
+        return ["ffmpeg", "-y", *encoder["global_args"],
+            *encoder["input_args"], "-ss", f"{float(seek):.6f}", *limits[0],
+            "-i", input_video,
+            "-loop", "1", "-t", str(overlay_duration), "-i", reddit_image_path,
+            *sprite_input,
+            "-filter_complex", filter_complex,
+            "-map", video_map, "-an",
+            "-c:v", encoder["encoder"], *encoder["args"],
+            *limits[1], chunk_paths[index]
+        ]
+
+    with measure("encode"), ThreadPoolExecutor(max_workers=1) as pool:
+        audio_job = pool.submit(voice.tempo_track, 1.3)
+        run_ffmpeg_all([chunk_command(index) for index in range(len(bounds) - 1)], threads=threads,
+                       duration=total / (len(bounds) - 1), label="chunk")
+        audio_path = audio_job.result()
+
+    list_file = os.path.join(work_dir, "chunks.txt")
+    with open(list_file, "w") as f:
+        for path in chunk_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file, "-i", audio_path,
+           "-map", "0:v", "-map", "1:a", "-c", "copy", "-shortest", output_path]
+    with measure("join"):
+        run_ffmpeg(cmd, threads=0, label="join")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    console.print(f"✅ [green]Final video saved to:[/] {output_path}")
+
+    return output_path
+
+
+def render_single_pass(segments, voice_audio, subtitles_path, output_path, custom_title=None, overlay_duration=3.0,
+                       variants=None):
+    """
+    Render the final video straight from the source clips in one ffmpeg run.
+
+    Each segment ({"path", "start", "duration"}) is input-seeked, cropped and
+    scaled, then everything is concatenated, sped up, subtitled and overlaid
+    in a single filter graph, so no intermediate combined.mp4 is encoded.
+    variants are extra outputs of the same graph, as in process_video.
+    """
+    variants = (CONFIG.get("OUTPUT_VARIANTS") or []) if variants is None else variants
+    console.print(f"🎬 [green]Rendering final video in a single pass from {len(segments)} clips...[/]")
+    from pipeline.card import generate_reddit_post_image
+    with measure("card"):
+        reddit_image_path, first_sentence, card_offset = generate_reddit_post_image(subtitles_path, output_path, custom_title)
+
+    from pipeline.audio import load_audio
+    encoder = select_encoder()
+    with measure("tempo"):
+        voice_track = load_audio(voice_audio).tempo_track(1.3)
+
+    cmd = ["ffmpeg", "-y", *encoder["global_args"]]
+    for segment in segments:
+        cmd.extend([*encoder["input_args"], "-ss", f"{segment['start']:.3f}", "-t", f"{segment['duration']:.3f}", "-i", segment["path"]])
+    card_index = len(segments)
+    voice_index = card_index + 1
+    cmd.extend(["-loop", "1", "-t", str(overlay_duration), "-i", reddit_image_path, "-i", voice_track])
+    sprite_dir = f"{output_path}.sprites"
+    sprite_input, sprite_offset = _subtitle_input(subtitles_path, sprite_dir)
+    cmd.extend(sprite_input)
+
+    scaled = [f"[{i}:v]crop=in_h*9/16:in_h,scale=1080:1920,setsar=1[s{i}]" for i in range(len(segments))]
+    concat = "".join(f"[s{i}]" for i in range(len(segments))) + f"concat=n={len(segments)}:v=1:a=0,setpts=PTS/1.3[v]"
+    filter_complex = ";".join(scaled + [concat]) + ";" + (
+        _subtitle_and_card_chain("[v]", subtitles_path, f"[{card_index}:v]", card_offset, overlay_duration,
+                                 f"[{voice_index + 1}:v]" if sprite_input else None, sprite_offset)
+    )
+    duration = sum(segment["duration"] for segment in segments) / 1.3
+    filter_complex, outputs = _variant_outputs(encoder, filter_complex, f"{voice_index}:a", duration, output_path,
+                                               variants)
+    cmd.extend(["-filter_complex", filter_complex, *outputs])
+
+    with measure("encode"):
+        run_ffmpeg(cmd, duration=duration, label="single-pass encode")
+    shutil.rmtree(sprite_dir, ignore_errors=True)
+    console.print(f"✅ [green]Final video saved to:[/] {output_path}")
+    _print_variants(output_path, variants)
+
+    return output_path
@@ -0,0 +1,119 @@
+"""
+Structured per-stage metrics.
+
+run_stage wraps every stage in measure(), and the steps inside a stage (clip
+selection and combining, Whisper load vs transcribe, the Reddit card, the
+final encode) add nested entries such as "finalize.encode" while the job's
+metrics are bound to the running thread. Each entry records:
+
+    wall_s             elapsed time
+    cpu_s              CPU time of this process (all threads, so Whisper's torch threads count)
+    child_cpu_s        CPU time of subprocesses (ffmpeg, TTS engines) that exited meanwhile
+    peak_rss_mb        this process's peak RSS so far
+    child_peak_rss_mb  largest peak RSS of any finished subprocess so far
+
+RSS figures are high-water marks, so a stage shows a higher peak than the
+previous one only if it raised it. In batch mode stages of different jobs
+overlap, and CPU figures include whatever ran alongside.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: wall time only
+    resource = None
+
+_current = threading.local()
+
+
+def _rusage():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def _cpu(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
+@contextmanager
+def collecting(metrics):
+    """Bind a metrics dict to this thread, so measure() and record() fill it."""
+    previous = getattr(_current, "metrics", None), getattr(_current, "prefix", "")
+    _current.metrics, _current.prefix = metrics, ""
+    try:
+        yield metrics
+    finally:
+        _current.metrics, _current.prefix = previous
+
+
+@contextmanager
+def measure(name):
+    """
+    Record wall/CPU time and peak RSS of the block as entry `name`, nested
+    under any enclosing measure(). A no-op when no metrics are bound.
+    """
+    metrics = getattr(_current, "metrics", None)
+    if metrics is None:
+        yield None
+        return
+    prefix = _current.prefix
+    key = prefix + name
+    entry = metrics.setdefault(key, {})
+    _current.prefix = key + "."
+    before = _rusage()
+    start = time.perf_counter()
+    try:
+        yield entry
+    except BaseException as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.prefix = prefix
+        entry["wall_s"] = round(time.perf_counter() - start, 4)
+        after = _rusage()
+        if after:
+            # ru_maxrss is in KiB on Linux
+            entry["cpu_s"] = round(_cpu(after[0]) - _cpu(before[0]), 4)
+            entry["child_cpu_s"] = round(_cpu(after[1]) - _cpu(before[1]), 4)
+            entry["peak_rss_mb"] = round(after[0].ru_maxrss / 1024, 1)
+            entry["child_peak_rss_mb"] = round(after[1].ru_maxrss / 1024, 1)
+
+
+def record(name, **values):
+    """Add values to entry `name` under the current measure(), e.g. Whisper's own timings."""
+    metrics = getattr(_current, "metrics", None)
+    if metrics is not None:
+        metrics.setdefault(_current.prefix + name, {}).update(
+            {key: round(value, 4) if isinstance(value, float) else value for key, value in values.items()})
+
+
+def job_report(job):
+    """The JSON-ready metrics of a job: its entries plus totals over the top-level stages."""
+    stages = job.get("metrics", {})
+    top = [entry for key, entry in stages.items() if "." not in key]
+    return {
+        "job": job["id"],
+        "error": job.get("error"),
+        "wall_s": round(sum(entry.get("wall_s", 0.0) for entry in top), 4),
+        "cpu_s": round(sum(entry.get("cpu_s", 0.0) for entry in top), 4),
+        "child_cpu_s": round(sum(entry.get("child_cpu_s", 0.0) for entry in top), 4),
+        "stages": stages,
+    }
+
+
+def write_metrics(job, path=None):
+    """Write job_report(job) to path (default job["paths"]["metrics"]); returns the path."""
+    path = path or job["paths"]["metrics"]
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job_report(job), f, indent=2)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,259 @@
+"""
+Resumable stage graph shared by pipeline_run and the batch runner.
+
+    voice -> video, subtitles -> finalize
+
+Next to each stage's artifact sits a <artifact>.fp.json sidecar holding the
+fingerprint of everything that went into it: the stage's config keys, its own
+inputs (text and voice settings, clip seed, card title) and the digests of
+the upstream artifacts it was built from. A rerun reuses every stage whose
+sidecar still matches and whose artifact is unchanged on disk, so after a
+subtitle style tweak only the subtitles (rebuilt from the cached transcript)
+and the final encode run again. Forced stages always rerun, and anything
+downstream follows only if the rebuilt artifact's content changed.
+
+Every stage run is measured (see pipeline/metrics.py); run_job writes the
+job's metrics to paths["metrics"] when that is set. Each stage imports its
+implementation when it runs, so importing this module (and pipeline_run)
+stays cheap and a re-render never loads the TTS or Whisper stacks.
+"""
+import json
+import os
+import random
+
+from config import CONFIG
+from pipeline.cache import hash_file, hash_key
+from pipeline.card_layout import CARD_LAYOUT_VERSION
+from pipeline.metrics import collecting, measure, write_metrics
+from pipeline.utils import console
+
+STAGES = ("voice", "video", "subtitles", "finalize")
+STAGE_DEPS = {
+    "voice": (),
+    "video": ("voice",),
+    "subtitles": ("voice",),
+    "finalize": ("voice", "video", "subtitles"),
+}
+# Config keys that change each stage's artifact
+STAGE_CONFIG_KEYS = {
+    "voice": (),  # covered by voice_cache_key
+    "video": ("VIDEOS_DIR", "RENDER_MODE", "USE_RANDOM_SEGMENT", "MIN_SEGMENT_DURATION", "MAX_SEGMENT_DURATION",
+              "NORMALIZE_FORMAT", "CLIP_SEED"),
+    "subtitles": ("WHISPER_MODEL", "WHISPER_MODE", "WHISPER_LANGUAGE", "ALIGN_MIN_PROBABILITY", "WHISPER_CHUNK_SECONDS",
+                  "FONT_NAME", "FONT_SIZE", "OUTLINE_SIZE", "SHADOW_SIZE", "MAX_WORDS_PER_SUBTITLE", "HIGHLIGHT_MODE",
+                  "FONT_COLOR_PRIMARY", "FONT_COLOR_OUTLINE", "SUBTITLE_BOLD", "SUBTITLE_BLUR", "SUBTITLE_SHADOW",
+                  "HIGHLIGHT_COLOR_PRIMARY", "HIGHLIGHT_COLOR_OUTLINE"),
+    "finalize": ("RENDER_MODE", "RENDER_CHUNKS", "ENCODER_TARGET", "ENCODER_PROFILE", "X264_TUNE", "X264_THREADS",
+                 "USE_GPU", "GPU_ENCODER", "GPU_DECODER", "SUBTITLE_RENDERER", "SUBTITLE_FONT_PATH",
+                 "OUTPUT_VARIANTS"),
+}
+
+
+def new_job(job_id, text, title, paths, force=()):
+    """
+    Job dict for run_stage. paths needs "voice", "combined", "segments",
+    "subtitles" and "final", plus optionally "metrics" for run_job's report;
+    force lists stages to rerun regardless.
+    """
+    return {
+        "id": job_id,
+        "text": text,
+        "title": title,
+        "paths": dict(paths),
+        "force": set(STAGES) if "all" in force else set(force),
+        "digests": {},
+        "timings": {},
+        "metrics": {},
+        "error": None,
+    }
+
+
+def _stage_voice(job):
+    from pipeline.voice import generate_voice
+    generate_voice(job["text"], job["paths"]["voice"])
+
+
+def _stage_video(job):
+    from pipeline.audio import load_audio
+    from pipeline.video import clip_seed, combine_selected, select_segments
+    paths = job["paths"]
+    seed = clip_seed()
+    with measure("select"):
+        segments = select_segments(CONFIG["VIDEOS_DIR"], load_audio(paths["voice"]).duration, random.Random(seed))
+    _record_segments(job, segments)
+    if CONFIG["RENDER_MODE"] != "single_pass":
+        with measure("combine"):
+            paths["combined"] = combine_selected(segments, paths["combined"])
+    return {"seed": seed, "segments": job["segments"]}
+
+
+def _record_segments(job, segments):
+    job["segments"] = [{key: segment[key] for key in ("path", "start", "duration")} for segment in segments]
+    if CONFIG["RENDER_MODE"] == "single_pass":
+        os.makedirs(os.path.dirname(job["paths"]["segments"]) or ".", exist_ok=True)
+        with open(job["paths"]["segments"], "w", encoding="utf-8") as f:
+            json.dump(job["segments"], f, indent=2)
+
+
+def _stage_subtitles(job):
+    from pipeline.subtitles import generate_subtitles
+    paths = job["paths"]
+    paths["subtitles"] = generate_subtitles(paths["voice"], paths["subtitles"], text=job["text"])
+
+
+def _stage_finalize(job):
+    from pipeline.finalize import process_video, render_single_pass
+    paths = job["paths"]
+    if CONFIG["RENDER_MODE"] == "single_pass":
+        render_single_pass(job["segments"], paths["voice"], paths["subtitles"], paths["final"], job["title"])
+    else:
+        process_video(paths["combined"], paths["voice"], paths["subtitles"], paths["final"], job["title"])
+
+
+STAGE_FUNCS = {
+    "voice": _stage_voice,
+    "video": _stage_video,
+    "subtitles": _stage_subtitles,
+    "finalize": _stage_finalize,
+}
+
+
+def stage_artifact(job, stage):
+    """The file a stage produces for job."""
+    paths = job["paths"]
+    if stage == "video":
+        return paths["segments"] if CONFIG["RENDER_MODE"] == "single_pass" else paths["combined"]
+    if stage == "subtitles":
+        return paths["subtitles"].replace(".srt", ".ass")
+    return paths["final" if stage == "finalize" else stage]
+
+
+def stage_fingerprint(job, stage):
+    """Hash of a stage's config, own inputs and upstream digests; upstream stages must have run first."""
+    if stage == "voice":
+        from pipeline.voice import voice_cache_key
+        inputs = voice_cache_key(job["text"])
+    elif stage == "subtitles":
+        # Alignment spells the script, so the text matters on top of the audio
+        inputs = job["text"] if CONFIG.get("WHISPER_MODE") == "align" else None
+    elif stage == "finalize":
+        inputs = (job["title"], CARD_LAYOUT_VERSION)
+    else:
+        inputs = None
+    return hash_key(stage, {key: CONFIG.get(key) for key in STAGE_CONFIG_KEYS[stage]}, inputs,
+                    [job["digests"][dep] for dep in STAGE_DEPS[stage]])
+
+
+def _sidecar_path(artifact):
+    return f"{artifact}.fp.json"
+
+
+def read_sidecar(artifact):
+    try:
+        with open(_sidecar_path(artifact), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_sidecar(artifact, stage, fingerprint, meta):
+    stat = os.stat(artifact)
+    sidecar = {
+        "stage": stage,
+        "fingerprint": fingerprint,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        # What downstream fingerprints see: a rebuild with identical content keeps them valid
+        "digest": hash_key(fingerprint, hash_file(artifact)),
+        "meta": meta or {},
+    }
+    tmp_path = f"{_sidecar_path(artifact)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(sidecar, f, indent=2)
+    os.replace(tmp_path, _sidecar_path(artifact))
+    return sidecar
+
+
+def _is_fresh(sidecar, fingerprint, artifact):
+    if not sidecar or sidecar.get("fingerprint") != fingerprint:
+        return False
+    try:
+        stat = os.stat(artifact)
+    except OSError:
+        return False
+    if (stat.st_size, stat.st_mtime_ns) != (sidecar.get("size"), sidecar.get("mtime_ns")):
+        return False
+    if CONFIG["RENDER_MODE"] != "single_pass":
+        return True
+    # The single-pass render reads the recorded clip selection straight from the sources
+    return all(os.path.exists(segment["path"]) for segment in sidecar["meta"].get("segments", []))
+
+
+def run_stage(job, stage):
+    """
+    Bring one stage of job up to date: reuse the artifact if its sidecar
+    matches the current fingerprint, otherwise run the stage and record a new
+    sidecar. Returns True if the stage ran.
+    """
+    artifact = stage_artifact(job, stage)
+    fingerprint = stage_fingerprint(job, stage)
+    sidecar = read_sidecar(artifact)
+    if stage not in job["force"] and _is_fresh(sidecar, fingerprint, artifact):
+        if "segments" in sidecar["meta"]:
+            job["segments"] = sidecar["meta"]["segments"]
+        job["digests"][stage] = sidecar["digest"]
+        job["metrics"][stage] = {"reused": True}
+        console.print(f"♻️ [green]{stage} up to date:[/] {artifact}")
+        return False
+    with collecting(job["metrics"]), measure(stage):
+        meta = STAGE_FUNCS[stage](job)
+    job["digests"][stage] = _write_sidecar(stage_artifact(job, stage), stage, fingerprint, meta)["digest"]
+    return True
+
+
+def record_streamed_run(job, segments, seed):
+    """
+    Write the sidecars of a job whose stages all ran at once in the streaming
+    pipeline, which bypasses run_stage, so a rerun can reuse them.
+    segments are the clip segments the streamed video was built from, drawn
+    with seed.
+    """
+    _record_segments(job, segments)
+    for stage in STAGES:
+        artifact = stage_artifact(job, stage)
+        meta = {"seed": seed, "segments": job["segments"]} if stage == "video" else None
+        job["digests"][stage] = _write_sidecar(artifact, stage, stage_fingerprint(job, stage), meta)["digest"]
+
+
+def stale_stages(job):
+    """Stages run_job may run: the out-of-date ones and everything downstream of them."""
+    stale = []
+    for stage in STAGES:
+        if stale and any(dep in stale for dep in STAGE_DEPS[stage]):
+            stale.append(stage)
+            continue
+        artifact = stage_artifact(job, stage)
+        sidecar = read_sidecar(artifact)
+        if stage in job["force"] or not _is_fresh(sidecar, stage_fingerprint(job, stage), artifact):
+            stale.append(stage)
+        else:
+            job["digests"][stage] = sidecar["digest"]
+    job["digests"].clear()
+    return stale
+
+
+def run_job(job):
+    """
+    Run job's stages in graph order, stopping at the first failure, then
+    write the job's metrics if paths["metrics"] is set. Returns True on success.
+    """
+    for stage in STAGES:
+        try:
+            run_stage(job, stage)
+        except Exception as e:
+            job["error"] = f"{stage}: {e}"
+            console.print(f"❌ [red]{stage.capitalize()} stage failed: {e}[/]")
+            break
+    if job["paths"].get("metrics"):
+        console.print(f"📊 [cyan]Stage metrics written to {write_metrics(job)}[/]")
+    return job["error"] is None
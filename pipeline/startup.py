@@ -0,0 +1,85 @@
+"""
+Startup import-time regression check.
+
+Imports each entry point in a fresh interpreter under `python -X importtime`
+and fails if it loads a dependency that only a running stage should need
+(Whisper/torch, the ElevenLabs SDK, PIL/pilmoji, numpy), or, with
+--budget-ms, if its import takes longer than the budget.
+
+    python -m pipeline.startup [--budget-ms 300] [--top 10]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+from pipeline.utils import console
+
+ENTRY_POINTS = ("pipeline_run", "pipeline.batch", "pipeline.stages", "pipeline.benchmark")
+# Top-level packages only a running stage may import
+HEAVY_MODULES = ("torch", "whisper", "elevenlabs", "PIL", "pilmoji", "requests", "numpy")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(module):
+    """
+    Import module in a fresh interpreter; returns {name: (self_ms, cumulative_ms)}
+    for everything it imported, in import order.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    times = {}
+    for match in _IMPORT_LINE.finditer(result.stderr):
+        times[match.group(4)] = (int(match.group(1)) / 1000, int(match.group(2)) / 1000)
+    return times
+
+
+def check_startup(entry_points=ENTRY_POINTS, budget_ms=None, top=10, repeat=3):
+    """
+    Report import time and heavy dependencies per entry point (best of
+    `repeat` imports) and the slowest modules behind the first one.
+    Returns True if no entry point loads a heavy module or exceeds budget_ms.
+    """
+    from rich.table import Table
+
+    table = Table(title=f"Entry point import time (best of {repeat})")
+    for column in ("Entry point", "Import (ms)", "Heavy modules", "OK"):
+        table.add_column(column)
+    ok = True
+    slowest = None
+    for module in entry_points:
+        runs = [import_times(module) for _ in range(repeat)]
+        best = min(runs, key=lambda times: times[module][1])
+        total = best[module][1]
+        heavy = sorted({name.split(".")[0] for name in best} & set(HEAVY_MODULES))
+        passed = not heavy and (budget_ms is None or total <= budget_ms)
+        ok = ok and passed
+        table.add_row(module, f"{total:.0f}", ", ".join(heavy) or "-", "✅" if passed else "❌")
+        slowest = slowest or best
+    console.print(table)
+
+    modules = Table(title=f"Slowest imports behind {entry_points[0]} (self time)")
+    for column in ("Module", "Self (ms)", "Cumulative (ms)"):
+        modules.add_column(column)
+    for name, (self_ms, cumulative_ms) in sorted(slowest.items(), key=lambda item: -item[1][0])[:top]:
+        modules.add_row(name, f"{self_ms:.1f}", f"{cumulative_ms:.1f}")
+    console.print(modules)
+    if not ok:
+        console.print(f"❌ [red]Startup regression: entry points must not import {', '.join(HEAVY_MODULES)}"
+                      + (f" or take over {budget_ms:.0f}ms" if budget_ms is not None else "") + "[/]")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that entry points import quickly and without heavy dependencies.")
+    parser.add_argument('modules', nargs='*', help=f'Entry points to check (default: {", ".join(ENTRY_POINTS)})')
+    parser.add_argument('--budget-ms', type=float, help='Fail if an entry point takes longer than this to import')
+    parser.add_argument('--top', type=int, default=10, help='Slowest modules to list')
+    parser.add_argument('--repeat', type=int, default=3, help='Imports per entry point (the fastest counts)')
+    args = parser.parse_args()
+    sys.exit(0 if check_startup(tuple(args.modules) or ENTRY_POINTS, args.budget_ms, args.top, args.repeat) else 1)
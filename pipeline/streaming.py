@@ -0,0 +1,242 @@
+"""
+Streaming single-video pipeline.
+
+The voice-over is streamed to disk chunk by chunk while the other stages start
+early: background clips are selected (and combined) for a duration estimated
+from the script length, and Whisper transcribes completed audio windows, cut
+at pauses, as soon as they have been written. Only the final encode waits for
+everything, so a video takes about as long as its slowest stage rather than
+the sum of all stages.
+"""
+import random
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import CONFIG
+from pipeline.audio import SAMPLE_RATE, load_audio, split_points
+from pipeline.cache import cache_lookup, cache_write
+from pipeline.finalize import process_video, render_single_pass
+from pipeline.subtitles import (generate_subtitles, get_whisper_model, load_transcript, offset_segments,
+                                save_transcript, transcribe_options, transcript_cache_key, write_ass_subtitles)
+from pipeline.utils import console
+from pipeline.video import clip_seed, combine_selected, select_segments, trim_segments
+from pipeline.voice import stream_voice, voice_cache_key
+
+
+class _AudioProgress:
+    """Bytes written so far by the voice stream, for readers waiting on the partial file."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.written = 0
+        self.done = False
+        self.failed = False
+
+    def update(self, written):
+        with self._cond:
+            self.written = written
+            self._cond.notify_all()
+
+    def finish(self, failed=False):
+        with self._cond:
+            self.done = True
+            self.failed = self.failed or failed
+            self._cond.notify_all()
+
+    def wait_for(self, nbytes):
+        """Block until nbytes are on disk or the stream ended; returns True once it ended."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.done or self.written >= nbytes)
+            if self.failed:
+                raise RuntimeError("voice stream failed")
+            return self.done
+
+
+class _TailDecoder:
+    """
+    One ffmpeg process decoding the voice file as it grows: feed() passes it
+    only the bytes written since the last call, so every window decodes just
+    the new audio instead of the whole partial file again. Its samples line
+    up with decode_audio's, but a pipe can't be trimmed of the encoder's end
+    padding, so the last window reads the finished file's AudioAsset instead.
+    """
+
+    def __init__(self, path, input_format):
+        self._file = open(path, "rb")
+        cmd = ["ffmpeg", "-v", "quiet", "-f", input_format, "-i", "pipe:0", "-f", "s16le", "-ac", "1",
+               "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "pipe:1"]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._pcm = bytearray()
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, name="stream-decode", daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        for block in iter(lambda: self._proc.stdout.read1(1 << 16), b""):
+            with self._lock:
+                self._pcm.extend(block)
+
+    def feed(self):
+        data = self._file.read()
+        if data:
+            self._proc.stdin.write(data)
+            self._proc.stdin.flush()
+
+    def close(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        self._file.close()
+
+    def samples(self, start):
+        """Samples decoded so far from index start on, as float32."""
+        with self._lock:
+            pcm = bytes(self._pcm[start * 2:len(self._pcm) // 2 * 2])
+        return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+
+
+def estimate_duration(text):
+    """Narration length guessed from the word count, before any audio exists."""
+    return max(1.0, len(text.split()) / CONFIG["VOICE_WORDS_PER_SECOND"])
+
+
+def _bytes_per_second(output_format):
+    # "mp3_44100_128" is 128 kbit/s; other formats wait for the full file
+    match = re.match(r"mp3_\d+_(\d+)$", output_format)
+    return int(match.group(1)) * 125 if match else None
+
+
+def transcribe_streaming(audio_path, progress, device=None):
+    """
+    Transcribe audio_path while it is still being written.
+
+    Waits until STREAM_WINDOW_SECONDS of new audio are on disk, cuts the new
+    audio at its last pause and transcribes up to there, then continues from
+    the cut. The remainder is transcribed once the stream ends. Returns a
+    Whisper-style result and stores it in the transcript cache under the
+    "streaming" mode, apart from whole-file transcripts.
+    """
+    window = CONFIG["STREAM_WINDOW_SECONDS"]
+    rate = _bytes_per_second(CONFIG["VOICE_OUTPUT_FORMAT"])
+    model, lock, _ = get_whisper_model(device=device)
+    # Ignore pauses in the last 250 ms, where the partial file may end mid-frame
+    tail = SAMPLE_RATE // 4
+    segments, texts = [], []
+    offset = 0
+    target = window
+    windows = 0
+    busy = 0.0
+    # Without a known bitrate there are no windows: wait for the whole file
+    decoder = _TailDecoder(audio_path, "mp3") if rate else None
+    try:
+        while True:
+            done = progress.wait_for(int(target * rate)) if rate else progress.wait_for(float("inf"))
+            if done or decoder is None:
+                # Decoded once and shared with the duration check and the final encode
+                samples = load_audio(audio_path).samples[offset:]
+            else:
+                decoder.feed()
+                samples = decoder.samples(offset)
+            if done:
+                cut = len(samples)
+            else:
+                points = [point for point in split_points(samples[:-tail]) if point >= SAMPLE_RATE]
+                if not points:
+                    # No pause yet; wait for another window of audio
+                    target += window
+                    continue
+                cut = points[-1]
+            if cut > 0:
+                start = time.perf_counter()
+                with lock:
+                    result = model.transcribe(samples[:cut], **transcribe_options())
+                busy += time.perf_counter() - start
+                windows += 1
+                segments.extend(offset_segments(result, offset / SAMPLE_RATE))
+                texts.append(result["text"].strip())
+            if done:
+                break
+            offset += cut
+            target = offset / SAMPLE_RATE + window
+    finally:
+        if decoder is not None:
+            decoder.close()
+
+    console.print(f"⏱️ [cyan]Whisper (streaming): {windows} windows, transcribe {busy:.2f}s[/]")
+    result = {"text": " ".join(texts), "segments": segments}
+    cache_write("transcripts", transcript_cache_key(audio_path, mode="streaming"), ".npz",
+                lambda f: save_transcript(result, f))
+    return result
+
+
+def run_streaming(text, voice_path, subtitles_path, final_path, combined_path="output/combined.mp4",
+                  reddit_title=None, device=None):
+    """
+    Produce the final video for text with voice, clip selection and
+    transcription overlapped. Clips are chosen for the estimated duration
+    (plus STREAM_DURATION_MARGIN) and re-chosen only if the real narration
+    turns out longer. Returns (final output path, the clip segments used,
+    the clip seed), so the stage graph can record the run (see
+    stages.record_streamed_run).
+    """
+    single_pass = CONFIG["RENDER_MODE"] == "single_pass"
+    voice_cached = cache_lookup("voice", voice_cache_key(text), ".mp3") is not None
+    estimate = estimate_duration(text) * (1 + CONFIG["STREAM_DURATION_MARGIN"])
+    progress = _AudioProgress()
+    seed = clip_seed()
+    console.print(f"🌊 [bold blue]Streaming pipeline: estimated narration {estimate:.1f}s[/]")
+
+    def voice_task():
+        try:
+            return stream_voice(text, voice_path, on_chunk=progress.update)
+        except Exception:
+            progress.finish(failed=True)
+            raise
+        finally:
+            progress.finish()
+
+    def video_task(duration):
+        segments = select_segments(CONFIG["VIDEOS_DIR"], duration, random.Random(seed))
+        if not single_pass:
+            combine_selected(segments, combined_path)
+        return segments
+
+    def subtitles_task():
+        if voice_cached and CONFIG.get("WHISPER_MODE") != "align":
+            # A rerun over a cached voice reuses what an earlier streamed run transcribed
+            progress.wait_for(float("inf"))
+            streamed = cache_lookup("transcripts", transcript_cache_key(voice_path, mode="streaming"), ".npz")
+            if streamed:
+                console.print("♻️ [green]Streamed transcript reused from cache, skipping Whisper[/]")
+                return write_ass_subtitles(load_transcript(streamed), subtitles_path)
+        if voice_cached or CONFIG.get("WHISPER_MODE") == "align":
+            # Alignment needs the whole file but is much faster than decoding
+            progress.wait_for(float("inf"))
+            return generate_subtitles(voice_path, subtitles_path, device=device, text=text)
+        return write_ass_subtitles(transcribe_streaming(voice_path, progress, device), subtitles_path)
+
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix="stream") as pool:
+        voice_future = pool.submit(voice_task)
+        video_future = pool.submit(video_task, estimate)
+        subtitles_future = pool.submit(subtitles_task)
+
+        voice_future.result()
+        duration = load_audio(voice_path).duration
+        video = video_future.result()
+        if duration > estimate:
+            console.print(f"[yellow]Narration ran {duration:.1f}s, longer than the {estimate:.1f}s estimate; "
+                          f"re-selecting clips[/]")
+            video = video_task(duration)
+        subtitles_future.result()
+
+    if single_pass:
+        video = trim_segments(video, duration)
+        render_single_pass(video, voice_path, subtitles_path, final_path, reddit_title)
+    else:
+        process_video(combined_path, voice_path, subtitles_path, final_path, reddit_title)
+    return final_path, video, seed
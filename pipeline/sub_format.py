@@ -1,5 +1,8 @@
 # Subtitle formatting helpers
+import argparse
+import numpy as np
 from config import CONFIG
+from pipeline.utils import console
 
 
 def format_time_ass(seconds):
@@ -33,3 +36,178 @@ def create_highlighted_subtitle(words, highlight_index):
             # Normal word: use normal colors
             parts.append(f"{{\\b{bold}\\1c{normal_color}\\3c{normal_outline}}}{word.upper()}")
     return " ".join(parts)
+
+
+# Two-digit strings for minutes, seconds and centiseconds
+_TWO_DIGITS = [f"{i:02}" for i in range(100)]
+
+
+def format_times_ass(seconds):
+    """format_time_ass for a whole array of timestamps at once."""
+    seconds = np.asarray(seconds, dtype=np.float64)
+    hours = (seconds // 3600).astype(np.int64).tolist()
+    minutes = ((seconds % 3600) // 60).astype(np.int64).tolist()
+    secs = (seconds % 60).astype(np.int64).tolist()
+    centis = ((seconds - np.trunc(seconds)) * 100).astype(np.int64).tolist()
+    digits = _TWO_DIGITS
+    return [f"{h}:{digits[m]}:{digits[s]}.{digits[c]}" for h, m, s, c in zip(hours, minutes, secs, centis)]
+
+
+def highlight_tags():
+    """
+    Override tags used by create_highlighted_subtitle, read from CONFIG once:
+    (normal word prefix, highlighted word prefix, highlighted word suffix).
+    """
+    bold = 1 if CONFIG.get('SUBTITLE_BOLD', True) else 0
+    normal = f"{{\\b{bold}\\1c{CONFIG.get('FONT_COLOR_PRIMARY', '&H00FFFFFF')}\\3c{CONFIG.get('FONT_COLOR_OUTLINE', '&H00000000')}}}"
+    highlight = (f"{{\\b{bold}\\blur{CONFIG.get('SUBTITLE_BLUR', 3)}\\shad{CONFIG.get('SUBTITLE_SHADOW', 0)}"
+                 f"\\bord{CONFIG.get('OUTLINE_SIZE', 5)}\\1c{CONFIG.get('HIGHLIGHT_COLOR_PRIMARY', '&H00FFFFFF')}"
+                 f"\\3c{CONFIG.get('HIGHLIGHT_COLOR_OUTLINE', '&H00000000')}}}")
+    return normal, highlight, "{\\r}"
+
+
+def karaoke_tags():
+    """
+    Tag pieces for "karaoke" mode, read from CONFIG once: (word prefix,
+    highlight-on tags, highlight-off tags). Every word starts with the normal
+    look and switches to the highlight and back with zero-length \\t
+    transforms at its own start and end.
+    """
+    bold = 1 if CONFIG.get('SUBTITLE_BOLD', True) else 0
+    outline_size = CONFIG.get('OUTLINE_SIZE', 5)
+    normal = (f"\\1c{CONFIG.get('FONT_COLOR_PRIMARY', '&H00FFFFFF')}"
+              f"\\3c{CONFIG.get('FONT_COLOR_OUTLINE', '&H00000000')}")
+    # The style's own look, which {\\r} restores after a highlighted word in the other modes
+    off = f"\\blur0\\shad{CONFIG.get('SHADOW_SIZE', 2)}\\bord{outline_size}{normal}"
+    on = (f"\\blur{CONFIG.get('SUBTITLE_BLUR', 3)}\\shad{CONFIG.get('SUBTITLE_SHADOW', 0)}\\bord{outline_size}"
+          f"\\1c{CONFIG.get('HIGHLIGHT_COLOR_PRIMARY', '&H00FFFFFF')}\\3c{CONFIG.get('HIGHLIGHT_COLOR_OUTLINE', '&H00000000')}")
+    return f"{{\\b{bold}{off}", on, off
+
+
+def _karaoke_events(groups, speed_factor):
+    # One event per chunk; times inside \t are milliseconds from the event's (centisecond) start
+    words = [word for group in groups for word in group]
+    starts_ms = np.rint(np.fromiter((w["start"] for w in words), np.float64, len(words)) / speed_factor * 1000)
+    ends_ms = np.rint(np.fromiter((w["end"] for w in words), np.float64, len(words)) / speed_factor * 1000)
+    bounds = np.cumsum([0] + [len(group) for group in groups])
+    first, last = bounds[:-1], bounds[1:] - 1
+    event_starts = np.fromiter((group[0]["start"] for group in groups), np.float64, len(groups)) / speed_factor
+    event_ends = np.fromiter((group[-1]["end"] for group in groups), np.float64, len(groups)) / speed_factor
+    origin_ms = np.repeat(np.floor(event_starts * 100) * 10, last - first + 1)
+    # At least 1 ms: libass reads a \t end time of 0 as the end of the event
+    on_ms = np.maximum(starts_ms - origin_ms, 1).astype(np.int64).tolist()
+    off_ms = np.maximum(ends_ms - origin_ms, 1).astype(np.int64).tolist()
+    prefix, on, off = karaoke_tags()
+
+    texts = [f"{prefix}\\t({t0},{t0},{on})\\t({t1},{t1},{off})}}{w['word'].upper()}"
+             for t0, t1, w in zip(on_ms, off_ms, words)]
+    starts, ends = format_times_ass(event_starts), format_times_ass(event_ends)
+    return "".join([f"Dialogue: 0,{starts[i]},{ends[i]},Default,,0,0,0,,{' '.join(texts[first[i]:last[i] + 1])}\n"
+                    for i in range(len(groups))])
+
+
+def _word_groups(result, mode, max_words):
+    # Each group is rendered together: single words in "word" mode, else chunks of a segment
+    for segment in result["segments"]:
+        words = segment.get("words", [])
+        if not words:
+            continue
+        size = 1 if mode == "word" else max_words
+        for i in range(0, len(words), size):
+            yield words[i:i + size]
+
+
+def build_events(result, speed_factor=1.3, mode=None):
+    """
+    Dialogue lines for a Whisper-style result, identical to calling
+    create_highlighted_subtitle and format_time_ass per word but with the
+    tags built once and all timestamps converted in one NumPy pass.
+    Mode "karaoke" instead writes one event per chunk with timed per-word
+    highlights. Returns the lines joined into one string.
+    """
+    mode = mode or CONFIG["HIGHLIGHT_MODE"]
+    groups = list(_word_groups(result, mode, CONFIG["MAX_WORDS_PER_SUBTITLE"]))
+    words = [word for group in groups for word in group]
+    if not words:
+        return ""
+    if mode == "karaoke":
+        return _karaoke_events(groups, speed_factor)
+    starts = format_times_ass(np.fromiter((w["start"] for w in words), np.float64, len(words)) / speed_factor)
+    ends = format_times_ass(np.fromiter((w["end"] for w in words), np.float64, len(words)) / speed_factor)
+    normal_tag, highlight_tag, reset = highlight_tags()
+
+    if mode == "word":
+        return "".join([f"Dialogue: 0,{start},{end},Default,,0,0,0,,{highlight_tag}{w['word'].upper()}{reset}\n"
+                        for start, end, w in zip(starts, ends, words)])
+
+    lines = []
+    index = 0
+    for group in groups:
+        upper = [w["word"].upper() for w in group]
+        normal = [normal_tag + text for text in upper]
+        for j, text in enumerate(upper):
+            highlighted = highlight_tag + text + reset
+            line = " ".join(normal[:j] + [highlighted] + normal[j + 1:])
+            lines.append(f"Dialogue: 0,{starts[index]},{ends[index]},Default,,0,0,0,,{line}\n")
+            index += 1
+    return "".join(lines)
+
+
+def _build_events_per_word(result, speed_factor=1.3, mode=None):
+    # The original per-word emitter, kept as the reference for benchmark_events
+    mode = mode or CONFIG["HIGHLIGHT_MODE"]
+    lines = []
+    for segment in result["segments"]:
+        words = segment.get("words", [])
+        if not words:
+            continue
+        if mode == "word":
+            for word in words:
+                text = create_highlighted_subtitle([word["word"]], 0)
+                lines.append(f"Dialogue: 0,{format_time_ass(word['start'] / speed_factor)},"
+                             f"{format_time_ass(word['end'] / speed_factor)},Default,,0,0,0,,{text}\n")
+        else:
+            for i in range(0, len(words), CONFIG["MAX_WORDS_PER_SUBTITLE"]):
+                chunk = words[i:i + CONFIG["MAX_WORDS_PER_SUBTITLE"]]
+                chunk_text = [w["word"] for w in chunk]
+                for j in range(len(chunk)):
+                    text = create_highlighted_subtitle(chunk_text, j)
+                    lines.append(f"Dialogue: 0,{format_time_ass(chunk[j]['start'] / speed_factor)},"
+                                 f"{format_time_ass(chunk[j]['end'] / speed_factor)},Default,,0,0,0,,{text}\n")
+    return "".join(lines)
+
+
+def synthetic_transcript(n_words, words_per_segment=12, seed=0):
+    """A Whisper-style result with n_words random words at speech pace."""
+    rng = np.random.default_rng(seed)
+    vocabulary = [" the", " quick", " brown", " fox", " jumps", " over", " lazy", " dog,", " really.", " why?"]
+    durations = rng.uniform(0.15, 0.6, n_words)
+    starts = np.concatenate(([0.0], np.cumsum(durations + 0.05)[:-1]))
+    words = [{"word": vocabulary[i % len(vocabulary)], "start": float(s), "end": float(s + d)}
+             for i, (s, d) in enumerate(zip(starts, durations))]
+    return {"segments": [{"words": words[i:i + words_per_segment]} for i in range(0, n_words, words_per_segment)]}
+
+
+def benchmark_events(n_words=10000, repeat=5):
+    """Time build_events against the per-word emitter on a synthetic transcript, per highlight mode."""
+    import timeit
+    from rich.table import Table
+
+    result = synthetic_transcript(n_words)
+    table = Table(title=f"ASS event generation ({n_words} words, best of {repeat})")
+    for column in ("Mode", "Per-word (ms)", "Vectorized (ms)", "Speedup", "Identical"):
+        table.add_column(column)
+    for mode in ("word", "chunk"):
+        identical = build_events(result, mode=mode) == _build_events_per_word(result, mode=mode)
+        old = min(timeit.repeat(lambda: _build_events_per_word(result, mode=mode), number=1, repeat=repeat))
+        new = min(timeit.repeat(lambda: build_events(result, mode=mode), number=1, repeat=repeat))
+        table.add_row(mode, f"{old * 1000:.1f}", f"{new * 1000:.1f}", f"{old / new:.1f}x", str(identical))
+    console.print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark ASS subtitle event generation.")
+    parser.add_argument('--words', type=int, default=10000, help='Words in the synthetic transcript')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is reported)')
+    args = parser.parse_args()
+    benchmark_events(args.words, args.repeat)
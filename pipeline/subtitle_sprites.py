@@ -0,0 +1,421 @@
+"""
+Pre-rendered subtitle overlay track, an alternative to burning subtitles in
+with the ffmpeg ass filter.
+
+libass rasterizes, outlines and blurs the styled text again on every output
+frame, although an event's text never changes between its timestamps. Here
+each distinct event look (karaoke events are split at their instant \\t
+transforms) is drawn once with PIL into a transparent sprite. All sprites are
+padded to one shared band and listed with their durations in an ffconcat
+file, which the final encode composites with the overlay filter:
+
+    python -m pipeline.subtitle_sprites output/subtitles.ass [--out DIR] [--compare SECONDS]
+
+PIL needs a font file where libass looks FONT_NAME up through fontconfig, so
+set CONFIG["SUBTITLE_FONT_PATH"] to the same face for matching output.
+"""
+import argparse
+import math
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from config import CONFIG
+from pipeline.utils import console
+
+# libass turns \blur N into a Gaussian with this standard deviation per unit
+BLUR_SIGMA_SCALE = 2 / math.sqrt(math.log(256))
+
+_DIALOGUE = re.compile(r"^Dialogue:\s*[^,]*,([^,]*),([^,]*),([^,]*),[^,]*,[^,]*,[^,]*,[^,]*,[^,]*,(.*)$")
+_BLOCK = re.compile(r"\{([^}]*)\}|([^{]+)")
+_TAG = re.compile(r"\\t\(([^)]*)\)|\\(1c|3c|blur|bord|shad|b|r|c)([^\\]*)")
+# FreeType faces are not safe to share between threads
+_local = threading.local()
+
+
+def _parse_time(value):
+    h, m, s = value.strip().split(":")
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+def _parse_color(value, alpha=None):
+    """&HAABBGGRR (or &HBBGGRR&) as RGBA; ASS alpha 00 is opaque. Tag colours keep the given alpha."""
+    digits = value.strip().lstrip("&Hh").rstrip("&").rjust(8, "0")
+    a, b, g, r = (int(digits[i:i + 2], 16) for i in range(0, 8, 2))
+    return (r, g, b, 255 - a if alpha is None else alpha)
+
+
+def parse_ass(path):
+    """
+    Read an .ass file written by write_ass_subtitles.
+    Returns (play_res, styles, events) with styles by name and events as
+    (start, end, style name, text) in file order.
+    """
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    info = dict(line.split(":", 1) for line in lines if re.match(r"^PlayRes[XY]:", line))
+    play_res = (int(info.get("PlayResX", 1080)), int(info.get("PlayResY", 1920)))
+    style_format = next(line for line in lines if line.startswith("Format:") and "Fontname" in line)
+    fields = [name.strip() for name in style_format.split(":", 1)[1].split(",")]
+    styles = {}
+    for line in lines:
+        if line.startswith("Style:"):
+            values = dict(zip(fields, (v.strip() for v in line.split(":", 1)[1].split(","))))
+            styles[values["Name"]] = {
+                "size": float(values["Fontsize"]),
+                "bold": values["Bold"] not in ("0", ""),
+                "fill": _parse_color(values["PrimaryColour"]),
+                "outline": _parse_color(values["OutlineColour"]),
+                "back": _parse_color(values["BackColour"]),
+                "bord": float(values["Outline"]),
+                "shad": float(values["Shadow"]),
+                "blur": 0.0,
+                "margin_l": int(values["MarginL"]),
+                "margin_r": int(values["MarginR"]),
+            }
+    events = []
+    for line in lines:
+        match = _DIALOGUE.match(line)
+        if match:
+            start, end, style, text = match.groups()
+            events.append((_parse_time(start), _parse_time(end), style.strip(), text))
+    return play_res, styles, events
+
+
+def _apply_tags(state, tags, style):
+    # The override tags sub_format emits: \b \blur \bord \shad \1c \3c \r (transforms are handled by the caller)
+    for transform, name, value in _TAG.findall(tags):
+        if transform:
+            continue
+        if name == "r":
+            state.clear()
+            state.update(style)
+        elif name == "b":
+            state["bold"] = value.strip() not in ("0", "")
+        elif name in ("1c", "c"):
+            state["fill"] = _parse_color(value, state["fill"][3])
+        elif name == "3c":
+            state["outline"] = _parse_color(value, state["outline"][3])
+        elif value.strip():
+            state[name] = float(value)
+
+
+def _transforms(tags):
+    # \t(t1,t2,tags) as (t1 in seconds, tags); only the instant form karaoke mode writes renders exactly
+    out = []
+    for body, _, _ in _TAG.findall(tags):
+        if body:
+            parts = body.split(",", 2)
+            timed = len(parts) == 3 and parts[0].strip().isdigit()
+            # Event times are whole centiseconds, so the 1 ms karaoke writes for "at the start" is the start
+            out.append((round(int(parts[0]) / 1000, 2) if timed else 0.0, parts[-1]))
+    return out
+
+
+def event_frames(start, end, text, style):
+    """
+    Static looks of one Dialogue event as [(start, end, look)], where a look is
+    a tuple of (text, state) runs. Events without \\t transforms give one frame.
+    """
+    state = dict(style)
+    runs = []
+    pending = []
+    for tags, plain in _BLOCK.findall(text):
+        if tags:
+            _apply_tags(state, tags, style)
+            pending.extend(_transforms(tags))
+        elif plain:
+            runs.append((plain.replace("\\h", " "), dict(state), pending))
+            pending = []
+
+    duration = end - start
+    cuts = sorted({at for _, _, transforms in runs for at, _ in transforms if 0 < at < duration})
+    frames = []
+    for t0, t1 in zip([0.0] + cuts, cuts + [duration]):
+        look = []
+        for plain, base, transforms in runs:
+            current = dict(base)
+            for at, changes in transforms:
+                if at <= t0:
+                    _apply_tags(current, changes, style)
+            look.append((plain, tuple(sorted(current.items()))))
+        frames.append((start + t0, start + t1, tuple(look)))
+    return frames
+
+
+def _font_source(bold):
+    path = CONFIG.get("SUBTITLE_FONT_PATH")
+    if path:
+        return path
+    # Fall back to the Reddit card's fonts
+    from pipeline.card import get_font
+    # Without the card fonts get_font falls back to PIL's default, which on older Pillow is a bitmap font
+    source = getattr(get_font("Bold" if bold else "Regular", 10), "path", None)
+    if source is None:
+        raise RuntimeError("No scalable font for subtitle sprites; set SUBTITLE_FONT_PATH to a .ttf/.otf file")
+    return source if isinstance(source, str) else source.getvalue()
+
+
+def _load_font(bold, size):
+    """
+    FreeType face sized like libass, where the ASS font size is the
+    ascender-to-descender height rather than the em size PIL expects.
+    """
+    fonts = _local.__dict__.setdefault("fonts", {})
+    font = fonts.get((bold, size))
+    if font is None:
+        source = _font_source(bold)
+        opened = (lambda: source) if isinstance(source, str) else (lambda: BytesIO(source))
+        ascent, descent = ImageFont.truetype(opened(), 1000).getmetrics()
+        font = ImageFont.truetype(opened(), max(1, round(size * 1000 / (ascent + descent))))
+        fonts[(bold, size)] = font
+    return font
+
+
+def _layout(look, style, play_res):
+    """
+    Place the runs of a look like libass does for alignment 5: words wrap at
+    spaces into evenly filled lines, surplus spaces at
+    line edges are dropped, and the block is centered on the frame.
+    Returns [(x, baseline, text, state, font)] and the line height.
+    """
+    words, gaps = [], []
+    gap = 0.0
+    for plain, state in look:
+        state = dict(state)
+        font = _load_font(state["bold"], style["size"])
+        for piece in re.split(r"( +)", plain):
+            if not piece:
+                continue
+            if piece.startswith(" "):
+                gap += font.getlength(piece)
+            elif gap or not words:
+                words.append([(piece, state, font)])
+                gaps.append(gap)
+                gap = 0.0
+            else:
+                words[-1].append((piece, state, font))
+    if not words:
+        return [], 0
+    widths = [sum(font.getlength(piece) for piece, _, font in word) for word in words]
+    max_width = play_res[0] - style["margin_l"] - style["margin_r"]
+
+    def span(first, last):
+        return widths[first] + sum(gaps[i] + widths[i] for i in range(first + 1, last + 1))
+
+    # Greedy line filling, then libass's rebalancing: a line's last word moves down
+    # whenever that brings the two lines' widths (the lower one with its leading space) closer
+    starts = [0]
+    for i in range(1, len(words)):
+        if span(starts[-1], i) > max_width:
+            starts.append(i)
+    moved = True
+    while moved:
+        moved = False
+        for n in range(len(starts) - 1):
+            last = starts[n + 2] - 1 if n + 2 < len(starts) else len(words) - 1
+            first, cut = starts[n], starts[n + 1]
+            if cut - first < 2:
+                continue
+            before = abs(span(first, cut - 1) - gaps[cut] - span(cut, last))
+            after = abs(span(first, cut - 2) - span(cut - 1, last))
+            if after < before:
+                starts[n + 1] -= 1
+                moved = True
+    lines = [(first, end - 1) for first, end in zip(starts, starts[1:] + [len(words)])]
+
+    ascent, descent = _load_font(style["bold"], style["size"]).getmetrics()
+    line_height = ascent + descent
+    top = (play_res[1] - line_height * len(lines)) / 2
+    placed = []
+    for n, (first, last) in enumerate(lines):
+        x = style["margin_l"] + (max_width - span(first, last)) / 2
+        baseline = top + n * line_height + ascent
+        for i in range(first, last + 1):
+            if i > first:
+                x += gaps[i]
+            for piece, state, font in words[i]:
+                placed.append((x, baseline, piece, state, font))
+                x += font.getlength(piece)
+    return placed, line_height
+
+
+def _composite_blurred(image, layer, sigma):
+    # Blur only the drawn part of the layer (plus the kernel's reach), usually a single highlighted word
+    bbox = layer.getbbox()
+    if bbox is None:
+        return
+    reach = int(math.ceil(3 * sigma))
+    box = (max(bbox[0] - reach, 0), max(bbox[1] - reach, 0),
+           min(bbox[2] + reach, layer.width), min(bbox[3] + reach, layer.height))
+    region = layer.crop(box)
+    if sigma > 0:
+        region = region.filter(ImageFilter.GaussianBlur(sigma))
+    image.alpha_composite(region, dest=box[:2])
+
+
+def render_look(look, style, play_res):
+    """
+    Draw one look onto a transparent image cropped to its pixels.
+    Returns (image, (x, y)) with the offset on the PlayRes frame, or (None, None) if nothing is visible.
+    """
+    placed, line_height = _layout(look, style, play_res)
+    if not placed:
+        return None, None
+    pad = int(max(max(state["bord"] + 3 * state["blur"] * BLUR_SIGMA_SCALE + state["shad"], 0)
+                  for _, _, _, state, _ in placed)) + 2
+    left = int(min(x for x, *_ in placed)) - pad
+    top = int(min(baseline for _, baseline, *_ in placed) - line_height) - pad
+    right = int(max(x + font.getlength(piece) for x, _, piece, _, font in placed)) + pad
+    bottom = int(max(baseline for _, baseline, *_ in placed) + line_height) + pad
+    size = (right - left, bottom - top)
+
+    # One shadow and one outline layer per blur strength; fills stay sharp on top unless there is no outline
+    layers = {}
+    fill = Image.new("RGBA", size, (0, 0, 0, 0))
+    fill_draw = ImageDraw.Draw(fill)
+    for x, baseline, piece, state, font in placed:
+        pos = (x - left, baseline - top)
+        shadow_layer, outline_layer = layers.setdefault(
+            state["blur"], (Image.new("RGBA", size, (0, 0, 0, 0)), Image.new("RGBA", size, (0, 0, 0, 0))))
+        bord = int(round(state["bord"]))
+        if state["shad"] > 0:
+            shifted = (pos[0] + state["shad"], pos[1] + state["shad"])
+            ImageDraw.Draw(shadow_layer).text(shifted, piece, font=font, anchor="ls", fill=state["back"],
+                                              stroke_width=bord, stroke_fill=state["back"])
+        if bord > 0:
+            ImageDraw.Draw(outline_layer).text(pos, piece, font=font, anchor="ls", fill=state["outline"],
+                                               stroke_width=bord, stroke_fill=state["outline"])
+            fill_draw.text(pos, piece, font=font, anchor="ls", fill=state["fill"])
+        else:
+            ImageDraw.Draw(outline_layer).text(pos, piece, font=font, anchor="ls", fill=state["fill"])
+
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    for index in (0, 1):
+        for blur, pair in layers.items():
+            _composite_blurred(image, pair[index], blur * BLUR_SIGMA_SCALE)
+    image.alpha_composite(fill)
+    bbox = image.getbbox()
+    if bbox is None:
+        return None, None
+    return image.crop(bbox), (left + bbox[0], top + bbox[1])
+
+
+def render_sprite_track(subtitles_path, output_dir):
+    """
+    Render every distinct look in subtitles_path once and write
+    output_dir/sprites.ffconcat, which plays them (and blank gaps) on the
+    subtitle timeline. Returns (ffconcat path, (x, y) of the sprite band on
+    the frame), or (None, None) when there is nothing to show.
+    """
+    start = time.perf_counter()
+    play_res, styles, events = parse_ass(subtitles_path)
+    frames = []
+    for event_start, event_end, style_name, text in events:
+        style = styles.get(style_name) or next(iter(styles.values()))
+        frames.extend((t0, t1, look, style_name) for t0, t1, look in event_frames(event_start, event_end, text, style))
+    unique = list(dict.fromkeys((look, style_name) for _, _, look, style_name in frames))
+
+    def render(item):
+        look, style_name = item
+        return render_look(look, styles.get(style_name) or next(iter(styles.values())), play_res)
+
+    with ThreadPoolExecutor(max_workers=CONFIG["SPRITE_WORKERS"]) as pool:
+        rendered = dict(zip(unique, pool.map(render, unique)))
+    placed = [(image, offset) for image, offset in rendered.values() if image is not None]
+    if not placed:
+        return None, None
+
+    # Every frame of the overlay input must have the same size, so sprites share the union band
+    band_left = min(x for _, (x, _) in placed)
+    band_top = min(y for _, (_, y) in placed)
+    band_right = max(x + image.width for image, (x, _) in placed)
+    band_bottom = max(y + image.height for image, (_, y) in placed)
+    band = (band_right - band_left, band_bottom - band_top)
+
+    os.makedirs(output_dir, exist_ok=True)
+    # RLE Targa decodes about 5x faster in ffmpeg than PNG, and the overlay input decodes every entry
+    blank_name = "blank.tga"
+    Image.new("RGBA", band, (0, 0, 0, 0)).save(os.path.join(output_dir, blank_name), compression="tga_rle")
+    names = {}
+    for n, (key, (image, offset)) in enumerate(rendered.items()):
+        if image is None:
+            names[key] = blank_name
+            continue
+        sprite = Image.new("RGBA", band, (0, 0, 0, 0))
+        sprite.paste(image, (offset[0] - band_left, offset[1] - band_top))
+        names[key] = f"sprite_{n:05d}.tga"
+        sprite.save(os.path.join(output_dir, names[key]), compression="tga_rle")
+
+    # Later events replace earlier ones that are still showing, and gaps show the blank band
+    entries = []
+    clock = 0.0
+    frames.sort(key=lambda frame: frame[0])
+    for i, (t0, t1, look, style_name) in enumerate(frames):
+        if i + 1 < len(frames):
+            t1 = min(t1, frames[i + 1][0])
+        if t1 <= clock:
+            continue
+        if t0 > clock:
+            entries.append((blank_name, t0 - clock))
+        entries.append((names[(look, style_name)], t1 - max(t0, clock)))
+        clock = t1
+    list_path = os.path.join(output_dir, "sprites.ffconcat")
+    with open(list_path, "w") as f:
+        f.write("ffconcat version 1.0\n")
+        for name, duration in entries:
+            f.write(f"file '{name}'\nduration {duration:.3f}\n")
+        # The last duration only counts if another file follows it
+        f.write(f"file '{blank_name}'\n")
+
+    console.print(f"🖼️ [cyan]Subtitle sprites: {len(placed)} rendered for {len(frames)} frames "
+                  f"in {time.perf_counter() - start:.2f}s[/]")
+    return list_path, (band_left, band_top)
+
+
+def compare_renderers(subtitles_path, seconds=30, output_dir="output/sprite_compare"):
+    """Time burning subtitles_path into a plain 1080x1920 source with the ass filter and with sprites."""
+    from rich.table import Table
+
+    source = ["-f", "lavfi", "-i", f"color=c=gray:s=1080x1920:r=30:d={seconds}"]
+    null_output = ["-f", "null", "-"]
+    escaped = subtitles_path.replace(":", "\\:").replace(",", "\\,")
+    timings = []
+
+    start = time.perf_counter()
+    subprocess.run(["ffmpeg", "-y", "-v", "error", *source, "-vf", f"ass={escaped}", *null_output], check=True)
+    timings.append(("ass filter", 0.0, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    list_path, (x, y) = render_sprite_track(subtitles_path, output_dir)
+    render_time = time.perf_counter() - start
+    start = time.perf_counter()
+    subprocess.run(["ffmpeg", "-y", "-v", "error", *source, "-f", "concat", "-safe", "0", "-i", list_path,
+                    "-filter_complex", f"[0:v][1:v]overlay={x}:{y}:eof_action=pass", *null_output], check=True)
+    timings.append(("sprites", render_time, time.perf_counter() - start))
+
+    table = Table(title=f"Subtitle burn-in ({seconds}s at 1080x1920, 30 fps)")
+    for column in ("Renderer", "Prepare (s)", "ffmpeg (s)", "Total (s)"):
+        table.add_column(column)
+    for name, prepare, encode in timings:
+        table.add_row(name, f"{prepare:.2f}", f"{encode:.2f}", f"{prepare + encode:.2f}")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render an .ass subtitle file as an overlay sprite track.")
+    parser.add_argument('subtitles', type=str, help='Path to the .ass file')
+    parser.add_argument('--out', type=str, default="output/sprites", help='Directory for sprites and the ffconcat list')
+    parser.add_argument('--compare', type=float, default=None,
+                        help='Instead time ass filter vs sprites over this many seconds')
+    args = parser.parse_args()
+    if args.compare:
+        compare_renderers(args.subtitles, args.compare, args.out)
+    else:
+        path, offset = render_sprite_track(args.subtitles, args.out)
+        console.print(f"✅ [green]Sprite track:[/] {path} at {offset}")
@@ -1,56 +1,425 @@
-import whisper
-from pipeline.sub_format import format_time_ass, create_highlighted_subtitle
+"""
+Whisper transcription and .ass subtitle generation.
+
+CONFIG["WHISPER_MODE"] = "chunked" splits long narrations at pauses and
+transcribes the pieces in parallel. Compare it with a single pass:
+
+    python -m pipeline.subtitles --compare voice.mp3 [--workers 4]
+"""
+import argparse
+import atexit
+import difflib
+import multiprocessing
+import os
+import re
+import threading
+import time
+import numpy as np
+from pipeline.audio import SAMPLE_RATE, find_silences, load_audio, split_points
+from pipeline.cache import hash_key, hash_file, cache_lookup, cache_write
+from pipeline.metrics import measure, record
+from pipeline.sub_format import build_events
 from pipeline.utils import console
 from config import CONFIG
 
+# Config that changes a transcript of the same audio with the same model, per transcription mode
+TRANSCRIPT_CONFIG_KEYS = {
+    "single": ("WHISPER_LANGUAGE",),
+    "chunked": ("WHISPER_LANGUAGE", "WHISPER_CHUNK_SECONDS"),
+    "align": ("WHISPER_LANGUAGE", "ALIGN_MIN_PROBABILITY"),
+    "streaming": ("WHISPER_LANGUAGE", "STREAM_WINDOW_SECONDS"),
+}
 
+# Process-level Whisper model cache keyed by (model name, device)
+_MODELS = {}
+_MODEL_LOCKS = {}
+_CACHE_LOCK = threading.Lock()
 
-def generate_subtitles(audio_path, output_path, speed_factor=1.3, device=None):
-    console.print("🧠 [bold yellow]Generating enhanced subtitles using Whisper...[/]")
-    whisper_device = device or CONFIG.get("WHISPER_DEVICE", "cpu")
-    model = whisper.load_model(CONFIG["WHISPER_MODEL"], device=whisper_device)
-    result = model.transcribe(audio_path, word_timestamps=True)
 
-    ass_output = output_path.replace(".srt", ".ass")
-    with open(ass_output, "w", encoding="utf-8") as f:
-        f.write("[Script Info]\nTitle: Enhanced Subtitles\nScriptType: v4.00+\nPlayResX: 1080\nPlayResY: 1920\n\n")
-        f.write("[V4+ Styles]\n")
-        f.write("Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n")
-        fancy_font = CONFIG.get('FONT_NAME', 'Montserrat')
-        font_size = CONFIG.get('FONT_SIZE', 78)
-        outline_size = CONFIG.get('OUTLINE_SIZE', 5)
-        shadow_size = CONFIG.get('SHADOW_SIZE', 2)
-        # Force white font, black outline, border style 1
-        primary = '&H00FFFFFF'   # white
-        outline = '&H00000000'   # black
-        shadow = '&H80000000'    # semi-transparent black
-        background = '&H00000000' # transparent
-        # Style: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
-        f.write(f"Style: Default,{fancy_font},{font_size},{primary},{primary},{outline},{background},1,0,0,0,100,100,0,0,1,{outline_size},{shadow_size},5,10,10,80,1\n\n")
-        f.write("[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
+class StubWhisperModel:
+    """
+    Offline stand-in for a Whisper model (WHISPER_MODEL "stub"), for
+    benchmarks and tests: every stretch of sound between pauses becomes
+    placeholder words at a steady speech pace.
+    """
+
+    words_per_second = 2.5
 
-        for segment in result["segments"]:
-            words = segment.get("words", [])
-            if not words:
+    def transcribe(self, audio, word_timestamps=True, **kwargs):
+        samples = load_audio(audio).samples if isinstance(audio, str) else np.asarray(audio, dtype=np.float32)
+        edges = [0] + [edge for silence in find_silences(samples) for edge in silence] + [len(samples)]
+        segments = []
+        for start, end in zip(edges[::2], edges[1::2]):
+            duration = (end - start) / SAMPLE_RATE
+            if duration < 0.1:
                 continue
+            times = start / SAMPLE_RATE + np.linspace(0.0, duration, max(1, round(duration * self.words_per_second)) + 1)
+            words = [{"word": " stub", "start": round(float(t0), 2), "end": round(float(t1), 2), "probability": 1.0}
+                     for t0, t1 in zip(times[:-1], times[1:])]
+            segments.append({"start": words[0]["start"], "end": words[-1]["end"],
+                             "text": "".join(w["word"] for w in words), "words": words})
+        return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
+
+
+def get_whisper_model(model_name=None, device=None):
+    """
+    Return (model, lock, load_seconds) for a cached Whisper model.
 
-            if CONFIG["HIGHLIGHT_MODE"] == "word":
-                for word in words:
-                    start = word["start"] / speed_factor
-                    end = word["end"] / speed_factor
-                    text = create_highlighted_subtitle([word["word"]], 0)
-                    f.write(f"Dialogue: 0,{format_time_ass(start)},{format_time_ass(end)},Default,,0,0,0,,{text}\n")
+    The model is loaded once per process; load_seconds is 0 on a cache hit.
+    Transcriptions on the same model must hold the returned lock, because
+    Whisper installs kv-cache hooks on the shared model while decoding.
+    """
+    model_name = model_name or CONFIG["WHISPER_MODEL"]
+    device = device or CONFIG.get("WHISPER_DEVICE", "cpu")
+    key = (model_name, device)
+    with _CACHE_LOCK:
+        if key not in _MODELS:
+            start = time.perf_counter()
+            if model_name == "stub":
+                _MODELS[key] = StubWhisperModel()
             else:
-                for i in range(0, len(words), CONFIG["MAX_WORDS_PER_SUBTITLE"]):
-                    chunk = words[i:i + CONFIG["MAX_WORDS_PER_SUBTITLE"]]
-                    chunk_text = [w["word"] for w in chunk]
-                    chunk_start = chunk[0]["start"] / speed_factor
-                    chunk_end = chunk[-1]["end"] / speed_factor
-                    for j in range(len(chunk)):
-                        word_start = chunk[j]["start"] / speed_factor
-                        word_end = chunk[j]["end"] / speed_factor
-                        text = create_highlighted_subtitle(chunk_text, j)
-                        f.write(f"Dialogue: 0,{format_time_ass(word_start)},{format_time_ass(word_end)},Default,,0,0,0,,{text}\n")
+                # Imported here: whisper pulls in torch, which takes seconds
+                import whisper
+                _MODELS[key] = whisper.load_model(model_name, device=device)
+            _MODEL_LOCKS[key] = threading.Lock()
+            load_time = time.perf_counter() - start
+            console.print(f"🧠 [yellow]Loaded Whisper '{model_name}' on {device} in {load_time:.2f}s[/]")
+        else:
+            load_time = 0.0
+        return _MODELS[key], _MODEL_LOCKS[key], load_time
+
+
+def transcribe_options():
+    """Keyword arguments for every model.transcribe call: word timestamps in WHISPER_LANGUAGE (empty detects)."""
+    return {"word_timestamps": True, "language": CONFIG.get("WHISPER_LANGUAGE") or None}
+
+
+def transcribe_audio(audio_path, device=None):
+    """
+    Transcribe audio with word timestamps.
+
+    Uses the warm transcription worker when one is listening on
+    CONFIG["WHISPER_WORKER_SOCKET"], otherwise the in-process model cache.
+    Returns (result, timings) where timings has load_s, transcribe_s and source.
+    """
+    from pipeline.whisper_worker import transcribe_via_worker
+
+    response = transcribe_via_worker(audio_path, device=device)
+    if response is not None:
+        return response["result"], {"load_s": response["load_s"], "transcribe_s": response["transcribe_s"], "source": "worker"}
+
+    samples = load_audio(audio_path).samples
+    model, lock, load_time = get_whisper_model(device=device)
+    start = time.perf_counter()
+    with lock:
+        result = model.transcribe(samples, **transcribe_options())
+    timings = {"load_s": load_time, "transcribe_s": time.perf_counter() - start, "source": "process"}
+    return result, timings
+
+
+def offset_segments(result, offset):
+    """Segments of a Whisper result with every timestamp shifted by offset seconds."""
+    segments = []
+    for segment in result["segments"]:
+        words = [{**word, "start": word["start"] + offset, "end": word["end"] + offset}
+                 for word in segment.get("words", [])]
+        segments.append({**segment, "start": segment["start"] + offset, "end": segment["end"] + offset, "words": words})
+    return segments
+
+
+def plan_chunks(samples, chunk_seconds, sample_rate=SAMPLE_RATE):
+    """
+    Split samples into (start, end) ranges of at most about chunk_seconds,
+    cutting only at pauses so no word straddles two chunks.
+    """
+    limit = chunk_seconds * sample_rate
+    bounds = [0]
+    previous = None
+    for point in split_points(samples, sample_rate):
+        if point - bounds[-1] > limit and previous is not None and previous > bounds[-1]:
+            bounds.append(previous)
+        previous = point
+    if len(samples) - bounds[-1] > limit and previous is not None and previous > bounds[-1]:
+        bounds.append(previous)
+    bounds.append(len(samples))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# Approximate resident size of one CPU copy of each Whisper model, in MB
+WHISPER_MODEL_MB = {"tiny": 400, "base": 500, "small": 1200, "medium": 3000, "turbo": 3500, "large": 6000}
+
+# The spawned chunk pool, kept for later calls with the same (model, workers, threads); one at a time
+_CHUNK_POOLS = {}
+
+
+def _init_chunk_worker(model_name, threads):
+    if model_name != "stub":
+        import torch
+        torch.set_num_threads(threads)
+    get_whisper_model(model_name, device="cpu")
+
+
+def _transcribe_chunk(args):
+    model_name, language, samples = args
+    model, _, _ = get_whisper_model(model_name, device="cpu")
+    # The language comes from the parent: a spawned process only sees config.py's defaults
+    return model.transcribe(samples, word_timestamps=True, language=language)
+
+
+def chunk_workers(model_name, workers):
+    """
+    Cap workers so their model copies fit in WHISPER_CHUNK_MEMORY_MB: every
+    chunk worker loads its own model, e.g. about 3 GB each for "medium".
+    """
+    budget = CONFIG.get("WHISPER_CHUNK_MEMORY_MB")
+    size = WHISPER_MODEL_MB.get(model_name.split(".")[0].split("-")[0], 0)
+    if not budget or not size:
+        return workers
+    return max(1, min(workers, budget // size))
+
+
+def close_chunk_pools():
+    """Shut down the chunk workers and free their model copies; the next chunked run starts new ones."""
+    with _CACHE_LOCK:
+        pools = list(_CHUNK_POOLS.values())
+        _CHUNK_POOLS.clear()
+    for pool in pools:
+        pool.terminate()
+        pool.join()
+
+
+atexit.register(close_chunk_pools)
+
+
+def _chunk_pool(model_name, workers, threads):
+    """Return (pool, seconds spent starting it) for chunk transcription."""
+    key = (model_name, workers, threads)
+    with _CACHE_LOCK:
+        if key in _CHUNK_POOLS:
+            return _CHUNK_POOLS[key], 0.0
+        # A pool for other settings would keep its model copies resident for nothing
+        for stale in _CHUNK_POOLS.values():
+            stale.terminate()
+        _CHUNK_POOLS.clear()
+        start = time.perf_counter()
+        # Spawned, not forked: torch's thread pools don't survive fork, and by now this process
+        # has other live threads (batch stage pools, the ffmpeg runner loop)
+        pool = multiprocessing.get_context("spawn").Pool(workers, _init_chunk_worker, (model_name, threads))
+        _CHUNK_POOLS[key] = pool
+        return pool, time.perf_counter() - start
+
+
+def transcribe_chunked(audio_path, device=None, workers=None):
+    """
+    Transcribe audio_path in pause-aligned chunks of WHISPER_CHUNK_SECONDS
+    spread over a pool of WHISPER_WORKERS spawned processes, then merge the
+    word timestamps with each chunk's offset. Returns (result, timings) like
+    transcribe_audio.
+
+    Each worker holds its own copy of the model, so their number is capped
+    by chunk_workers. The pool stays loaded for later calls until
+    close_chunk_pools (also run at exit).
+    """
+    device = device or CONFIG.get("WHISPER_DEVICE", "cpu")
+    workers = chunk_workers(CONFIG["WHISPER_MODEL"], workers or CONFIG["WHISPER_WORKERS"])
+    samples = load_audio(audio_path).samples
+    chunks = plan_chunks(samples, CONFIG["WHISPER_CHUNK_SECONDS"])
+    if device != "cpu" or workers <= 1 or len(chunks) == 1:
+        # One GPU (or core) gains nothing from more processes; run the chunks back to back
+        model, lock, load_time = get_whisper_model(device=device)
+        start = time.perf_counter()
+        with lock:
+            results = [model.transcribe(samples[a:b], **transcribe_options()) for a, b in chunks]
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        pool, load_time = _chunk_pool(CONFIG["WHISPER_MODEL"], workers, threads)
+        start = time.perf_counter()
+        language = transcribe_options()["language"]
+        results = pool.map(_transcribe_chunk, [(CONFIG["WHISPER_MODEL"], language, np.array(samples[a:b]))
+                                               for a, b in chunks], chunksize=1)
+
+    segments = []
+    for (chunk_start, _), chunk_result in zip(chunks, results):
+        segments.extend(offset_segments(chunk_result, chunk_start / SAMPLE_RATE))
+    result = {
+        "text": " ".join(chunk_result["text"].strip() for chunk_result in results),
+        "segments": segments,
+        "language": results[0].get("language") if results else None,
+    }
+    timings = {"load_s": load_time, "transcribe_s": time.perf_counter() - start, "source": f"{len(chunks)} chunks"}
+    return result, timings
+
+
+def transcription_mode(text=None):
+    """CONFIG["WHISPER_MODE"], except that "align" needs the script text."""
+    mode = CONFIG.get("WHISPER_MODE", "single")
+    return "single" if mode == "align" and not text else mode
+
+
+def transcript_cache_key(audio_path, text=None, mode=None):
+    """Transcript cache key; mode defaults to transcription_mode(text), "streaming" marks windowed transcripts."""
+    mode = mode or transcription_mode(text)
+    settings = {key: CONFIG.get(key) for key in TRANSCRIPT_CONFIG_KEYS.get(mode, ("WHISPER_LANGUAGE",))}
+    return hash_key(hash_file(audio_path), CONFIG["WHISPER_MODEL"], mode, settings, text if mode == "align" else None)
+
+
+def save_transcript(result, f):
+    """
+    Store word timestamps compactly: start/end arrays, a word array and the
+    segment index of every word, so subtitles can be rebuilt without Whisper.
+    """
+    words, starts, ends, segment_ids = [], [], [], []
+    for segment_id, segment in enumerate(result["segments"]):
+        for word in segment.get("words", []):
+            words.append(word["word"])
+            starts.append(word["start"])
+            ends.append(word["end"])
+            segment_ids.append(segment_id)
+    np.savez_compressed(
+        f,
+        words=np.array(words, dtype=str),
+        starts=np.array(starts, dtype=np.float64),
+        ends=np.array(ends, dtype=np.float64),
+        segment_ids=np.array(segment_ids, dtype=np.int32),
+    )
+
+
+def load_transcript(path):
+    """Rebuild a Whisper-style result (segments with words) from save_transcript output."""
+    with np.load(path) as data:
+        words, starts, ends, segment_ids = data["words"], data["starts"], data["ends"], data["segment_ids"]
+        segments = []
+        last_id = None
+        for word, start, end, segment_id in zip(words.tolist(), starts.tolist(), ends.tolist(), segment_ids.tolist()):
+            if segment_id != last_id:
+                segments.append({"words": []})
+                last_id = segment_id
+            segments[-1]["words"].append({"word": word, "start": start, "end": end})
+    return {"segments": segments}
+
+
+def get_transcript(audio_path, device=None, text=None):
+    """
+    Return the word-timestamp transcript for audio_path, transcribing only on
+    a cache miss. With WHISPER_MODE "align" and the script text, the script
+    is force-aligned to the audio instead of transcribed.
+    """
+    key = transcript_cache_key(audio_path, text)
+    cached = cache_lookup("transcripts", key, ".npz")
+    if cached:
+        console.print("♻️ [green]Transcript reused from cache, skipping Whisper[/]")
+        record("whisper", source="cache")
+        return load_transcript(cached)
+
+    mode = transcription_mode(text)
+    with measure("whisper"):
+        if mode == "align":
+            from pipeline.align import align_script
+            result, timings = align_script(audio_path, text, device=device)
+        elif mode == "chunked":
+            result, timings = transcribe_chunked(audio_path, device=device)
+        else:
+            result, timings = transcribe_audio(audio_path, device=device)
+    console.print(
+        f"⏱️ [cyan]Whisper ({timings['source']}): load {timings['load_s']:.2f}s, "
+        f"transcribe {timings['transcribe_s']:.2f}s[/]"
+    )
+    record("whisper", **timings)
+    cache_write("transcripts", key, ".npz", lambda f: save_transcript(result, f))
+    return result
+
+
+def generate_subtitles(audio_path, output_path, speed_factor=1.3, device=None, text=None):
+    console.print("🧠 [bold yellow]Generating enhanced subtitles using Whisper...[/]")
+    result = get_transcript(audio_path, device=device, text=text)
+    with measure("write"):
+        return write_ass_subtitles(result, output_path, speed_factor)
+
+
+def ass_header():
+    """[Script Info], [V4+ Styles] and the [Events] format line."""
+    fancy_font = CONFIG.get('FONT_NAME', 'Montserrat')
+    font_size = CONFIG.get('FONT_SIZE', 78)
+    outline_size = CONFIG.get('OUTLINE_SIZE', 5)
+    shadow_size = CONFIG.get('SHADOW_SIZE', 2)
+    # Force white font, black outline, border style 1
+    primary = '&H00FFFFFF'   # white
+    outline = '&H00000000'   # black
+    shadow = '&H80000000'    # semi-transparent black
+    background = '&H00000000' # transparent
+    return (
+        "[Script Info]\nTitle: Enhanced Subtitles\nScriptType: v4.00+\nPlayResX: 1080\nPlayResY: 1920\n\n"
+        "[V4+ Styles]\n"
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n"
+        # Style: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+        f"Style: Default,{fancy_font},{font_size},{primary},{primary},{outline},{background},1,0,0,0,100,100,0,0,1,{outline_size},{shadow_size},5,10,10,80,1\n\n"
+        "[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+    )
+
+
+def write_ass_subtitles(result, output_path, speed_factor=1.3):
+    """Write a Whisper-style result (segments with word timestamps) as an .ass file in one write."""
+    ass_output = output_path.replace(".srt", ".ass")
+    content = ass_header() + build_events(result, speed_factor)
+    with open(ass_output, "w", encoding="utf-8") as f:
+        f.write(content)
 
     console.print(f"✅ [green]Subtitles saved to {ass_output}[/]")
     return ass_output
+
+
+def _transcript_words(result):
+    words = [word for segment in result["segments"] for word in segment.get("words", [])]
+    return [re.sub(r"[^\w']+", "", word["word"].lower()) for word in words], words
+
+
+def compare_transcriptions(audio_path, workers=None, device=None):
+    """
+    Transcribe audio_path in a single pass and in chunked mode, and report
+    both wall times, the chunked word error rate against the single pass and
+    the mean start-time drift of matching words.
+    """
+    from rich.table import Table
+
+    model, lock, _ = get_whisper_model(device=device)
+    start = time.perf_counter()
+    with lock:
+        single = model.transcribe(audio_path, **transcribe_options())
+    single_s = time.perf_counter() - start
+    chunked, timings = transcribe_chunked(audio_path, device=device, workers=workers)
+
+    reference, reference_words = _transcript_words(single)
+    hypothesis, hypothesis_words = _transcript_words(chunked)
+    errors, drift = 0, []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, reference, hypothesis, autojunk=False).get_opcodes():
+        if tag == "equal":
+            drift.extend(abs(reference_words[i]["start"] - hypothesis_words[j]["start"])
+                         for i, j in zip(range(i1, i2), range(j1, j2)))
+        else:
+            errors += max(i2 - i1, j2 - j1)
+    stats = {
+        "single_s": round(single_s, 3),
+        "chunked_s": round(timings["transcribe_s"], 3),
+        "speedup": round(single_s / timings["transcribe_s"], 2) if timings["transcribe_s"] else 0.0,
+        "chunks": timings["source"],
+        "words": len(reference),
+        "wer": round(errors / len(reference), 4) if reference else 0.0,
+        "mean_start_drift_s": round(float(np.mean(drift)), 4) if drift else 0.0,
+    }
+
+    table = Table(title=f"Single-pass vs chunked Whisper ({os.path.basename(audio_path)})")
+    table.add_column("Metric")
+    table.add_column("Value")
+    for name, value in stats.items():
+        table.add_row(name, str(value))
+    console.print(table)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare single-pass and chunked Whisper transcription.")
+    parser.add_argument('--compare', type=str, required=True, help='Narration audio to transcribe both ways')
+    parser.add_argument('--workers', type=int, help='Chunk worker processes (default: CONFIG["WHISPER_WORKERS"])')
+    parser.add_argument('--device', type=str, help='Device to run Whisper on (default: CONFIG["WHISPER_DEVICE"])')
+    args = parser.parse_args()
+    compare_transcriptions(args.compare, args.workers, args.device)
@@ -25,19 +25,17 @@ def get_audio_duration(audio_path):
         return 60
 
 def check_gpu_support():
-    if not CONFIG.get("USE_GPU"):
-        return False, "libx264", ""
-    try:
-        cmd = ["ffmpeg", "-hide_banner", "-encoders"]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if CONFIG.get("GPU_ENCODER") in result.stdout:
-            console.print(f"✅ [green]GPU encoder {CONFIG['GPU_ENCODER']} available[/]")
-            return True, CONFIG.get("GPU_ENCODER"), CONFIG.get("GPU_DECODER")
-        else:
-            console.print(f"❌ [yellow]GPU encoder {CONFIG['GPU_ENCODER']} not available[/]")
-            return False, "libx264", ""
-    except subprocess.CalledProcessError:
-        return False, "libx264", ""
+    """Return (use_gpu, video_encoder, video_decoder) from the cached encoder probe."""
+    from pipeline.encoders import select_encoder
+
+    profile = select_encoder()
+    if profile["hardware"]:
+        console.print(f"✅ [green]GPU encoder {profile['encoder']} available[/]")
+        decoder = CONFIG.get("GPU_DECODER", "") if profile["name"] == "nvenc" else ""
+        return True, profile["encoder"], decoder
+    if CONFIG.get("USE_GPU"):
+        console.print(f"❌ [yellow]GPU encoder {CONFIG['GPU_ENCODER']} not available[/]")
+    return False, "libx264", ""
 
 def list_videos(directory):
     return [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith((".mp4", ".mkv", ".mov"))]
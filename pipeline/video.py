@@ -1,49 +1,236 @@
+import os
 import random
-import subprocess
-from pipeline.utils import get_video_duration, get_audio_duration, list_videos, console
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import CONFIG
+from pipeline.utils import console
+from pipeline.clip_index import refresh_index
+from pipeline.cache import hash_key, cache_path, evict
+from pipeline.ffmpeg_runner import default_threads, run_ffmpeg
+
+
+def select_clips(clips, audio_duration, rng=random):
+    """Randomly draw indexed clips (looping over the library) until their total covers audio_duration."""
+    usable = [clip for clip in clips if clip["duration"]]
+    if not usable:
+        raise RuntimeError("No usable clips in the clip index")
+    remaining = usable.copy()
+    selected = []
+    total = 0
+    # Keep adding clips until we reach or exceed audio duration
+    while total < audio_duration:
+        if not remaining:
+            # If we've used all clips, start over (loop)
+            remaining = usable.copy()
+        clip = rng.choice(remaining)
+        remaining.remove(clip)
+        total += clip["duration"]
+        selected.append(clip)
+    return selected
+
+
+def clip_seed():
+    """CONFIG["CLIP_SEED"], or a fresh seed to record so the selection can be repeated."""
+    seed = CONFIG.get("CLIP_SEED")
+    return random.randrange(2 ** 32) if seed is None else seed
+
+
+def select_segments(video_dir, audio_duration, rng=random):
+    """
+    Pick {"path", "start", "duration", "clip"} segments whose lengths add up to audio_duration.
+
+    With USE_RANDOM_SEGMENT each clip contributes one random sub-segment of
+    MIN_SEGMENT_DURATION..MAX_SEGMENT_DURATION seconds (or the whole clip if it
+    is shorter); otherwise whole clips are used. The last segment is always
+    trimmed so no video beyond audio_duration is decoded. Pass a seeded
+    random.Random as rng for a reproducible selection.
+    """
+    clips = refresh_index(video_dir)
+    segments = []
+    remaining = audio_duration
+    if not CONFIG.get("USE_RANDOM_SEGMENT"):
+        for clip in select_clips(clips, audio_duration, rng):
+            duration = min(clip["duration"], remaining)
+            segments.append({"path": clip["path"], "start": 0.0, "duration": duration, "clip": clip})
+            remaining -= duration
+        return segments
+
+    usable = [clip for clip in clips if clip["duration"]]
+    if not usable:
+        raise RuntimeError("No usable clips in the clip index")
+    min_length = CONFIG.get("MIN_SEGMENT_DURATION", 30)
+    max_length = max(min_length, CONFIG.get("MAX_SEGMENT_DURATION", 120))
+    pool = []
+    while remaining > 0:
+        if not pool:
+            # Every clip used once; start over (loop)
+            pool = usable.copy()
+        clip = pool.pop(rng.randrange(len(pool)))
+        length = min(rng.uniform(min_length, max_length), clip["duration"], remaining)
+        start = rng.uniform(0, clip["duration"] - length)
+        segments.append({"path": clip["path"], "start": start, "duration": length, "clip": clip})
+        remaining -= length
+    return segments
+
+
+def trim_segments(segments, duration):
+    """Drop or shorten trailing segments so their total is at most duration."""
+    trimmed = []
+    remaining = duration
+    for segment in segments:
+        if remaining <= 0:
+            break
+        trimmed.append({**segment, "duration": min(segment["duration"], remaining)})
+        remaining -= segment["duration"]
+    return trimmed
 
 
 def combine_for_audio_duration(video_dir, audio_path, temp_output="output/combined.mp4"):
-    import os
+    from pipeline.audio import load_audio
     console.print("🎞️ [cyan]Combining random video segments to match audio duration...[/]")
+    return combine_for_duration(video_dir, load_audio(audio_path).duration, temp_output)
+
+
+def combine_for_duration(video_dir, duration, temp_output="output/combined.mp4"):
+    """Combine random segments covering duration seconds; usable before the audio exists."""
+    return combine_selected(select_segments(video_dir, duration), temp_output)
+
+
+def combine_selected(segments, temp_output="output/combined.mp4"):
+    """
+    Join segments from select_segments into temp_output.
+
+    Whole clips sharing codec parameters are stream-copied as-is. Otherwise
+    whole clips are brought into the cached uniform format and trimmed
+    windows are re-encoded with input seeking, so every join falls on a
+    frame boundary and the result runs exactly as long as the segments.
+    """
     # Ensure output directory exists
     output_dir = os.path.dirname(temp_output)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
 
-    all_clips = list_videos(video_dir)
-    audio_duration = get_audio_duration(audio_path)
-    total = 0
-    selected = []
-    orig_clips = all_clips.copy()
+    clips = list({segment["path"]: segment["clip"] for segment in segments}.values())
+
+    # Fast path: whole clips with identical codec parameters can be joined without re-encoding
+    if (not any(is_trimmed(segment) for segment in segments)
+            and len({stream_signature(clip) for clip in clips}) == 1 and clips[0]["has_audio"]):
+        console.print("⚡ [cyan]Selected clips share codec parameters, stream-copying[/]")
+        return concat_copy([segment["path"] for segment in segments], temp_output)
+
+    # Otherwise produce each distinct part once in the uniform format, then stream-copy
+    parts = {segment_key(segment): segment for segment in segments}
+    workers = min(CONFIG["NORMALIZE_WORKERS"], len(parts))
+    threads = max(1, default_threads() // workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        paths = dict(zip(parts, pool.map(lambda segment: segment_clip(segment, threads), parts.values())))
+    return concat_copy([paths[segment_key(segment)] for segment in segments], temp_output)
+
+
+def is_trimmed(segment):
+    """True if segment covers only part of its clip; such cuts can't be stream-copied cleanly."""
+    return segment["start"] > 0 or (segment["duration"] is not None
+                                    and segment["duration"] < segment["clip"]["duration"])
+
+
+def segment_key(segment):
+    if not is_trimmed(segment):
+        return (segment["path"],)
+    return segment["path"], round(segment["start"], 3), round(segment["duration"], 3)
+
+
+def segment_clip(segment, threads=None):
+    """Path to segment in the uniform intermediate format (whole clips via normalized_clip)."""
+    if not is_trimmed(segment):
+        return normalized_clip(segment["clip"], threads)
+    return trimmed_clip(segment["clip"], segment["start"], segment["duration"], threads)
+
+
+def stream_signature(clip):
+    """Codec parameters that must match for concat-demuxer stream copy."""
+    fps = round(clip["fps"], 3) if clip["fps"] else None
+    return (clip["codec"], clip["width"], clip["height"], clip["pix_fmt"], fps,
+            clip["audio_codec"], clip["sample_rate"], clip["channels"])
 
-    # Keep adding clips until we reach or exceed audio duration
-    while total < audio_duration:
-        if not all_clips:
-            # If we've used all clips, start over (loop)
-            all_clips = orig_clips.copy()
-        clip = random.choice(all_clips)
-        all_clips.remove(clip)
-        duration = get_video_duration(clip)
-        if duration:
-            total += duration
-            selected.append(clip)
-
-    cmd = ["ffmpeg", "-y"]
-    for path in selected:
-        cmd.extend(["-i", path])
-
-    filter_complex = "".join([f"[{i}:v:0][{i}:a:0]" for i in range(len(selected))])
-    filter_complex += f"concat=n={len(selected)}:v=1:a=1[outv][outa]"
-
-    cmd.extend(["-filter_complex", filter_complex, "-map", "[outv]", "-map", "[outa]", temp_output])
-    subprocess.run(cmd, check=True)
-    return temp_output
+
+def normalized_signature():
+    target = CONFIG["NORMALIZE_FORMAT"]
+    return ("h264", target["width"], target["height"], "yuv420p", round(float(target["fps"]), 3),
+            "aac", target["sample_rate"], target["channels"])
+
+
+def normalized_clip(clip, threads=None):
+    """
+    Return a path to clip in the uniform intermediate format, transcoding it
+    into the "normalized" cache on first use with threads cores (default:
+    the runner's share). Clips already in that format are returned as-is;
+    clips without audio get a silent track.
+    """
+    if clip["has_audio"] and stream_signature(clip) == normalized_signature():
+        return clip["path"]
+    key = hash_key(clip["path"], clip["mtime"], clip["size"], CONFIG["NORMALIZE_FORMAT"])
+    return _transcode(clip, key, f"🔧 [cyan]Normalizing {os.path.basename(clip['path'])} for stream copy...[/]",
+                      threads)
+
+
+def trimmed_clip(clip, start, duration, threads=None):
+    """
+    Return a path to the start..start+duration window of clip in the uniform
+    format, cached per window in the "normalized" namespace. The window is
+    input-seeked and re-encoded, so it starts on its own keyframe.
+    """
+    start, duration = round(start, 3), round(duration, 3)
+    key = hash_key(clip["path"], clip["mtime"], clip["size"], CONFIG["NORMALIZE_FORMAT"], start, duration)
+    return _transcode(clip, key, f"✂️ [cyan]Cutting {duration:.1f}s of {os.path.basename(clip['path'])} "
+                                 f"at {start:.1f}s...[/]", threads, start=start, duration=duration)
+
+
+def _transcode(clip, key, message, threads=None, start=None, duration=None):
+    output = cache_path("normalized", key, ".mp4")
+    if os.path.exists(output):
+        os.utime(output)
+        return output
+
+    console.print(message)
+    target = CONFIG["NORMALIZE_FORMAT"]
+    width, height = target["width"], target["height"]
+    cmd = ["ffmpeg", "-y", "-v", "error"]
+    if start is not None:
+        cmd.extend(["-ss", f"{start:.3f}", "-t", f"{duration:.3f}"])
+    cmd.extend(["-i", clip["path"]])
+    if not clip["has_audio"]:
+        cmd.extend(["-f", "lavfi", "-i", f"anullsrc=r={target['sample_rate']}:cl=stereo"])
+    cmd.extend([
+        "-map", "0:v:0", "-map", "0:a:0" if clip["has_audio"] else "1:a:0",
+        "-vf", f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},setsar=1",
+        "-r", str(target["fps"]), "-c:v", "libx264", "-preset", target["preset"], "-crf", str(target["crf"]),
+        "-pix_fmt", "yuv420p", "-video_track_timescale", "15360",
+        "-c:a", "aac", "-ar", str(target["sample_rate"]), "-ac", str(target["channels"]),
+        "-shortest", "-movflags", "+faststart", "-f", "mp4",
+    ])
+    tmp_output = f"{output}.{os.getpid()}.{threading.get_ident()}.tmp"
+    run_ffmpeg(cmd + [tmp_output], threads=threads, duration=duration or clip["duration"],
+               label=f"normalize {os.path.basename(clip['path'])}")
+    os.replace(tmp_output, output)
+    evict("normalized")
+    return output
+
+
+def normalize_library(video_dir):
+    """Pre-normalize every indexed clip so later runs always take the stream-copy path."""
+    clips = [clip for clip in refresh_index(video_dir) if clip["duration"]]
+    threads = max(1, default_threads() // CONFIG["NORMALIZE_WORKERS"])
+    with ThreadPoolExecutor(max_workers=CONFIG["NORMALIZE_WORKERS"]) as pool:
+        return list(pool.map(lambda clip: normalized_clip(clip, threads), clips))
 
 
 def combine(video_paths, temp_output="output/combined.mp4"):
-    import os
     console.print("📽️ [cyan]Combining multiple clips...[/]")
+    return concat_copy(video_paths, temp_output)
+
+
+def concat_copy(paths, temp_output="output/combined.mp4"):
+    """Stream-copy whole files with the concat demuxer; they must share codec parameters."""
     # Ensure output directory exists
     output_dir = os.path.dirname(temp_output)
     if output_dir and not os.path.exists(output_dir):
@@ -51,8 +238,10 @@ def combine(video_paths, temp_output="output/combined.mp4"):
 
     list_file = os.path.join(output_dir, "inputs.txt") if output_dir else "inputs.txt"
     with open(list_file, "w") as f:
-        for path in video_paths:
-            f.write(f"file '{os.path.abspath(path)}'\n")
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
     cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", temp_output]
-    subprocess.run(cmd, check=True)
+    # Stream copy is I/O-bound, so it runs outside the core budget
+    run_ffmpeg(cmd, threads=0, label="combine")
     return temp_output
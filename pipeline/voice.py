@@ -1,18 +1,359 @@
-from elevenlabs.client import ElevenLabs
-from elevenlabs import save
+"""
+Voice-over generation through pluggable TTS backends.
+
+CONFIG["VOICE_BACKEND"] picks the engine ("elevenlabs", "stub" or "local");
+every backend turns text into mp3 bytes and results are cached per backend.
+Compare backends on the same corpus (JSONL or a directory of .txt scripts):
+
+    python -m pipeline.voice --benchmark scripts/ [--backends stub,local]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import wave
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from pipeline.cache import hash_key, cache_lookup, cache_store
+from pipeline.metrics import measure
 from pipeline.utils import console
 from config import CONFIG
 
 
-def generate_voice(text, output_path):
-    elevenlabs = ElevenLabs(api_key=CONFIG["ELEVEN_API_KEY"])
-    console.print("🔊 [bold yellow]Generating voice with ElevenLabs SDK...[/]")
-    audio = elevenlabs.text_to_speech.convert(
-        text=text,
-        voice_id=CONFIG["VOICE_ID"],
-        model_id="eleven_multilingual_v2",
-        output_format="mp3_44100_128",
-    )
-    save(audio, output_path)
+def split_sentences(text):
+    """Split narration at sentence-ending punctuation."""
+    return [s for s in re.split(r"(?<=[.!?])\s+", text.strip()) if s] or [text.strip()]
+
+
+def encode_mp3(pcm, sample_rate):
+    """Encode mono float32 samples as 128 kbit/s mp3 bytes."""
+    cmd = ["ffmpeg", "-v", "error", "-f", "f32le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+           "-b:a", "128k", "-f", "mp3", "pipe:1"]
+    return subprocess.run(cmd, input=pcm.astype(np.float32).tobytes(), capture_output=True, check=True).stdout
+
+
+class StubTextToSpeech:
+    """
+    Offline stand-in for ElevenLabs' text_to_speech API: one sine tone per
+    sentence, paced like speech, with a short pause between sentences.
+    """
+
+    words_per_second = 2.5
+    pause_seconds = 0.4
+    sample_rate = 44100
+
+    def synthesize(self, text):
+        parts = []
+        for sentence in split_sentences(text):
+            duration = max(0.5, len(sentence.split()) / self.words_per_second)
+            t = np.arange(int(duration * self.sample_rate)) / self.sample_rate
+            parts.append(0.3 * np.sin(2 * np.pi * 220 * t))
+            parts.append(np.zeros(int(self.pause_seconds * self.sample_rate)))
+        return encode_mp3(np.concatenate(parts), self.sample_rate)
+
+    def convert(self, voice_id=None, *, text, model_id=None, output_format=None):
+        yield self.synthesize(text)
+
+    def stream(self, voice_id=None, *, text, model_id=None, output_format=None, chunk_size=4096):
+        audio = self.synthesize(text)
+        for offset in range(0, len(audio), chunk_size):
+            yield audio[offset:offset + chunk_size]
+
+
+class StubClient:
+    """Client with the same surface the ElevenLabs backend uses, for offline runs and tests."""
+
+    def __init__(self):
+        self.text_to_speech = StubTextToSpeech()
+
+
+class VoiceBackend(ABC):
+    """
+    A TTS engine. Subclasses implement synthesize(text) -> mp3 bytes; engines
+    that are cheaper per script in bulk set batched and override
+    synthesize_batch.
+    """
+
+    name = ""
+    label = ""
+    batched = False
+
+    def cache_identity(self):
+        """Settings that change the audio produced for the same text."""
+        return ()
+
+    @abstractmethod
+    def synthesize(self, text):
+        """mp3 bytes for text."""
+
+    def synthesize_batch(self, texts):
+        return [self.synthesize(text) for text in texts]
+
+    def stream(self, text):
+        """Yield mp3 byte chunks; engines without streaming yield the whole file."""
+        yield self.synthesize(text)
+
+
+class ElevenLabsBackend(VoiceBackend):
+    """
+    The ElevenLabs SDK. CONFIG["ELEVEN_BASE_URL"] points it at another
+    server, e.g. the fake streaming server in pipeline.fake_tts_server.
+    """
+
+    name = "elevenlabs"
+    label = "ElevenLabs SDK"
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from elevenlabs.client import ElevenLabs
+            if CONFIG.get("ELEVEN_BASE_URL"):
+                self._client = ElevenLabs(api_key=CONFIG["ELEVEN_API_KEY"], base_url=CONFIG["ELEVEN_BASE_URL"])
+            else:
+                self._client = ElevenLabs(api_key=CONFIG["ELEVEN_API_KEY"])
+        return self._client
+
+    def cache_identity(self):
+        return (CONFIG.get("ELEVEN_BASE_URL", ""), CONFIG["VOICE_ID"], CONFIG["VOICE_MODEL_ID"],
+                CONFIG["VOICE_OUTPUT_FORMAT"])
+
+    def synthesize(self, text):
+        audio = self.client.text_to_speech.convert(
+            text=text,
+            voice_id=CONFIG["VOICE_ID"],
+            model_id=CONFIG["VOICE_MODEL_ID"],
+            output_format=CONFIG["VOICE_OUTPUT_FORMAT"],
+        )
+        return audio if isinstance(audio, bytes) else b"".join(chunk for chunk in audio if chunk)
+
+    def stream(self, text):
+        return self.client.text_to_speech.stream(
+            CONFIG["VOICE_ID"],
+            text=text,
+            model_id=CONFIG["VOICE_MODEL_ID"],
+            output_format=CONFIG["VOICE_OUTPUT_FORMAT"],
+        )
+
+
+class StubBackend(ElevenLabsBackend):
+    """Offline tone generator behind the ElevenLabs code path."""
+
+    name = "stub"
+    label = "stub TTS"
+
+    def __init__(self):
+        super().__init__(StubClient())
+
+    def cache_identity(self):
+        return super().cache_identity() + (StubTextToSpeech.words_per_second, StubTextToSpeech.pause_seconds)
+
+
+class LocalBackend(VoiceBackend):
+    """
+    Offline CPU TTS through a command-line engine, Piper by default.
+
+    Scripts are split into sentences, and the sentences of a whole batch are
+    spread over LOCAL_TTS_WORKERS engine processes fed as JSON lines, so each
+    process loads the voice model once. Sentences are then joined per script
+    with LOCAL_TTS_PAUSE seconds of silence.
+    """
+
+    name = "local"
+    label = "local TTS"
+    batched = True
+
+    def cache_identity(self):
+        return (CONFIG["LOCAL_TTS_COMMAND"], os.path.basename(CONFIG["LOCAL_TTS_MODEL"]), CONFIG["LOCAL_TTS_PAUSE"])
+
+    def synthesize(self, text):
+        return self.synthesize_batch([text])[0]
+
+    def _run_engine(self, requests):
+        command = [part.replace("{model}", CONFIG["LOCAL_TTS_MODEL"]) for part in CONFIG["LOCAL_TTS_COMMAND"]]
+        lines = "".join(json.dumps({"text": text, "output_file": path}) + "\n" for text, path in requests)
+        subprocess.run(command, input=lines.encode("utf-8"), capture_output=True, check=True)
+
+    def synthesize_batch(self, texts):
+        sentences = [(index, sentence) for index, text in enumerate(texts) for sentence in split_sentences(text)]
+        workers = max(1, min(CONFIG["LOCAL_TTS_WORKERS"], len(sentences)))
+        with tempfile.TemporaryDirectory(prefix="local_tts_") as work_dir:
+            paths = [os.path.join(work_dir, f"{n:05d}.wav") for n in range(len(sentences))]
+            requests = [(sentence, path) for (_, sentence), path in zip(sentences, paths)]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(self._run_engine, [requests[w::workers] for w in range(workers)]))
+
+            pcm = [[] for _ in texts]
+            sample_rate = None
+            for (index, _), path in zip(sentences, paths):
+                with wave.open(path, "rb") as f:
+                    sample_rate = f.getframerate()
+                    samples = np.frombuffer(f.readframes(f.getnframes()), np.int16).astype(np.float32) / 32768.0
+                pcm[index].append(samples)
+                pcm[index].append(np.zeros(int(CONFIG["LOCAL_TTS_PAUSE"] * sample_rate), np.float32))
+        return [encode_mp3(np.concatenate(parts), sample_rate) for parts in pcm]
+
+
+VOICE_BACKENDS = {
+    "elevenlabs": ElevenLabsBackend,
+    "stub": StubBackend,
+    "local": LocalBackend,
+}
+
+
+def get_backend(name=None):
+    """Instantiate the backend named name (default CONFIG["VOICE_BACKEND"])."""
+    name = name or CONFIG.get("VOICE_BACKEND", "elevenlabs")
+    if name not in VOICE_BACKENDS:
+        raise ValueError(f"Unknown voice backend '{name}' (choose from {', '.join(VOICE_BACKENDS)})")
+    return VOICE_BACKENDS[name]()
+
+
+def voice_cache_key(text, backend=None):
+    backend = backend or get_backend()
+    return hash_key(backend.name, backend.cache_identity(), text)
+
+
+def save_audio(audio, output_path):
+    """Write audio (bytes or an iterator of byte chunks) to output_path."""
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, "wb") as f:
+        if isinstance(audio, bytes):
+            f.write(audio)
+        else:
+            for chunk in audio:
+                if chunk:
+                    f.write(chunk)
+
+
+def _reuse_cached_voice(key, output_path):
+    cached = cache_lookup("voice", key, ".mp3")
+    if not cached:
+        return False
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    shutil.copyfile(cached, output_path)
+    console.print(f"♻️ [green]Voice-over reused from cache:[/] {output_path}")
+    return True
+
+
+def generate_voice(text, output_path, backend=None):
+    backend = backend or get_backend()
+    key = voice_cache_key(text, backend)
+    if _reuse_cached_voice(key, output_path):
+        return output_path
+
+    console.print(f"🔊 [bold yellow]Generating voice with {backend.label}...[/]")
+    with measure("synthesize"):
+        save_audio(backend.synthesize(text), output_path)
+    cache_store("voice", key, ".mp3", output_path)
     console.print(f"✅ [green]Voice-over saved to:[/] {output_path}")
     return output_path
+
+
+def generate_voices(items, backend=None):
+    """
+    Generate voice-overs for (text, output_path) pairs, sending every cache
+    miss to the backend in a single synthesize_batch call.
+    """
+    backend = backend or get_backend()
+    keys = [voice_cache_key(text, backend) for text, _ in items]
+    missing = [(key, text, path) for key, (text, path) in zip(keys, items) if not _reuse_cached_voice(key, path)]
+    if missing:
+        console.print(f"🔊 [bold yellow]Generating {len(missing)} voice-overs with {backend.label}...[/]")
+        for (key, _, path), audio in zip(missing, backend.synthesize_batch([text for _, text, _ in missing])):
+            save_audio(audio, path)
+            cache_store("voice", key, ".mp3", path)
+    return [path for _, path in items]
+
+
+def stream_voice(text, output_path, backend=None, on_chunk=None):
+    """
+    Like generate_voice, but requests a streamed response and appends each
+    chunk to output_path as it arrives, so readers can start on the partial
+    file. on_chunk(bytes_written) is called after every flushed chunk.
+    Returns (output_path, from_cache).
+    """
+    backend = backend or get_backend()
+    key = voice_cache_key(text, backend)
+    if _reuse_cached_voice(key, output_path):
+        if on_chunk:
+            on_chunk(os.path.getsize(output_path))
+        return output_path, True
+
+    console.print(f"🔊 [bold yellow]Streaming voice with {backend.label}...[/]")
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    written = 0
+    with open(output_path, "wb") as f:
+        for chunk in backend.stream(text):
+            if not chunk:
+                continue
+            f.write(chunk)
+            f.flush()
+            written += len(chunk)
+            if on_chunk:
+                on_chunk(written)
+    cache_store("voice", key, ".mp3", output_path)
+    console.print(f"✅ [green]Voice-over streamed to:[/] {output_path}")
+    return output_path, False
+
+
+def benchmark_backends(corpus_path, names=None):
+    """
+    Synthesize every script in corpus_path with each backend (bypassing the
+    cache) and report wall time, audio produced and real-time factor.
+    """
+    from rich.table import Table
+    from pipeline.batch import load_manifest
+    from pipeline.utils import get_audio_duration
+
+    texts = [entry["text"] for entry in load_manifest(corpus_path) if entry["text"].strip()]
+    results = {}
+    for name in names or list(VOICE_BACKENDS):
+        backend = get_backend(name)
+        console.print(f"⏱️ [cyan]Benchmarking {backend.label} on {len(texts)} scripts...[/]")
+        start = time.perf_counter()
+        try:
+            audio = backend.synthesize_batch(texts)
+        except Exception as e:
+            console.print(f"❌ [red]{name} failed: {e}[/]")
+            continue
+        wall = time.perf_counter() - start
+        with tempfile.TemporaryDirectory(prefix="voice_bench_") as work_dir:
+            seconds = 0.0
+            for n, data in enumerate(audio):
+                path = os.path.join(work_dir, f"{n}.mp3")
+                save_audio(data, path)
+                seconds += get_audio_duration(path)
+        results[name] = {"scripts": len(texts), "wall_s": round(wall, 3), "audio_s": round(seconds, 2),
+                         "realtime_x": round(seconds / wall, 2) if wall > 0 else 0.0,
+                         "scripts_per_min": round(len(texts) / wall * 60, 2) if wall > 0 else 0.0}
+
+    table = Table(title=f"Voice backend benchmark ({len(texts)} scripts)")
+    for column in ("Backend", "Wall (s)", "Audio (s)", "x real time", "Scripts/min"):
+        table.add_column(column)
+    for name, stats in sorted(results.items(), key=lambda item: item[1]["wall_s"]):
+        table.add_row(name, f"{stats['wall_s']:.2f}", f"{stats['audio_s']:.1f}", f"{stats['realtime_x']:.1f}",
+                      f"{stats['scripts_per_min']:.1f}")
+    console.print(table)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark voice backends on a corpus of scripts.")
+    parser.add_argument('--benchmark', type=str, required=True, help='JSONL manifest or directory of .txt scripts')
+    parser.add_argument('--backends', type=str, help=f'Comma-separated backends (default: {",".join(VOICE_BACKENDS)})')
+    args = parser.parse_args()
+    benchmark_backends(args.benchmark, args.backends.split(",") if args.backends else None)
@@ -0,0 +1,106 @@
+"""
+Long-lived Whisper transcription worker.
+
+Keeps Whisper models warm behind a Unix socket so batch runs and repeated CLI
+invocations skip model loading entirely:
+
+    python -m pipeline.whisper_worker [--socket PATH] [--model base] [--device cpu]
+
+The protocol is one JSON request line per connection
+({"audio_path", "model", "device", "language"}) answered by one JSON response line.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import time
+
+from config import CONFIG
+from pipeline.utils import console
+
+
+def transcribe_via_worker(audio_path, model_name=None, device=None, socket_path=None):
+    """
+    Ask a running worker to transcribe audio_path.
+
+    Returns the response dict (result, load_s, transcribe_s) or None when no
+    worker is listening, so callers can fall back to in-process transcription.
+    """
+    socket_path = socket_path or CONFIG.get("WHISPER_WORKER_SOCKET")
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+    request = {
+        "audio_path": os.path.abspath(audio_path),
+        "model": model_name or CONFIG["WHISPER_MODEL"],
+        "device": device or CONFIG.get("WHISPER_DEVICE", "cpu"),
+        "language": CONFIG.get("WHISPER_LANGUAGE") or None,
+    }
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            with sock.makefile("r", encoding="utf-8") as reader:
+                line = reader.readline()
+    except OSError as e:
+        console.print(f"[yellow]Whisper worker unavailable ({e}), transcribing in-process[/]")
+        return None
+    response = json.loads(line) if line else {"ok": False, "error": "empty response"}
+    if not response.get("ok"):
+        raise RuntimeError(f"Whisper worker failed: {response.get('error')}")
+    return response
+
+
+class _TranscribeHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        from pipeline.audio import load_audio
+        from pipeline.subtitles import get_whisper_model
+
+        try:
+            request = json.loads(self.rfile.readline())
+            model, lock, load_time = get_whisper_model(request.get("model"), request.get("device"))
+            samples = load_audio(request["audio_path"]).samples
+            start = time.perf_counter()
+            with lock:
+                result = model.transcribe(samples, word_timestamps=True, language=request.get("language"))
+            transcribe_time = time.perf_counter() - start
+            console.print(f"🧠 [cyan]{request['audio_path']}: load {load_time:.2f}s, transcribe {transcribe_time:.2f}s[/]")
+            response = {"ok": True, "result": result, "load_s": load_time, "transcribe_s": transcribe_time}
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write((json.dumps(response, default=float) + "\n").encode("utf-8"))
+
+
+class _WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path=None, model_name=None, device=None):
+    """Preload a model and serve transcription requests until interrupted."""
+    from pipeline.subtitles import get_whisper_model
+
+    socket_path = socket_path or CONFIG["WHISPER_WORKER_SOCKET"]
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    socket_dir = os.path.dirname(socket_path)
+    if socket_dir:
+        os.makedirs(socket_dir, exist_ok=True)
+    get_whisper_model(model_name, device)
+    with _WorkerServer(socket_path, _TranscribeHandler) as server:
+        console.print(f"🧠 [bold green]Whisper worker listening on {socket_path}[/]")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep a Whisper model warm behind a Unix socket.")
+    parser.add_argument('--socket', type=str, help='Socket path (default: CONFIG["WHISPER_WORKER_SOCKET"])')
+    parser.add_argument('--model', type=str, help='Whisper model to preload (default: CONFIG["WHISPER_MODEL"])')
+    parser.add_argument('--device', type=str, help='Device to load the model on (default: CONFIG["WHISPER_DEVICE"])')
+    args = parser.parse_args()
+    serve(args.socket, args.model, args.device)
@@ -1,20 +1,33 @@
 """
 Pipeline runner for auto-audio-generator
-Allows skipping modules via CLI flags or config.
+Reruns only the stages whose inputs or config changed (see pipeline/stages.py);
+--force reruns stages on demand.
 """
 import argparse
+import os
 from config import CONFIG
-from pipeline.voice import generate_voice
-from pipeline.subtitles import generate_subtitles
-from pipeline.video import combine_for_audio_duration, combine
-from pipeline.finalize import process_video
-from pipeline.utils import list_videos
+from pipeline.batch import run_batch
+from pipeline.metrics import collecting, measure, write_metrics
+from pipeline.stages import STAGES, new_job, record_streamed_run, run_job, stale_stages
 from rich.console import Console
-import os
 
 console = Console()
 
-def run_pipeline(skip_voice=False, skip_subtitles=False, skip_video=False, text=None, reddit_title=None):
+
+def pipeline_job(text, reddit_title=None, force=()):
+    """Stage-graph job for the single-video outputs named in CONFIG."""
+    output_dir = os.path.join(CONFIG["DIR_BASE_DIRECTORY"], "output")
+    return new_job("pipeline", text, reddit_title, {
+        "voice": CONFIG["VOICE_OUTPUT"],
+        "combined": os.path.join(output_dir, "combined.mp4"),
+        "segments": os.path.join(output_dir, "segments.json"),
+        "subtitles": CONFIG["SUBTITLE_FILE"],
+        "final": CONFIG["FINAL_OUTPUT"],
+        "metrics": os.path.join(output_dir, "metrics.json"),
+    }, force)
+
+
+def run_pipeline(text=None, reddit_title=None, stream=None, force=()):
     # 1. Get text from user if not provided (multiline, preserve all chars)
     if not text:
         console.print("[bold blue]Enter the text for voice generation (Ctrl+D to finish):[/]")
@@ -28,58 +41,51 @@ def run_pipeline(skip_voice=False, skip_subtitles=False, skip_video=False, text=
         console.print("❌ [red]No text provided for voice generation.[/]")
         return
 
-    # 2. Generate audio
-    if not skip_voice:
-        try:
-            generate_voice(text, CONFIG["VOICE_OUTPUT"])
-            console.print(f"[green]Voice generated: {CONFIG['VOICE_OUTPUT']}")
-        except Exception as e:
-            console.print(f"❌ [red]Voice generation failed: {e}[/]")
-            return
-    else:
-        console.print("[yellow]Skipping voice generation")
-
-    # 3. Combine video clips to match audio duration
-    if not skip_video:
-        try:
-            selected_video = combine_for_audio_duration(CONFIG["VIDEOS_DIR"], CONFIG["VOICE_OUTPUT"])
-            console.print(f"🎥 Using video: {selected_video}")
-        except Exception as e:
-            console.print(f"❌ [red]Video combining failed: {e}[/]")
-            return
-    else:
-        video_files = list_videos(CONFIG["VIDEOS_DIR"])
-        if not video_files:
-            console.print("❌ [red]No video files found.[/]")
-            return
-        # selected_video = video_files[0]
-        selected_video = os.path.join(CONFIG["DIR_BASE_DIRECTORY"], "output/combined.mp4")
-        console.print(f"[yellow]Skipping video combining, using first video: {selected_video}")
+    job = pipeline_job(text, reddit_title, force)
+    stale = stale_stages(job)
+    if not stale:
+        console.print(f"♻️ [bold green]Everything up to date: {CONFIG['FINAL_OUTPUT']}")
+        return
 
-    # 4. Generate subtitles
-    if not skip_subtitles:
+    # Streaming mode overlaps every stage with voice synthesis, so it only pays off from scratch
+    if stream is None:
+        stream = CONFIG.get("VOICE_STREAMING", False)
+    if stream and len(stale) == len(STAGES):
+        from pipeline.streaming import run_streaming
+        # Stages overlap on worker threads here, so only the whole run and the final render are measured
         try:
-            generate_subtitles(CONFIG["VOICE_OUTPUT"], CONFIG["SUBTITLE_FILE"])
-            console.print(f"[green]Subtitles generated: {CONFIG['SUBTITLE_FILE']}")
+            with collecting(job["metrics"]), measure("streaming"):
+                output, segments, seed = run_streaming(text, CONFIG["VOICE_OUTPUT"], CONFIG["SUBTITLE_FILE"],
+                                                 CONFIG["FINAL_OUTPUT"], combined_path=job["paths"]["combined"],
+                                                 reddit_title=reddit_title)
+            # Stages ran outside run_stage; record them so the next run can reuse them
+            record_streamed_run(job, segments, seed)
+            console.print(f"[bold green]Pipeline complete! Output: {output}")
         except Exception as e:
-            console.print(f"❌ [red]Subtitle generation failed: {e}[/]")
-            return
-    else:
-        console.print("[yellow]Skipping subtitle generation")
+            job["error"] = f"streaming: {e}"
+            console.print(f"❌ [red]Streaming pipeline failed: {e}[/]")
+        console.print(f"📊 [cyan]Metrics written to {write_metrics(job)}[/]")
+        return
 
-    # 5. Finalize video
-    try:
-        process_video(selected_video, CONFIG["VOICE_OUTPUT"], CONFIG["SUBTITLE_FILE"], CONFIG["FINAL_OUTPUT"], reddit_title)
+    console.print(f"🔁 [cyan]Stages that may rerun: {', '.join(stale)}[/]")
+    if run_job(job):
         console.print(f"[bold green]Pipeline complete! Output: {CONFIG['FINAL_OUTPUT']}")
-    except Exception as e:
-        console.print(f"❌ [red]Final video processing failed: {e}[/]")
+
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Run the audio-video pipeline with optional skips.")
-    parser.add_argument('--skip-voice', action='store_true', help='Skip voice generation')
-    parser.add_argument('--skip-subtitles', action='store_true', help='Skip subtitle generation')
-    parser.add_argument('--skip-video', action='store_true', help='Skip video combining')
+    parser = argparse.ArgumentParser(description="Run the audio-video pipeline, reusing up-to-date stages.")
+    parser.add_argument('--force', action='append', default=[], choices=[*STAGES, "all"],
+                        help='Rerun a stage even if its artifact is up to date (repeatable)')
     parser.add_argument('--text', type=str, help='Text for voice generation')
     parser.add_argument('--reddit-title', type=str, help='Custom Reddit post title for the card')
+    parser.add_argument('--stream', action='store_true', default=None, help='Stream the voice and overlap clips/subtitles with it')
+    parser.add_argument('--batch', type=str, help='JSONL manifest or directory of .txt scripts to run as a batch')
+    parser.add_argument('--output-dir', type=str, help='Batch output directory (default: CONFIG["BATCH_OUTPUT_DIR"])')
+    for stage in STAGES:
+        parser.add_argument(f'--{stage}-workers', type=int, help=f'Concurrent {stage} jobs in batch mode')
     args = parser.parse_args()
-    run_pipeline(skip_voice=args.skip_voice, skip_subtitles=args.skip_subtitles, skip_video=args.skip_video, text=args.text, reddit_title=args.reddit_title)
+    if args.batch:
+        limits = {stage: getattr(args, f"{stage}_workers") for stage in STAGES if getattr(args, f"{stage}_workers")}
+        run_batch(args.batch, output_dir=args.output_dir, limits=limits, force=args.force)
+    else:
+        run_pipeline(text=args.text, reddit_title=args.reddit_title, stream=args.stream, force=args.force)
@@ -0,0 +1,33 @@
+import pytest
+
+from pipeline.align import realign_to_script
+
+
+def _result(*words):
+    return {"segments": [{"words": [{"word": word, "start": start, "end": end} for word, start, end in words]}]}
+
+
+def test_script_words_take_recognized_timings():
+    result = _result((" Hello", 0.0, 0.4), (" there", 0.4, 0.8), (" my", 0.9, 1.1), (" frend.", 1.1, 1.6),
+                     (" How", 2.0, 2.2), (" are", 2.2, 2.4), (" you", 2.4, 2.7))
+    realigned = realign_to_script(result, "Hello there, my friend. How are you doing?")
+
+    assert [segment["text"] for segment in realigned["segments"]] == [" Hello there, my friend.", " How are you doing?"]
+    words = [word for segment in realigned["segments"] for word in segment["words"]]
+    assert [(word["start"], word["end"]) for word in words[:7]] == [
+        (0.0, 0.4), (0.4, 0.8), (0.9, 1.1), (1.1, 1.6), (2.0, 2.2), (2.2, 2.4), (2.4, 2.7)]
+    # A word Whisper missed at the end gets a short slot after the last recognized one
+    assert words[7]["start"] == 2.7 and words[7]["end"] == pytest.approx(3.0)
+
+
+def test_mismatched_runs_share_their_time_evenly():
+    result = _result((" I'm", 0.0, 0.3), (" gonna", 0.3, 0.9), (" go.", 0.9, 1.2))
+    words = realign_to_script(result, "I'm going to go.")["segments"][0]["words"]
+    assert [word["word"] for word in words] == [" I'm", " going", " to", " go."]
+    assert [(word["start"], word["end"]) for word in words] == [(0.0, 0.3), (0.3, 0.6), (0.6, 0.9), (0.9, 1.2)]
+
+
+def test_words_missed_in_the_middle_fill_the_gap():
+    result = _result((" one", 0.0, 0.5), (" four", 2.0, 2.5))
+    words = realign_to_script(result, "one two three four")["segments"][0]["words"]
+    assert [(word["start"], word["end"]) for word in words] == [(0.0, 0.5), (0.5, 1.25), (1.25, 2.0), (2.0, 2.5)]
@@ -0,0 +1,30 @@
+import json
+import threading
+
+from config import CONFIG
+from pipeline import batch
+
+
+def test_unique_ids_never_collide():
+    entries = [{"id": "a"}, {"id": "a"}, {"id": "a_1"}, {"id": "a b"}, {"id": "a_b"}, {"id": "..."}]
+    ids = [entry["id"] for entry in batch._unique_ids(entries)]
+    assert ids == ["a", "a_1", "a_1_1", "a_b", "a_b_1", "job"]
+
+
+def test_batch_finishes_when_a_completion_callback_raises(tmp_path, monkeypatch):
+    manifest = tmp_path / "jobs.jsonl"
+    manifest.write_text("\n".join(json.dumps({"id": f"job{i}", "text": "Hello there."}) for i in range(3)))
+    monkeypatch.setitem(CONFIG, "VOICE_BACKEND", "stub")
+    monkeypatch.setattr(batch, "run_stage", lambda job, stage: None)
+
+    def broken_metrics(job):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(batch, "write_metrics", broken_metrics)
+    result = {}
+    runner = threading.Thread(target=lambda: result.update(summary=batch.run_batch(str(manifest), str(tmp_path / "out"))),
+                              daemon=True)
+    runner.start()
+    runner.join(timeout=30)
+    assert not runner.is_alive(), "run_batch hung"
+    assert result["summary"]["jobs"] == 3
@@ -0,0 +1,30 @@
+import os
+
+from config import CONFIG
+from pipeline import cache
+
+
+def test_evict_removes_least_recently_used_first(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, "CACHE_DIR", str(tmp_path))
+    for age, key in enumerate(["newest", "middle", "oldest"]):
+        path = cache.cache_write("voice", key, ".mp3", lambda f: f.write(b"x" * 100))
+        os.utime(path, (1000 - age * 100, 1000 - age * 100))
+    (tmp_path / "voice" / "partial.mp3.1.2.tmp").write_bytes(b"x" * 500)
+
+    # A hit refreshes recency, so "oldest" now outlives "middle"
+    assert cache.cache_lookup("voice", "oldest", ".mp3")
+    cache.evict("voice", max_bytes=200)
+    assert sorted(os.listdir(tmp_path / "voice")) == ["newest.mp3", "oldest.mp3", "partial.mp3.1.2.tmp"]
+
+    cache.evict("voice", max_bytes=100)
+    assert cache.cache_lookup("voice", "newest", ".mp3") is None
+    assert cache.cache_lookup("voice", "oldest", ".mp3")
+
+
+def test_evict_uses_the_namespace_limit(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setitem(CONFIG, "CACHE_LIMITS_MB", {"cards": 0})
+    cache.cache_write("cards", "a", ".png", lambda f: f.write(b"x"))
+    assert cache.cache_lookup("cards", "a", ".png") is None
+    cache.cache_write("unlimited", "a", ".bin", lambda f: f.write(b"x"))
+    assert cache.cache_lookup("unlimited", "a", ".bin")
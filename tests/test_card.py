@@ -0,0 +1,47 @@
+from io import BytesIO
+
+import pytest
+
+from config import CONFIG
+
+pytest.importorskip("pilmoji")
+from pipeline import card  # noqa: E402
+
+
+class _Upstream:
+    def __init__(self):
+        self.calls = []
+
+    def get_emoji(self, emoji):
+        self.calls.append(emoji)
+        return BytesIO(b"png bytes")
+
+
+@pytest.fixture
+def emoji_cache(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(card.CachedEmojiSource, "_memory", {})
+    monkeypatch.setattr(card.CachedEmojiSource, "_fetched", set())
+    return tmp_path / "emoji"
+
+
+def test_rendering_stays_offline_by_default(emoji_cache, monkeypatch):
+    monkeypatch.setitem(CONFIG, "EMOJI_ALLOW_NETWORK", False)
+    upstream = _Upstream()
+    assert card.CachedEmojiSource(upstream).get_emoji("💀") is None
+    assert upstream.calls == []
+
+
+def test_seeded_emoji_are_served_from_the_cache(emoji_cache, monkeypatch):
+    monkeypatch.setitem(CONFIG, "EMOJI_ALLOW_NETWORK", False)
+    card.CachedEmojiSource(upstream=None).get_emoji("💀")
+    upstream = _Upstream()
+    fetching = card.CachedEmojiSource(upstream, allow_network=True)
+    assert fetching.get_emoji("💀").read() == b"png bytes"
+    assert fetching.get_emoji("💀").read() == b"png bytes"
+    assert upstream.calls == ["💀"]
+    # Written whole through the cache, no temp files left behind
+    assert [path.name for path in emoji_cache.iterdir()] == ["1f480.png"]
+
+    monkeypatch.setattr(card.CachedEmojiSource, "_memory", {})
+    assert card.CachedEmojiSource(_Upstream()).get_emoji("💀").read() == b"png bytes"
@@ -0,0 +1,37 @@
+import sqlite3
+
+from config import CONFIG
+from pipeline import clip_index
+
+
+def test_refresh_index_adds_updates_and_removes(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, "CLIP_INDEX_PATH", str(tmp_path / "index.sqlite"))
+    probed = []
+
+    def fake_probe(path):
+        probed.append(path)
+        return {"duration": float(len(open(path, "rb").read())), "width": 1920, "height": 1080, "codec": "h264",
+                "pix_fmt": "yuv420p", "fps": 30.0, "has_audio": 1, "audio_codec": "aac", "sample_rate": 44100,
+                "channels": 2}
+
+    monkeypatch.setattr(clip_index, "probe_clip", fake_probe)
+    clips = tmp_path / "clips"
+    clips.mkdir()
+    (clips / "a.mp4").write_bytes(b"a" * 10)
+    (clips / "b.mov").write_bytes(b"b" * 20)
+    (clips / "notes.txt").write_text("not a clip")
+
+    assert [clip["duration"] for clip in clip_index.refresh_index(str(clips), workers=1)] == [10.0, 20.0]
+    assert len(probed) == 2
+
+    # Unchanged files are not probed again
+    clip_index.refresh_index(str(clips), workers=1)
+    assert len(probed) == 2
+
+    (clips / "a.mp4").write_bytes(b"a" * 15)
+    (clips / "b.mov").unlink()
+    rows = clip_index.refresh_index(str(clips), workers=1)
+    assert [(row["path"], row["duration"]) for row in rows] == [(str(clips / "a.mp4"), 15.0)]
+    assert probed[2:] == [str(clips / "a.mp4")]
+    with sqlite3.connect(CONFIG["CLIP_INDEX_PATH"]) as conn:
+        assert [path for (path,) in conn.execute("SELECT path FROM clips")] == [str(clips / "a.mp4")]
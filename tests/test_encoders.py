@@ -0,0 +1,85 @@
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from config import CONFIG
+from pipeline import encoders
+
+LISTED = " V....D libx264              libx264 H.264\n V....D h264_nvenc           NVIDIA NVENC H.264\n"
+
+
+@pytest.fixture
+def probe_env(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, "ENCODER_CACHE_PATH", str(tmp_path / "encoders.json"))
+    monkeypatch.setattr(encoders, "_PROBE_MEMO", {})
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        return SimpleNamespace(stdout=LISTED, returncode=0)
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    return calls
+
+
+def test_probe_is_cached_per_ffmpeg_binary(probe_env, monkeypatch):
+    monkeypatch.setattr(encoders, "_ffmpeg_identity", lambda: "/usr/bin/ffmpeg:1:100")
+    first = encoders.probe_encoders()
+    assert first["profiles"]["x264_fast"] and first["profiles"]["nvenc"] and not first["profiles"]["qsv"]
+    probes = len(probe_env)
+
+    # Memoized in-process, then read back from disk by a fresh process
+    assert encoders.probe_encoders() == first
+    monkeypatch.setattr(encoders, "_PROBE_MEMO", {})
+    assert encoders.probe_encoders() == first
+    assert len(probe_env) == probes
+
+    # A replaced ffmpeg binary is probed again
+    monkeypatch.setattr(encoders, "_ffmpeg_identity", lambda: "/usr/bin/ffmpeg:2:120")
+    encoders.probe_encoders()
+    assert len(probe_env) > probes
+
+
+@pytest.fixture
+def available(monkeypatch):
+    def set_available(*names, benchmarks=None):
+        profiles = {name: name in names for name in encoders.ENCODER_PROFILES}
+        monkeypatch.setattr(encoders, "probe_encoders", lambda: {"profiles": profiles, "benchmarks": benchmarks or {}})
+
+    monkeypatch.setitem(CONFIG, "ENCODER_PROFILE", "")
+    monkeypatch.setitem(CONFIG, "GPU_ENCODER", "h264_nvenc")
+    monkeypatch.setitem(CONFIG, "USE_GPU", True)
+    return set_available
+
+
+def test_targets_fall_back_in_order(available, monkeypatch):
+    available("qsv", "vaapi", "x264_veryfast", "x264_fast")
+    assert encoders.select_encoder("speed")["name"] == "qsv"
+    monkeypatch.setitem(CONFIG, "GPU_ENCODER", "h264_vaapi")
+    assert encoders.select_encoder("speed")["name"] == "vaapi"
+    monkeypatch.setitem(CONFIG, "USE_GPU", False)
+    assert encoders.select_encoder("speed")["name"] == "x264_veryfast"
+    assert encoders.select_encoder("quality")["name"] == "x264_fast"
+
+    available()
+    assert encoders.select_encoder("balanced")["name"] == "x264_fast"
+
+
+def test_forced_profile_and_fastest_benchmark(available, monkeypatch):
+    available("x264_veryfast", "x264_fast", "x264_medium",
+              benchmarks={"x264_medium": {"fps": 40}, "x264_veryfast": {"fps": 200}})
+    assert encoders.select_encoder("fastest")["name"] == "x264_veryfast"
+    monkeypatch.setitem(CONFIG, "ENCODER_PROFILE", "x264_medium")
+    assert encoders.select_encoder("speed")["name"] == "x264_medium"
+    # An unavailable forced profile falls back to the target
+    monkeypatch.setitem(CONFIG, "ENCODER_PROFILE", "nvenc")
+    assert encoders.select_encoder("speed")["name"] == "x264_veryfast"
+
+
+def test_profile_for_applies_x264_settings(monkeypatch):
+    monkeypatch.setitem(CONFIG, "X264_TUNE", "film")
+    monkeypatch.setitem(CONFIG, "X264_THREADS", 4)
+    assert encoders.profile_for("x264_fast")["args"] == ["-preset", "fast", "-crf", "23", "-tune", "film", "-threads", "4"]
+    assert "-threads" not in encoders.profile_for("nvenc")["args"]
+    assert encoders.ENCODER_PROFILES["x264_fast"]["args"] == ["-preset", "fast", "-crf", "23"]
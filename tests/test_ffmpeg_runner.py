@@ -0,0 +1,69 @@
+import sys
+
+import pytest
+
+from config import CONFIG
+from pipeline import ffmpeg_runner
+
+
+def test_runs_default_to_a_fair_share_of_the_budget(monkeypatch):
+    monkeypatch.setitem(CONFIG, "FFMPEG_CORE_BUDGET", 8)
+    monkeypatch.setitem(CONFIG, "FFMPEG_THREADS", 0)
+    cmd = ["ffmpeg", "-i", "in.mp4", "out.mp4"]
+    assert ffmpeg_runner._requested_threads(cmd, None) == (8, True)
+    with ffmpeg_runner.share_cores(4):
+        assert ffmpeg_runner._requested_threads(cmd, None) == (2, True)
+        with ffmpeg_runner.share_cores(16):
+            assert ffmpeg_runner._requested_threads(cmd, None) == (1, True)
+    assert ffmpeg_runner.default_threads() == 8
+    monkeypatch.setitem(CONFIG, "FFMPEG_THREADS", 3)
+    with ffmpeg_runner.share_cores(4):
+        assert ffmpeg_runner._requested_threads(cmd, None) == (3, True)
+
+
+def test_explicit_thread_counts(monkeypatch):
+    monkeypatch.setitem(CONFIG, "FFMPEG_CORE_BUDGET", 8)
+    # A -threads already in the command is reserved as-is (0 means ffmpeg uses every core)
+    assert ffmpeg_runner._requested_threads(["ffmpeg", "-threads", "3", "out.mp4"], None) == (3, False)
+    assert ffmpeg_runner._requested_threads(["ffmpeg", "-threads", "0", "out.mp4"], None) == (8, False)
+    assert ffmpeg_runner._requested_threads(["ffmpeg", "out.mp4"], 2) == (2, True)
+    assert ffmpeg_runner._requested_threads(["ffmpeg", "out.mp4"], 0) == (0, False)
+
+
+FAKE_FFMPEG = '''#!{python}
+import sys
+for frame, time_us, speed in ((10, 400000, "0.5x"), (50, 2000000, "2.0x")):
+    print(f"frame={{frame}}\\nfps=25.0\\nout_time_us={{time_us}}\\nspeed={{speed}}\\nprogress=continue", flush=True)
+for line in range(30):
+    print(f"log line {{line}}", file=sys.stderr)
+print("Conversion failed!" if "fail" in sys.argv[-1] else "done", file=sys.stderr)
+sys.exit(1 if "fail" in sys.argv[-1] else 0)
+'''
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable))
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_progress_is_parsed_into_stats(fake_ffmpeg):
+    updates = []
+    stats = ffmpeg_runner.run_ffmpeg([fake_ffmpeg, "-i", "in.mp4", "out.mp4"], threads=0, duration=10.0,
+                                     on_progress=updates.append)
+    assert [update["frames"] for update in updates] == [10, 50]
+    assert stats["frames"] == 50 and stats["fps"] == 25.0 and stats["speed"] == 2.0
+    assert stats["out_time_s"] == 2.0
+    assert stats["eta_s"] == pytest.approx(4.0)
+
+
+def test_failure_carries_the_stderr_tail(fake_ffmpeg):
+    with pytest.raises(ffmpeg_runner.FFmpegError) as failure:
+        ffmpeg_runner.run_ffmpeg([fake_ffmpeg, "-i", "in.mp4", "fail.mp4"], threads=0, label="final encode")
+    error = failure.value
+    assert error.returncode == 1 and not error.timed_out
+    assert len(error.stderr_tail) == ffmpeg_runner.STDERR_TAIL_LINES
+    assert error.stderr_tail[-1] == "Conversion failed!"
+    assert str(error) == "final encode exited with 1: Conversion failed!"
@@ -0,0 +1,82 @@
+import json
+import shutil
+import subprocess
+from fractions import Fraction
+
+import pytest
+
+from config import CONFIG
+from pipeline import finalize
+from pipeline.benchmark import make_test_clips
+from pipeline.subtitles import write_ass_subtitles
+
+
+@pytest.mark.parametrize("source_fps", [24, Fraction(30000, 1001), 30])
+def test_chunk_bounds_are_whole_output_frames(monkeypatch, source_fps):
+    monkeypatch.setitem(CONFIG, "MIN_CHUNK_DURATION", 10)
+    fps = source_fps * Fraction(13, 10)
+    frames = 2000
+    bounds = finalize._chunk_bounds(frames, fps, 4)
+    assert bounds[0] == 0 and bounds[-1] == frames and len(bounds) == 5
+    assert all(isinstance(bound, int) for bound in bounds)
+    assert bounds == sorted(set(bounds))
+
+
+def _frames_and_duration(path):
+    cmd = ["ffprobe", "-v", "quiet", "-count_frames", "-select_streams", "v:0", "-print_format", "json",
+           "-show_entries", "stream=nb_read_frames:format=duration", path]
+    data = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+    return int(data["streams"][0]["nb_read_frames"]), float(data["format"]["duration"])
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_chunked_encode_matches_two_pass_frames(tmp_path, monkeypatch):
+    settings = {
+        "CACHE_DIR": str(tmp_path / "cache"),
+        "ENCODER_CACHE_PATH": str(tmp_path / "cache" / "encoders.json"),
+        "CLIP_INDEX_PATH": str(tmp_path / "cache" / "clip_index.sqlite"),
+        "ENCODER_PROFILE": "x264_veryfast",
+        "USE_GPU": False,
+        "EMOJI_ALLOW_NETWORK": False,
+        "MIN_CHUNK_DURATION": 2,
+        "NORMALIZE_FORMAT": {**CONFIG["NORMALIZE_FORMAT"], "width": 640, "height": 360, "fps": 24},
+    }
+    for key, value in settings.items():
+        monkeypatch.setitem(CONFIG, key, value)
+    source = make_test_clips(str(tmp_path / "clips"), count=1, seconds=14)[0]
+    voice = str(tmp_path / "voice.mp3")
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "sine=frequency=440:duration=12.3", voice], check=True)
+    words = [{"word": f" word{i}", "start": i * 0.5, "end": i * 0.5 + 0.4} for i in range(20)]
+    subtitles = write_ass_subtitles({"segments": [{"words": words}]}, str(tmp_path / "subtitles.ass"))
+
+    finalize.process_video(source, voice, subtitles, str(tmp_path / "two_pass.mp4"), "Title", variants=[])
+    finalize.process_video_chunked(source, voice, subtitles, str(tmp_path / "chunked.mp4"), "Title", chunks=3)
+
+    two_pass_frames, two_pass_duration = _frames_and_duration(str(tmp_path / "two_pass.mp4"))
+    chunked_frames, chunked_duration = _frames_and_duration(str(tmp_path / "chunked.mp4"))
+    assert chunked_frames == two_pass_frames
+    assert chunked_duration == pytest.approx(two_pass_duration, abs=0.05)
+
+
+def test_variant_paths_default_to_their_kind():
+    assert finalize.variant_path("out/final.mp4", {"name": "upload", "width": 720}) == "out/final_upload.mp4"
+    assert finalize.variant_path("out/final.mp4", {"name": "thumbs", "thumbnails": 6}) == "out/final_thumbs.jpg"
+    assert finalize.variant_path("out/final.mp4", {"name": "thumbs", "thumbnails": 6, "suffix": "_t.png"}) == "out/final_t.png"
+
+
+def test_variant_outputs_split_the_composited_frame(monkeypatch):
+    monkeypatch.setitem(CONFIG, "X264_THREADS", 0)
+    encoder = finalize.profile_for("x264_fast")
+    variants = [{"name": "preview", "width": 540, "duration": 10},
+                {"name": "thumbs", "thumbnails": 4, "width": 216}]
+    filter_complex, outputs = finalize._variant_outputs(encoder, "[0:v]null[out]", "2:a", 20.0, "final.mp4", variants)
+
+    assert "[out]split=3[master][variant0][variant1]" in filter_complex
+    assert "[variant0]scale=540:-2[venc0]" in filter_complex
+    assert "[variant1]fps=4/20.000,scale=216:-2,tile=4x1[thumbs1]" in filter_complex
+    paths = [arg for arg in outputs if arg.startswith("final")]
+    assert paths == ["final.mp4", "final_preview.mp4", "final_thumbs.jpg"]
+    preview = outputs[outputs.index("final.mp4") + 1:outputs.index("final_preview.mp4")]
+    assert preview[preview.index("-t") + 1] == "10"
+    thumbs = outputs[outputs.index("final_preview.mp4") + 1:]
+    assert thumbs[:4] == ["-map", "[thumbs1]", "-frames:v", "1"]
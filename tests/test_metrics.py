@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from pipeline.metrics import collecting, job_report, measure, record
+
+
+def test_measure_nests_entries_under_the_enclosing_stage():
+    metrics = {}
+    with collecting(metrics):
+        with measure("finalize"):
+            with measure("card"):
+                record("cache", hit=True)
+            with measure("encode"):
+                record("ffmpeg", wall_s=1.23456)
+        record("after", done=1)
+
+    assert set(metrics) == {"finalize", "finalize.card", "finalize.card.cache", "finalize.encode",
+                            "finalize.encode.ffmpeg", "after"}
+    assert metrics["finalize.encode.ffmpeg"] == {"wall_s": 1.2346}
+    assert metrics["finalize"]["wall_s"] >= metrics["finalize.encode"]["wall_s"]
+    report = job_report({"id": "job", "metrics": metrics})
+    assert report["wall_s"] == metrics["finalize"]["wall_s"]
+
+
+def test_measure_records_errors_and_restores_the_prefix():
+    metrics = {}
+    with collecting(metrics):
+        with pytest.raises(ValueError), measure("voice"):
+            with measure("tts"):
+                raise ValueError("boom")
+        with measure("video"):
+            pass
+    assert metrics["voice"]["error"] == "ValueError: boom"
+    assert metrics["voice.tts"]["error"] == "ValueError: boom"
+    assert "video" in metrics
+
+
+def test_measure_is_a_no_op_without_bound_metrics():
+    seen = []
+
+    def other_thread():
+        with measure("stage") as entry:
+            seen.append(entry)
+
+    thread = threading.Thread(target=other_thread)
+    # Metrics are bound per thread
+    with collecting({}):
+        thread.start()
+        thread.join()
+    assert seen == [None]
@@ -0,0 +1,61 @@
+import shutil
+
+import pytest
+
+import pipeline_run
+from config import CONFIG
+from pipeline.benchmark import make_test_clips
+from pipeline.stages import STAGES, read_sidecar, stage_artifact, stale_stages
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+
+TEXT = "Hello there my friend. This is a short streamed test."
+
+
+@pytest.fixture(scope="module")
+def clips(tmp_path_factory):
+    clip_dir = tmp_path_factory.mktemp("clips")
+    make_test_clips(str(clip_dir), count=2, seconds=6)
+    return str(clip_dir)
+
+
+@pytest.fixture
+def offline(tmp_path, clips, monkeypatch):
+    settings = {
+        "DIR_BASE_DIRECTORY": str(tmp_path),
+        "VOICE_OUTPUT": str(tmp_path / "voice.mp3"),
+        "SUBTITLE_FILE": str(tmp_path / "subtitles.ass"),
+        "FINAL_OUTPUT": str(tmp_path / "final.mp4"),
+        "VIDEOS_DIR": clips,
+        "CACHE_DIR": str(tmp_path / "cache"),
+        "CLIP_INDEX_PATH": str(tmp_path / "cache" / "clip_index.sqlite"),
+        "ENCODER_CACHE_PATH": str(tmp_path / "cache" / "encoders.json"),
+        "ENCODER_PROFILE": "x264_veryfast",
+        "USE_GPU": False,
+        "VOICE_BACKEND": "stub",
+        "WHISPER_MODEL": "stub",
+        "WHISPER_MODE": "single",
+        "WHISPER_WORKER_SOCKET": str(tmp_path / "no-worker.sock"),
+        "EMOJI_ALLOW_NETWORK": False,
+        "MIN_SEGMENT_DURATION": 2,
+        "MAX_SEGMENT_DURATION": 4,
+    }
+    for key, value in settings.items():
+        monkeypatch.setitem(CONFIG, key, value)
+    return tmp_path
+
+
+@pytest.mark.parametrize("render_mode", ["two_pass", "single_pass"])
+def test_streamed_run_is_resumable(offline, monkeypatch, capsys, render_mode):
+    monkeypatch.setitem(CONFIG, "RENDER_MODE", render_mode)
+    monkeypatch.setitem(CONFIG, "CLIP_SEED", 7)
+    pipeline_run.run_pipeline(text=TEXT, reddit_title="Title", stream=True)
+    assert "Pipeline complete" in capsys.readouterr().out
+
+    job = pipeline_run.pipeline_job(TEXT, "Title")
+    assert all(read_sidecar(stage_artifact(job, stage)) for stage in STAGES)
+    assert stale_stages(job) == []
+    assert read_sidecar(stage_artifact(job, "video"))["meta"]["seed"] == 7
+
+    pipeline_run.run_pipeline(text=TEXT, reddit_title="Title", stream=True)
+    assert "Everything up to date" in capsys.readouterr().out
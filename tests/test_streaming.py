@@ -0,0 +1,51 @@
+import shutil
+import subprocess
+import time
+
+import numpy as np
+import pytest
+
+from pipeline.audio import decode_audio
+from pipeline.streaming import _TailDecoder
+from pipeline.subtitles import transcript_cache_key
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+
+
+@pytest.fixture
+def narration(tmp_path):
+    path = tmp_path / "voice.mp3"
+    subprocess.run(["ffmpeg", "-v", "quiet", "-f", "lavfi", "-i", "sine=frequency=440:duration=6",
+                    "-b:a", "128k", str(path)], check=True)
+    return path
+
+
+def test_tail_decoder_decodes_only_new_bytes_in_step_with_decode_audio(narration, tmp_path):
+    data = narration.read_bytes()
+    partial = tmp_path / "partial.mp3"
+    partial.write_bytes(b"")
+    decoder = _TailDecoder(str(partial), "mp3")
+    try:
+        # Grow the file in uneven pieces, feeding the decoder after each, as the voice stream does
+        for start in range(0, len(data), 7001):
+            with open(partial, "ab") as f:
+                f.write(data[start:start + 7001])
+            decoder.feed()
+        expected = decode_audio(str(narration))
+        # Until the stream ends ffmpeg holds back the last frame or so
+        deadline = time.monotonic() + 10
+        while len(decoder.samples(0)) < len(expected) - 1000 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        samples = decoder.samples(0)
+    finally:
+        decoder.close()
+    assert len(expected) - 1000 <= len(samples) <= len(expected)
+    # Sample positions line up with a whole-file decode, so window cuts are valid offsets into it
+    assert np.allclose(samples, expected[:len(samples)], atol=2e-3)
+    assert np.array_equal(decoder.samples(16000), samples[16000:])
+
+
+def test_streamed_transcripts_have_their_own_cache_key(narration, monkeypatch):
+    from config import CONFIG
+    monkeypatch.setitem(CONFIG, "WHISPER_MODE", "chunked")
+    assert transcript_cache_key(str(narration), mode="streaming") != transcript_cache_key(str(narration))
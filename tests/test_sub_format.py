@@ -0,0 +1,18 @@
+import re
+
+from pipeline.sub_format import build_events
+
+
+def _result(*words):
+    return {"segments": [{"words": [{"word": f" {text}", "start": start, "end": end} for text, start, end in words]}]}
+
+
+def test_karaoke_transforms_never_end_at_zero():
+    # The first word starts exactly on the event origin
+    result = _result(("so", 0.0, 0.39), ("my", 0.39, 0.78), ("cat", 1.3, 1.69), ("ran", 1.69, 2.6))
+    events = build_events(result, 1.3, mode="karaoke")
+    times = [(int(start), int(end)) for start, end in re.findall(r"\\t\((\d+),(\d+),", events)]
+    assert len(times) == 8
+    # libass reads a \t end time of 0 as "until the end of the event"
+    assert all(end > 0 for _, end in times)
+    assert all(start <= end for start, end in times)
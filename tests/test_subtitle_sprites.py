@@ -0,0 +1,20 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from config import CONFIG
+from pipeline import subtitle_sprites
+
+
+def test_bitmap_fallback_font_asks_for_a_font_path(monkeypatch):
+    monkeypatch.setitem(CONFIG, "SUBTITLE_FONT_PATH", "")
+    # A bitmap font from ImageFont.load_default() has no .path
+    monkeypatch.setitem(sys.modules, "pipeline.card", SimpleNamespace(get_font=lambda name, size: object()))
+    with pytest.raises(RuntimeError, match="SUBTITLE_FONT_PATH"):
+        subtitle_sprites._font_source(bold=True)
+
+
+def test_configured_font_path_wins(monkeypatch):
+    monkeypatch.setitem(CONFIG, "SUBTITLE_FONT_PATH", "/fonts/Inter-Bold.ttf")
+    assert subtitle_sprites._font_source(bold=True) == "/fonts/Inter-Bold.ttf"
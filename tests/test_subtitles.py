@@ -0,0 +1,104 @@
+import shutil
+import subprocess
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from config import CONFIG
+from pipeline import subtitles, whisper_worker
+from pipeline.subtitles import transcribe_chunked, transcript_cache_key
+
+
+@pytest.fixture
+def audio(tmp_path):
+    path = tmp_path / "voice.mp3"
+    path.write_bytes(b"not really audio")
+    return str(path)
+
+
+@pytest.mark.parametrize("mode, key, other", [
+    ("single", "WHISPER_LANGUAGE", "de"),
+    ("chunked", "WHISPER_CHUNK_SECONDS", 7),
+    ("chunked", "WHISPER_LANGUAGE", "de"),
+    ("align", "ALIGN_MIN_PROBABILITY", 0.9),
+    ("align", "WHISPER_LANGUAGE", "de"),
+])
+def test_transcript_key_follows_mode_settings(audio, monkeypatch, mode, key, other):
+    monkeypatch.setitem(CONFIG, "WHISPER_MODE", mode)
+    before = transcript_cache_key(audio, text="The script.")
+    monkeypatch.setitem(CONFIG, key, other)
+    assert transcript_cache_key(audio, text="The script.") != before
+
+
+def test_transcript_key_ignores_settings_of_other_modes(audio, monkeypatch):
+    monkeypatch.setitem(CONFIG, "WHISPER_MODE", "single")
+    before = transcript_cache_key(audio)
+    monkeypatch.setitem(CONFIG, "WHISPER_CHUNK_SECONDS", 7)
+    monkeypatch.setitem(CONFIG, "ALIGN_MIN_PROBABILITY", 0.9)
+    assert transcript_cache_key(audio) == before
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_chunked_transcription_in_spawned_workers_matches_sequential(tmp_path, monkeypatch):
+    path = tmp_path / "voice.mp3"
+    # Two seconds of tone, one of silence, repeated: pauses to cut at every three seconds
+    subprocess.run(["ffmpeg", "-v", "quiet", "-f", "lavfi", "-i", "aevalsrc='sin(440*2*PI*t)*lt(mod(t,3),2)':s=16000:d=30",
+                    str(path)], check=True)
+    monkeypatch.setitem(CONFIG, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setitem(CONFIG, "WHISPER_MODEL", "stub")
+    monkeypatch.setitem(CONFIG, "WHISPER_CHUNK_SECONDS", 8)
+    # A live thread in the parent, as in batch mode, must not matter to spawned workers
+    busy = threading.Thread(target=time.sleep, args=(2,))
+    busy.start()
+    parallel, timings = transcribe_chunked(str(path), device="cpu", workers=2)
+    sequential, _ = transcribe_chunked(str(path), device="cpu", workers=1)
+    busy.join()
+    assert timings["source"] != "1 chunks"
+    assert parallel["segments"] == sequential["segments"]
+
+
+class _RecordingModel:
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, **kwargs):
+        self.calls.append(kwargs)
+        return {"text": "", "segments": []}
+
+
+@pytest.mark.parametrize("language, expected", [("de", "de"), ("", None)])
+def test_whisper_receives_the_configured_language(monkeypatch, language, expected):
+    model = _RecordingModel()
+    monkeypatch.setitem(CONFIG, "WHISPER_LANGUAGE", language)
+    monkeypatch.setitem(CONFIG, "WHISPER_CHUNK_SECONDS", 1)
+    monkeypatch.setattr(subtitles, "get_whisper_model", lambda *args, **kwargs: (model, threading.Lock(), 0.0))
+    monkeypatch.setattr(subtitles, "load_audio", lambda path: SimpleNamespace(samples=np.zeros(16000 * 3, np.float32)))
+    monkeypatch.setattr(whisper_worker, "transcribe_via_worker", lambda *args, **kwargs: None)
+
+    subtitles.transcribe_audio("voice.mp3")
+    subtitles.transcribe_chunked("voice.mp3", workers=1)
+    subtitles._transcribe_chunk(("stub", expected, np.zeros(16000, np.float32)))
+
+    assert model.calls and all(call["language"] == expected for call in model.calls)
+
+
+def test_chunk_workers_fit_the_memory_budget(monkeypatch):
+    monkeypatch.setitem(CONFIG, "WHISPER_CHUNK_MEMORY_MB", 6500)
+    assert subtitles.chunk_workers("medium.en", 4) == 2
+    assert subtitles.chunk_workers("large-v3", 4) == 1
+    assert subtitles.chunk_workers("stub", 4) == 4
+    monkeypatch.setitem(CONFIG, "WHISPER_CHUNK_MEMORY_MB", 0)
+    assert subtitles.chunk_workers("medium", 4) == 4
+
+
+def test_whisper_models_load_once_per_process(monkeypatch):
+    monkeypatch.setattr(subtitles, "_MODELS", {})
+    monkeypatch.setattr(subtitles, "_MODEL_LOCKS", {})
+    model, lock, _ = subtitles.get_whisper_model("stub", "cpu")
+    again, same_lock, load_s = subtitles.get_whisper_model("stub", "cpu")
+    assert again is model and same_lock is lock and load_s == 0.0
+    other, _, _ = subtitles.get_whisper_model("stub", "cuda")
+    assert other is not model
@@ -0,0 +1,72 @@
+from config import CONFIG
+from pipeline import video
+
+
+def _clip(path, **overrides):
+    clip = {"path": path, "mtime": 1.0, "size": 100, "duration": 60.0, "width": 1920, "height": 1080,
+            "codec": "h264", "pix_fmt": "yuv420p", "fps": 30.0, "has_audio": 1, "audio_codec": "aac",
+            "sample_rate": 44100, "channels": 2}
+    return {**clip, **overrides}
+
+
+def _record_ffmpeg(monkeypatch):
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        with open(cmd[-1], "wb"):
+            pass
+
+    monkeypatch.setattr(video, "run_ffmpeg", fake_run)
+    return calls
+
+
+def test_trimmed_windows_are_reencoded_before_the_stream_copy(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, "CACHE_DIR", str(tmp_path / "cache"))
+    calls = _record_ffmpeg(monkeypatch)
+    a, b = _clip(str(tmp_path / "a.mp4")), _clip(str(tmp_path / "b.mp4"))
+    segments = [{"path": a["path"], "start": 12.5, "duration": 20.0, "clip": a},
+                {"path": b["path"], "start": 0.0, "duration": 60.0, "clip": b},
+                {"path": a["path"], "start": 12.5, "duration": 20.0, "clip": a}]
+
+    video.combine_selected(segments, str(tmp_path / "out" / "combined.mp4"))
+
+    # One cut for the repeated window; the whole clip is already in the uniform format
+    cuts = calls[:-1]
+    assert len(cuts) == 1
+    assert cuts[0][cuts[0].index("-ss") + 1] == "12.500" and cuts[0][cuts[0].index("-t") + 1] == "20.000"
+    listing = (tmp_path / "out" / "inputs.txt").read_text()
+    assert "inpoint" not in listing and "outpoint" not in listing
+    assert listing.count("file '") == 3 and b["path"] in listing
+
+
+def test_whole_matching_clips_are_stream_copied_directly(tmp_path, monkeypatch):
+    calls = _record_ffmpeg(monkeypatch)
+    clip = _clip(str(tmp_path / "a.mp4"), width=1280, height=720)
+    segments = [{"path": clip["path"], "start": 0.0, "duration": 60.0, "clip": clip}]
+
+    video.combine_selected(segments, str(tmp_path / "combined.mp4"))
+
+    assert len(calls) == 1 and "concat" in calls[0]
+
+
+def test_normalized_clips_are_transcoded_once(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, "CACHE_DIR", str(tmp_path / "cache"))
+    calls = _record_ffmpeg(monkeypatch)
+    ready = _clip(str(tmp_path / "ready.mp4"))
+    assert video.normalized_clip(ready) == ready["path"]
+
+    silent = _clip(str(tmp_path / "silent.mov"), codec="hevc", has_audio=0, audio_codec=None)
+    first = video.normalized_clip(silent)
+    assert video.normalized_clip(silent) == first
+    assert len(calls) == 1 and "anullsrc=r=44100:cl=stereo" in calls[0]
+    # Another target format is a different cache entry
+    monkeypatch.setitem(CONFIG, "NORMALIZE_FORMAT", {**CONFIG["NORMALIZE_FORMAT"], "crf": 20})
+    assert video.normalized_clip(silent) != first
+
+
+def test_clip_seed_is_configured_or_drawn(monkeypatch):
+    monkeypatch.setitem(CONFIG, "CLIP_SEED", 7)
+    assert video.clip_seed() == 7
+    monkeypatch.setitem(CONFIG, "CLIP_SEED", None)
+    assert isinstance(video.clip_seed(), int)
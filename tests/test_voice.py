@@ -0,0 +1,100 @@
+import pytest
+
+from config import CONFIG
+from pipeline.voice import (VOICE_BACKENDS, StubBackend, StubTextToSpeech, VoiceBackend, generate_voice,
+                            generate_voices)
+
+
+def test_backend_without_synthesize_fails_when_built():
+    class Incomplete(VoiceBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.parametrize("name", ["stub", "local"])
+def test_builtin_backends_can_be_built(name):
+    assert VOICE_BACKENDS[name]().name == name
+
+
+class _CountingSpeech(StubTextToSpeech):
+    """Stub speech that skips the mp3 encode and counts synthesize calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def synthesize(self, text):
+        self.calls += 1
+        return text.encode("utf-8")
+
+
+@pytest.fixture
+def stub_backend(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, "CACHE_DIR", str(tmp_path / "cache"))
+    backend = StubBackend()
+    backend.client.text_to_speech = _CountingSpeech()
+    return backend
+
+
+def test_generate_voice_reuses_cache_for_identical_request(stub_backend, tmp_path):
+    speech = stub_backend.client.text_to_speech
+    first = generate_voice("Hello there.", str(tmp_path / "a.mp3"), stub_backend)
+    assert speech.calls == 1
+    assert len(list((tmp_path / "cache" / "voice").iterdir())) == 1
+
+    second = generate_voice("Hello there.", str(tmp_path / "b.mp3"), stub_backend)
+    assert speech.calls == 1
+    assert open(second, "rb").read() == open(first, "rb").read() == b"Hello there."
+
+
+@pytest.mark.parametrize("field, value", [
+    ("text", "Goodbye."),
+    ("VOICE_ID", "another-voice"),
+    ("VOICE_MODEL_ID", "another-model"),
+    ("VOICE_OUTPUT_FORMAT", "mp3_22050_32"),
+])
+def test_generate_voice_misses_when_a_key_field_changes(stub_backend, tmp_path, monkeypatch, field, value):
+    speech = stub_backend.client.text_to_speech
+    generate_voice("Hello there.", str(tmp_path / "a.mp3"), stub_backend)
+
+    text = "Hello there."
+    if field == "text":
+        text = value
+    else:
+        monkeypatch.setitem(CONFIG, field, value)
+    generate_voice(text, str(tmp_path / "b.mp3"), stub_backend)
+    assert speech.calls == 2
+
+
+class _CountingBatchBackend(VoiceBackend):
+    """Batched backend that records each synthesize_batch call."""
+
+    name = "counting"
+    label = "counting TTS"
+    batched = True
+
+    def __init__(self):
+        self.batches = []
+
+    def synthesize(self, text):
+        return self.synthesize_batch([text])[0]
+
+    def synthesize_batch(self, texts):
+        self.batches.append(list(texts))
+        return [text.encode("utf-8") for text in texts]
+
+
+def test_generate_voices_batches_misses_in_order(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, "CACHE_DIR", str(tmp_path / "cache"))
+    backend = _CountingBatchBackend()
+    generate_voice("Two.", str(tmp_path / "warm.mp3"), backend)
+    backend.batches.clear()
+
+    texts = ["One.", "Two.", "Three.", "Four."]
+    items = [(text, str(tmp_path / "out" / f"{index}.mp3")) for index, text in enumerate(texts)]
+    outputs = generate_voices(items, backend)
+
+    assert outputs == [path for _, path in items]
+    assert [open(path, "rb").read().decode("utf-8") for path in outputs] == texts
+    assert backend.batches == [["One.", "Three.", "Four."]]